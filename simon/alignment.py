@@ -0,0 +1,144 @@
+import numpy as np
+
+import trace_store
+
+from measurement import Measurements
+
+
+def find_shifts(
+    power: np.ndarray,
+    reference: np.ndarray,
+    window: slice,
+    max_shift: int,
+) -> np.ndarray:
+    """Find the shift of each trace which aligns it best to the reference.
+    The window of the reference is compared with the traces at all shifts up to `max_shift` samples in both
+    directions. The cross-correlation of all traces is calculated at once with the FFT.
+    A shift of s means that sample t of the reference matches sample t + s of the trace.
+
+    Example:
+        power.shape = (1000, 5000), reference.shape = (5000,)
+        window = slice(1000, 1500), max_shift = 20
+        -> shifts.shape = (1000,), values in -20 ... 20
+    """
+    start, stop, _ = window.indices(reference.shape[0])
+    assert start - max_shift >= 0 and stop + max_shift <= power.shape[1]
+
+    ref = reference[start:stop].astype(np.float64)
+    ref -= ref.mean()
+    segments = power[:, start - max_shift : stop + max_shift].astype(np.float64)
+    segments -= segments.mean(axis=1, keepdims=True)
+
+    # The segments are longer than the reference, so the lags 0 ... 2 * max_shift do not wrap around.
+    n = segments.shape[1]
+    fft_size = 1 << (n - 1).bit_length()
+    cross = np.fft.irfft(
+        np.fft.rfft(segments, fft_size, axis=1) * np.conj(np.fft.rfft(ref, fft_size)),
+        fft_size,
+        axis=1,
+    )[:, : 2 * max_shift + 1]
+
+    return np.argmax(cross, axis=1) - max_shift
+
+
+def apply_shifts(power: np.ndarray, shifts: np.ndarray) -> np.ndarray:
+    """Shift each trace by its shift, so that sample t of the result is sample t + shift of the trace.
+    Samples outside of the trace are filled with the first or last sample.
+    Example:
+        power = [[1, 2, 3, 4]], shifts = [1]
+        -> [[2, 3, 4, 4]]
+    """
+    num_samples = power.shape[1]
+    cols = np.clip(np.arange(num_samples) + shifts[:, np.newaxis], 0, num_samples - 1)
+    return np.take_along_axis(power, cols, axis=1)
+
+
+def align_measurements(
+    measurements: Measurements,
+    window: slice,
+    max_shift: int,
+    reference: np.ndarray | None = None,
+    chunk_size: int = 1000,
+    store_dir: str | None = None,
+    key: np.ndarray | None = None,
+) -> tuple[Measurements, np.ndarray]:
+    """Align all traces to the reference chunk by chunk. Works with memory mapped measurements from `Measurements.open`.
+    The aligned traces keep the data type of the input traces.
+    Return the aligned measurements and the shift of each trace.
+
+    Example:
+    ```
+        measurements = Measurements.open("./traces/demo/store")
+        aligned, shifts = align_measurements(measurements, slice(1000, 1500), max_shift=20, store_dir="./traces/demo/aligned")
+        np.bincount(np.abs(shifts))  -> how much the traces were shifted
+    ```
+
+    Arguments:
+        window: Samples of the reference which are used to find the shifts, e.g. around a distinct peak.
+        max_shift: Maximal shift in both directions. The window must have this distance to the ends of the traces.
+        reference: Reference trace. If None, the first trace is used.
+        store_dir: If set, the aligned measurements are written into a trace store instead of memory.
+        key: Key which is written into the metadata of the aligned trace store. See `align_store`.
+    """
+    num_traces, num_samples = measurements.power.shape
+    if reference is None:
+        reference = np.asarray(measurements.power[0])
+
+    if store_dir is None:
+        power = np.empty((num_traces, num_samples), dtype=measurements.power.dtype)
+    else:
+        writer = trace_store.TraceStoreWriter(
+            store_dir, num_traces, num_samples, measurements.power.dtype, key
+        )
+    shifts = np.zeros(num_traces, dtype=np.int64)
+
+    for i in range(0, num_traces, chunk_size):
+        chunk = np.asarray(measurements.power[i : i + chunk_size])
+        shifts[i : i + chunk_size] = find_shifts(chunk, reference, window, max_shift)
+        aligned = apply_shifts(chunk, shifts[i : i + chunk_size])
+
+        if store_dir is None:
+            power[i : i + chunk_size] = aligned
+        else:
+            writer.append(
+                measurements.plaintext[i : i + chunk_size],
+                measurements.ciphertext[i : i + chunk_size],
+                aligned,
+            )
+
+    if store_dir is None:
+        aligned_measurements = Measurements(
+            measurements.plaintext, measurements.ciphertext, power
+        )
+    else:
+        writer.close()
+        aligned_measurements = trace_store.open_store(store_dir)
+    return aligned_measurements, shifts
+
+
+def align_store(
+    source_dir: str,
+    store_dir: str,
+    window: slice,
+    max_shift: int,
+    reference: np.ndarray | None = None,
+    chunk_size: int = 1000,
+) -> tuple[Measurements, np.ndarray]:
+    """Align the traces of a trace store into a new trace store. The key of the source store is copied.
+    See `align_measurements`.
+
+    Example:
+    ```
+        aligned, shifts = align_store("./traces/demo/store", "./traces/demo/aligned", slice(1000, 1500), max_shift=20)
+        trace_store.load_metadata("./traces/demo/aligned")["key"]  -> key of the source store
+    ```
+    """
+    return align_measurements(
+        trace_store.open_store(source_dir),
+        window,
+        max_shift,
+        reference,
+        chunk_size,
+        store_dir,
+        trace_store.load_metadata(source_dir)["key"],
+    )
@@ -0,0 +1,199 @@
+import contextlib
+import numpy as np
+
+import leakage_models
+import profiling
+import scoring
+import simon_64_128
+
+from hamming import hamming_weight
+from helper import HypothesisSet
+from leakage_models import AttackedState
+from measurement import Measurements
+from simon_64_128_simulation import PrefixStateCache
+
+
+class AttackStep:
+    """Summary of one step of the key recovery."""
+
+    def __init__(
+        self,
+        attacked_round: int,
+        num_guessed_bits: int,
+        num_hypos: int,
+        num_survivors: int,
+        best_corr: float,
+    ):
+        self.attacked_round = attacked_round
+        self.num_guessed_bits = num_guessed_bits
+        self.num_hypos = num_hypos
+        self.num_survivors = num_survivors
+        self.best_corr = best_corr
+
+
+class AttackResult:
+    def __init__(
+        self, key: np.ndarray | None, frontier: HypothesisSet, steps: list[AttackStep]
+    ):
+        self.key = key
+        self.frontier = frontier
+        self.steps = steps
+
+
+def get_step_masks(
+    attacked_state: AttackedState,
+    guessed_bits_per_step: int,
+) -> list[np.uint32]:
+    """Get the masks of the guessed bits of one round key after each step.
+    The bits are guessed in the order of the leakage model, e.g. in distance of 7 to each other for the AND gate.
+
+    Raise a ValueError if the guessed bits of a step do not predict any bit of the attacked state.
+
+    Example:
+        ADD_ROUND_KEY, 6 bits per step -> [0x0000003F, 0x00000FFF, ..., 0xFFFFFFFF]
+    """
+    model = leakage_models.get_model(attacked_state)
+    masks = []
+    mask = 0
+    for start in range(0, 32, guessed_bits_per_step):
+        for i in range(start, min(start + guessed_bits_per_step, 32)):
+            bit_pos = model.bit_order(i)
+            mask |= 1 << bit_pos
+        if model.get_mask(np.uint32(mask)) == 0:
+            raise ValueError(
+                f"The first {start + guessed_bits_per_step} guessed bits do not predict any bit of {attacked_state}. "
+                "Guess more bits per step."
+            )
+        masks.append(np.uint32(mask))
+    return masks
+
+
+def run_attack(
+    measurements: Measurements,
+    attacked_state: AttackedState = "ADD_ROUND_KEY",
+    guessed_bits_per_step: int = 6,
+    beam_width: int = 64,
+    threshold: float | None = None,
+    mem_budget: int = 1024 * 2**20,
+    num_workers: int = 1,
+    confidence: float | None = None,
+    verbose: bool = False,
+) -> AttackResult:
+    """Recover the full key round by round with a bounded beam search.
+    In each step, all surviving hypotheses are expanded with the next guessed bits and scored with a CPA.
+    At most `beam_width` hypotheses survive, so each step scores at most `beam_width * 2^guessed_bits_per_step` hypotheses.
+    With a threshold, hypotheses which are more than `threshold` behind the best one are dropped as well.
+    The children are created and scored block by block and merged into the beam, so the number of
+    hypotheses in memory is bounded by `beam_width` plus one block which fits into `mem_budget`.
+    A quarter of `mem_budget` is reserved for the cached states of the recovered rounds.
+    With a confidence, the children are scored with the early abort CPA (see `scoring.score_keys_sequential`),
+    which drops clearly wrong hypotheses after a few hundred traces. It scores each block in this process,
+    so it cannot be combined with `num_workers > 1`.
+    Each step is recorded separately by an active `profiling.Profiler`.
+    Finally, the surviving keys are checked against the first plaintext/ciphertext pairs.
+
+    Example:
+        result = run_attack(measurements, "ADD_ROUND_KEY", beam_width=16, threshold=0.02)
+        result.key -> recovered key or None
+    """
+    if confidence is not None and num_workers > 1:
+        raise ValueError(
+            "The early abort CPA runs in one process, num_workers must be 1."
+        )
+
+    num_traces, num_samples = measurements.power.shape
+    # A quarter of the budget for the states of the recovered rounds (see `PrefixStateCache`).
+    cache_budget = mem_budget // 4
+    # Of the rest, half for the hypotheses of a shard: per trace the states (3 x uint32 during the round)
+    # and the hamming weight, per sample the cross products and GEMM result of the CPA (2 x float64).
+    # The other half is the budget of the CPA for its chunks of traces.
+    cpa_budget = (mem_budget - cache_budget) // 2
+    shard_size = max(1, cpa_budget // (16 * (num_traces + num_samples)))
+
+    frontier = HypothesisSet(np.zeros(4, dtype=np.uint32), np.zeros(4, dtype=np.uint32))
+    cache = PrefixStateCache(measurements.plaintext, cache_budget)
+    steps = []
+
+    # The worker processes and the shared traces are created once for all steps.
+    pool_context = (
+        scoring.ScoringPool(
+            measurements.plaintext, measurements.power, num_workers, cache_budget
+        )
+        if num_workers > 1
+        else contextlib.nullcontext()
+    )
+    with pool_context as pool:
+        for attacked_round in range(4):
+            for step_idx, word_mask in enumerate(
+                get_step_masks(attacked_state, guessed_bits_per_step)
+            ):
+                with profiling.step(attacked_round, step_idx):
+                    new_mask = frontier.bit_mask.copy()
+                    new_mask[3 - attacked_round] = word_mask
+
+                    # Expand and score the parents block by block and merge each block into the beam,
+                    # so only one block of children is in memory at a time.
+                    num_children = 2 ** int(
+                        np.sum(hamming_weight(new_mask & ~frontier.bit_mask))
+                    )
+                    parents_per_block = max(1, shard_size // num_children)
+                    beam = HypothesisSet(
+                        np.zeros((0, 4), dtype=np.uint32), new_mask, np.zeros(0)
+                    )
+                    num_hypos = 0
+                    for start in range(0, len(frontier), parents_per_block):
+                        parents = HypothesisSet(
+                            frontier.keys[start : start + parents_per_block],
+                            frontier.bit_mask,
+                        )
+                        children = parents.expand(new_mask)
+                        if confidence is None:
+                            children.score(
+                                measurements,
+                                attacked_round,
+                                attacked_state,
+                                num_workers,
+                                shard_size,
+                                cache,
+                                pool=pool,
+                                mem_budget=cpa_budget,
+                            )
+                        else:
+                            children.score_sequential(
+                                measurements,
+                                attacked_round,
+                                attacked_state,
+                                confidence,
+                                cache=cache,
+                                mem_budget=cpa_budget,
+                            )
+                        num_hypos += len(children)
+                        profiling.add_hypos(len(children))
+                        beam = beam.concat(children).best(beam_width)
+
+                    frontier = beam
+                    if threshold is not None:
+                        frontier = frontier.filter(threshold)
+
+                step = AttackStep(
+                    attacked_round,
+                    int(np.sum(hamming_weight(new_mask))),
+                    num_hypos,
+                    len(frontier),
+                    float(frontier.corrs[0]),
+                )
+                steps.append(step)
+                if verbose:
+                    print(
+                        f"Round {step.attacked_round}: {step.num_guessed_bits} guessed bits, "
+                        f"{step.num_hypos} hypotheses, {step.num_survivors} survivors, "
+                        f"best correlation {step.best_corr:.4f}"
+                    )
+
+            cache.clear()
+
+    found = simon_64_128.check_keys(
+        frontier.keys, measurements.plaintext[:2], measurements.ciphertext[:2]
+    )
+    key = frontier.keys[found][0] if np.any(found) else None
+    return AttackResult(key, frontier, steps)
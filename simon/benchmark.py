@@ -0,0 +1,232 @@
+"""Benchmark the stages of the CPA pipeline on synthetic data.
+
+Example:
+```
+python -m benchmark --output bench.json
+python -m benchmark --traces 10000 --samples 2000 --hypotheses 4096 --repeats 3
+```
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from typing import Callable
+import numpy as np
+
+import correlations
+import simon_64_128
+import simon_64_128_simulation
+import simulator
+import helper
+
+from hamming import hamming_weight
+from measurement import Measurements
+
+
+# Workloads as (number of traces, number of samples, number of hypotheses).
+DEFAULT_SIZES = [
+    (1000, 1000, 64),
+    (10000, 1000, 4096),
+    (10000, 5000, 1024),
+    # The cross products alone exceed the default memory budget of the CPA.
+    (1000, 1000, 32768),
+]
+
+# Bits which are guessed per attack step in the full key recovery.
+GUESSED_BITS_PER_STEP = 6
+CORR_DIFF_THRESHOLD = 0.05
+
+
+def measure(func: Callable, repeats: int = 1) -> tuple[float, int]:
+    """Run the function `repeats` times and return the best wall time in seconds and the peak memory in bytes.
+    tracemalloc slows down every allocation, so the peak memory is measured in an extra run which is not timed.
+    """
+    best_time = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best_time = min(best_time, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best_time, peak
+
+
+def bench_attack_step(
+    num_traces: int, num_samples: int, num_hypos: int, repeats: int = 1, seed: int = 0
+) -> list[dict]:
+    """Time each stage of one attack step on round 0 with random data."""
+    rng = np.random.default_rng(seed)
+    plaintexts = rng.integers(0, 2**32, (num_traces, 2), dtype=np.uint32)
+    power = rng.normal(0, 1, (num_traces, num_samples)).astype(np.float32)
+    measurements = Measurements(plaintexts, plaintexts, power)
+
+    num_bits = max(1, int(np.ceil(np.log2(num_hypos))))
+    num_parents = max(1, num_hypos // 2**num_bits)
+    parents = helper.HypothesisSet(
+        rng.integers(0, 2**32, (num_parents, 4), dtype=np.uint32),
+        np.zeros(4, dtype=np.uint32),
+    )
+    parents.keys[:, 3] = 0
+    new_mask = np.array([0, 0, 0, (1 << num_bits) - 1], dtype=np.uint32)
+    mask = np.uint32(new_mask[3])
+
+    hypos = parents.expand(new_mask)
+    states = simon_64_128_simulation.get_inter_states(plaintexts, hypos.keys, 0)
+    hws = hamming_weight(states & mask)
+    hypos.corrs = rng.normal(0, 0.1, len(hypos))
+
+    stages = {
+        "sub_hypotheses": lambda: [
+            hypo.get_sub_hypos(new_mask) for hypo in parents.to_hypos()
+        ],
+        "hypothesis_expansion": lambda: parents.expand(new_mask),
+        "intermediate_states": lambda: simon_64_128_simulation.get_inter_states(
+            plaintexts, hypos.keys, 0
+        ),
+        "hamming_weights": lambda: hamming_weight(states & mask),
+        "guessed_key_hws": lambda: simon_64_128_simulation.get_hws_for_guessed_keys(
+            plaintexts, hypos.keys, 0, mask
+        ),
+        "correlation": lambda: correlations.calc_corrs(hws, power),
+        "filtering": lambda: hypos.filter(CORR_DIFF_THRESHOLD),
+        "attack_step": lambda: parents.expand(new_mask).score(measurements, 0),
+    }
+
+    results = []
+    for stage, func in stages.items():
+        wall_time, peak = measure(func, repeats)
+        results.append(
+            {
+                "stage": stage,
+                "num_traces": num_traces,
+                "num_samples": num_samples,
+                "num_hypos": len(hypos),
+                "time_s": wall_time,
+                "peak_bytes": peak,
+            }
+        )
+    return results
+
+
+def recover_key(measurements: Measurements) -> tuple[np.ndarray | None, int]:
+    """Recover the full key round by round. Return the key (or None) and the number of scored hypotheses."""
+    hypos = helper.HypothesisSet(
+        np.zeros(4, dtype=np.uint32), np.zeros(4, dtype=np.uint32)
+    )
+    cache = simon_64_128_simulation.PrefixStateCache(measurements.plaintext)
+    num_scored = 0
+
+    for attacked_round in range(4):
+        new_mask = hypos.bit_mask.copy()
+        for start in range(0, 32, GUESSED_BITS_PER_STEP):
+            for i in range(start, min(start + GUESSED_BITS_PER_STEP, 32)):
+                new_mask[3 - attacked_round] |= np.uint32(1 << i)
+            hypos = hypos.expand(new_mask)
+            hypos.score(measurements, attacked_round, cache=cache)
+            num_scored += len(hypos)
+            hypos = hypos.filter(CORR_DIFF_THRESHOLD)
+
+    found = simon_64_128.check_keys(
+        hypos.keys, measurements.plaintext[:2], measurements.ciphertext[:2]
+    )
+    key = hypos.keys[found][0] if np.any(found) else None
+    return key, num_scored
+
+
+def bench_full_recovery(num_traces: int, repeats: int = 1, seed: int = 0) -> dict:
+    """Time the recovery of the full key from simulated traces."""
+    rng = np.random.default_rng(seed)
+    key = rng.integers(0, 2**32, 4, dtype=np.uint32)
+    measurements = simulator.TraceSimulator(key, noise_std=1.0, seed=seed).generate(
+        num_traces
+    )
+
+    result = {}
+
+    def run():
+        result["key"], result["num_scored"] = recover_key(measurements)
+
+    wall_time, peak = measure(run, repeats)
+    return {
+        "stage": "full_recovery",
+        "num_traces": num_traces,
+        "num_samples": measurements.power.shape[1],
+        "num_hypos": result["num_scored"],
+        "time_s": wall_time,
+        "peak_bytes": peak,
+        "success": result["key"] is not None and bool(np.all(result["key"] == key)),
+    }
+
+
+def get_environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+    }
+
+
+def run(
+    sizes: list[tuple[int, int, int]],
+    recovery_traces: int | None = 2000,
+    repeats: int = 1,
+) -> dict:
+    results = []
+    for num_traces, num_samples, num_hypos in sizes:
+        results.extend(bench_attack_step(num_traces, num_samples, num_hypos, repeats))
+    if recovery_traces:
+        results.append(bench_full_recovery(recovery_traces, repeats))
+    return {"environment": get_environment(), "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--traces", type=int, nargs="*", help="numbers of traces")
+    parser.add_argument("--samples", type=int, nargs="*", help="numbers of samples")
+    parser.add_argument("--hypotheses", type=int, nargs="*", help="numbers of keys")
+    parser.add_argument("--recovery-traces", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+
+    if args.traces or args.samples or args.hypotheses:
+        sizes = [
+            (t, s, h)
+            for t in args.traces or [DEFAULT_SIZES[0][0]]
+            for s in args.samples or [DEFAULT_SIZES[0][1]]
+            for h in args.hypotheses or [DEFAULT_SIZES[0][2]]
+        ]
+    else:
+        sizes = DEFAULT_SIZES
+
+    report = run(sizes, args.recovery_traces, args.repeats)
+    for r in report["results"]:
+        print(
+            f"{r['stage']:22s} traces={r['num_traces']:7d} samples={r['num_samples']:5d} "
+            f"hypos={r['num_hypos']:7d} time={r['time_s']:9.4f}s peak={r['peak_bytes'] / 2**20:9.1f} MiB"
+        )
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
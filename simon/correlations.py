@@ -1,5 +1,12 @@
+from typing import Sequence
 import numpy as np
 
+from profiling import profiled
+
+
+# Default number of bytes used by the buffers of a correlation calculation.
+DEFAULT_MEM_BUDGET = 256 * 2**20
+
 
 def calc_corrs_direct(x: np.ndarray, y: np.ndarray) -> np.ndarray:
     """Calculate the correlations between expected hamming weights and the power measurements
@@ -18,11 +25,19 @@ def calc_corrs_direct(x: np.ndarray, y: np.ndarray) -> np.ndarray:
     xn = xc / xc.std(axis=0)
     yn = yc / yc.std(axis=0)
 
-    corrs = xn.T @ yn / (x.shape[0] - 1)
+    # The standard deviations are calculated with ddof=0, so the mean of the products is divided by n.
+    corrs = xn.T @ yn / x.shape[0]
     return corrs
 
 
-def calc_corrs(x: np.ndarray, y: np.ndarray, step_size=10) -> np.ndarray:
+@profiled
+def calc_corrs(
+    x: np.ndarray,
+    y: np.ndarray,
+    step_size: int | None = None,
+    mem_budget: int | None = None,
+    dtype=np.float64,
+) -> np.ndarray:
     """Calculate the correlations between expected hamming weights and the power measurements
     at each time step. This implementation is optimized for big samples.
 
@@ -32,11 +47,16 @@ def calc_corrs(x: np.ndarray, y: np.ndarray, step_size=10) -> np.ndarray:
         - result.shape -> (256, 5000) # correlation values for each of the 256 guessed keys over 5,000 samples.
 
     Arguments:
-        step_size: Number of traces that are processed in 1 step to increase performance.
+        step_size: Number of traces that are processed in 1 step. If None, it is derived from the memory budget.
+        mem_budget: Number of bytes the correlation calculator may use for its buffers. See `Corr.auto_step_size`.
+        dtype: Data type for the accumulation. float32 halves the memory and is faster for many samples.
     """
     assert x.shape[0] == y.shape[0]
 
-    corrs = Corr((x.shape[1], y.shape[1]))
+    corrs = Corr((x.shape[1], y.shape[1]), dtype=dtype)
+
+    if step_size is None:
+        step_size = corrs.auto_step_size(mem_budget, x.shape[0])
 
     for i in range(0, x.shape[0], step_size):
         corrs.update(x[i : i + step_size, :], y[i : i + step_size])
@@ -44,16 +64,202 @@ def calc_corrs(x: np.ndarray, y: np.ndarray, step_size=10) -> np.ndarray:
     return corrs.c()
 
 
+@profiled
+def calc_peaks_bit_flips(
+    base: np.ndarray,
+    bits: np.ndarray,
+    y: np.ndarray,
+    step_size: int | None = None,
+    mem_budget: int | None = None,
+) -> np.ndarray:
+    """Fast CPA for hamming weights which are a sum of single bits, where each guessed key bit flips one of the bits.
+    This is the case for the state after adding the round key: hw(x ^ k) = base + sum_j (x_j ^ k_j).
+    The covariance of every guess is a signed sum of the single-bit covariances and is built with
+    a Walsh-Hadamard style butterfly. The variance of every guess is calculated from the covariance
+    matrix of the bits. The (N x 2^n) matrix of hamming weights is never created.
+
+    Example:
+        - base.shape = (10000, 3)       # hamming weight of the known bits for 10,000 plaintexts and 3 parent keys
+        - bits.shape = (10000, 3, 12)   # 12 bits of the state which are flipped by the 12 guessed key bits
+        - y.shape = (10000, 5000)       # 10,000 measurements with 5,000 samples each
+        - result.shape -> (3, 4096)     # signed peak correlation of each guess. Bit j of the guess flips bit j.
+
+    Arguments:
+        step_size: Number of traces that are processed in 1 step. If None, it is derived from the memory budget.
+        mem_budget: Number of bytes used for the correlation buffers and the covariances of the guesses.
+            The traces are processed in chunks, so the memory does not grow with the number of traces.
+            If None, `DEFAULT_MEM_BUDGET` is used without raising an error (see `Corr.auto_step_size`).
+    """
+    assert base.shape[0] == bits.shape[0] == y.shape[0]
+    assert base.shape[1] == bits.shape[1]
+    num_traces = base.shape[0]
+    num_parents, num_bits = bits.shape[1], bits.shape[2]
+    num_guesses = 2**num_bits
+    num_vars = num_bits + 1
+
+    # Variable 0 is the base, variables 1..n are the single bits.
+    # The variables are built chunk by chunk, so only one chunk is stored as float64.
+    corr = Corr((num_parents * num_vars, y.shape[1]))
+    if step_size is None:
+        step_size = corr.auto_step_size(mem_budget, num_traces)
+
+    # Sums of the products of the variables of each parent. The variables are small integers,
+    # so the sums are exact and the covariances are calculated from them at the end.
+    uu = np.zeros((num_parents, num_vars, num_vars), dtype=np.float64)
+    for i in range(0, num_traces, step_size):
+        u = np.concatenate(
+            [base[i : i + step_size, :, np.newaxis], bits[i : i + step_size]],
+            axis=2,
+            dtype=np.float64,
+        )
+        uu += np.einsum("npi,npj->pij", u, u)
+        corr.update(u.reshape((u.shape[0], -1)), y[i : i + step_size])
+
+    # Signs of the variables for each guess. The base is never flipped.
+    guesses = np.arange(num_guesses, dtype=np.uint32)
+    signs = np.ones((num_guesses, num_bits + 1), dtype=np.float64)
+    signs[:, 1:] -= 2 * ((guesses[:, np.newaxis] >> np.arange(num_bits)) & 1)
+
+    num_samples = y.shape[1]
+    budget = DEFAULT_MEM_BUDGET if mem_budget is None else mem_budget
+    block_size = max(1, min(num_samples, budget // (8 * num_guesses)))
+
+    peaks = np.zeros((num_parents, num_guesses), dtype=np.float64)
+    for p in range(num_parents):
+        cols = slice(p * num_vars, (p + 1) * num_vars)
+
+        # var(sum_j s_j u_j) = s^T C s
+        mean_u = corr.mx[cols]
+        cov_u = uu[p] - num_traces * np.outer(mean_u, mean_u)
+        var_guesses = np.einsum("gi,ij,gj->g", signs, cov_u, signs)
+
+        best = np.zeros(num_guesses, dtype=np.float64)
+        for start in range(0, num_samples, block_size):
+            end = min(start + block_size, num_samples)
+            cov_uy = corr.mxy[cols, start:end]
+
+            # Butterfly: guess g + 2^j differs from guess g only in the sign of bit j.
+            cov_guesses = np.empty((num_guesses, end - start), dtype=np.float64)
+            cov_guesses[0] = cov_uy.sum(axis=0)
+            for j in range(num_bits):
+                half = 2**j
+                np.subtract(
+                    cov_guesses[:half],
+                    2 * cov_uy[j + 1],
+                    out=cov_guesses[half : 2 * half],
+                )
+
+            cov_guesses /= np.sqrt(var_guesses[:, np.newaxis] * corr.myy[start:end])
+            block_peaks, _ = abs_max_along(cov_guesses, axis=1)
+            better = np.abs(block_peaks) > np.abs(best)
+            best[better] = block_peaks[better]
+
+        peaks[p] = best
+
+    return peaks
+
+
+@profiled
+def calc_peaks_second_order(
+    x: np.ndarray,
+    y: np.ndarray,
+    window: slice = slice(None),
+    step_size: int | None = None,
+    mem_budget: int | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Second order CPA for masked implementations. Each pair of samples (i, j) with i < j inside the window
+    is combined with the centered product (y_i - mean_i) * (y_j - mean_j). The T^2 / 2 combined samples are
+    never created at once. They are processed in tiles of sample pairs which fit into the memory budget,
+    and only the peak correlation of each hypothesis is kept.
+
+    Example:
+        - x.shape = (10000, 64)     # hamming weights of the unmasked intermediate state for 64 guessed keys
+        - y.shape = (10000, 5000)   # 10,000 measurements with 5,000 samples each
+        - window = slice(1000, 1400) -> 79,800 sample pairs
+        - result: peaks.shape = (64,), pairs.shape = (64, 2)  # signed peak correlation and its sample pair
+
+    Arguments:
+        step_size: Number of traces that are processed in 1 step. If None, it is derived from the memory budget.
+        mem_budget: Number of bytes used by the correlation buffers of one tile.
+            If None, `DEFAULT_MEM_BUDGET` is used without raising an error (see `Corr.auto_step_size`).
+    """
+    assert x.shape[0] == y.shape[0]
+    num_traces, num_hypos = x.shape
+    samples = np.arange(y.shape[1])[window]
+
+    budget = DEFAULT_MEM_BUDGET if mem_budget is None else mem_budget
+
+    # First pass: means of the samples in the window.
+    chunk_size = step_size or max(1, budget // (8 * max(len(samples), 1)))
+    mean = np.zeros(len(samples), dtype=np.float64)
+    for i in range(0, num_traces, chunk_size):
+        mean += y[i : i + chunk_size, window].sum(axis=0, dtype=np.float64)
+    mean /= num_traces
+
+    # A quarter of the budget for the cross products and GEMM result of a tile (2 * K * block^2 * 8 bytes),
+    # the rest for the chunks of traces.
+    block_size = max(2, int((budget / (4 * 2 * 8 * num_hypos)) ** 0.5))
+
+    peaks = np.zeros(num_hypos, dtype=np.float64)
+    pairs = np.zeros((num_hypos, 2), dtype=np.int64)
+
+    for row_start in range(0, len(samples), block_size):
+        for col_start in range(row_start, len(samples), block_size):
+            rows = np.arange(row_start, min(row_start + block_size, len(samples)))
+            cols = np.arange(col_start, min(col_start + block_size, len(samples)))
+            pi, pj = np.meshgrid(rows, cols, indexing="ij")
+            upper = pi < pj
+            pi, pj = pi[upper], pj[upper]
+            if len(pi) == 0:
+                continue
+
+            corr = Corr((num_hypos, len(pi)))
+            # Per trace: the centered window and the two gathered samples of each pair.
+            # The product is calculated in place of the first gathered samples.
+            tile_step = step_size or corr.auto_step_size(
+                mem_budget, num_traces, 8 * (len(samples) + 2 * len(pi))
+            )
+            for i in range(0, num_traces, tile_step):
+                yc = y[i : i + tile_step, window] - mean
+                combined = yc[:, pi]
+                combined *= yc[:, pj]
+                corr.update(x[i : i + tile_step], combined)
+
+            tile_peaks, tile_idx = corr.peaks()
+            better = np.abs(tile_peaks) > np.abs(peaks)
+            peaks[better] = tile_peaks[better]
+            pairs[better, 0] = samples[pi[tile_idx[better]]]
+            pairs[better, 1] = samples[pj[tile_idx[better]]]
+
+    return peaks, pairs
+
+
 class Corr:
-    def __init__(self, shape: tuple):
+    def __init__(
+        self,
+        shape: tuple,
+        dtype=np.float64,
+        top_k: int | None = None,
+        checkpoints: Sequence[int] | None = None,
+        keep_corrs: bool = False,
+    ):
         """Create a correlation calculator for data with the specified shape.
         Example:
             X represents hamming weights for 256 guessed keys
             Y represents power measurements for 5000 time steps
             -> shape = (256, 5000)
+
+        Arguments:
+            dtype: Data type of the centered chunks and the GEMM of each update.
+                The means, variances and cross products are always accumulated as float64.
+            top_k: If set, `leaderboard` holds the best top_k hypotheses. It is computed when it is read.
+            checkpoints: Numbers of traces after which a `Checkpoint` is added to `history`.
+                Updates are split at the checkpoints, so the chunk size does not matter.
+            keep_corrs: If set, the checkpoints also store the full correlation matrix.
         """
         self.n = 0
         self.shape = shape
+        self.dtype = np.dtype(dtype)
 
         self.mx = np.zeros(shape[0], dtype=np.float64)
         self.mxx = np.zeros(shape[0], dtype=np.float64)
@@ -63,6 +269,62 @@ class Corr:
 
         self.mxy = np.zeros(shape, dtype=np.float64)
 
+        # Scratch buffers which are reused between updates.
+        self._dx = np.empty((0, shape[0]), dtype=self.dtype)
+        self._dy = np.empty((0, shape[1]), dtype=self.dtype)
+        self._xy = np.empty(shape, dtype=self.dtype)
+
+        self.top_k = top_k
+        # Leaderboard of the current traces. None if it has to be computed again.
+        self._leaderboard: Leaderboard | None = None
+
+        self.checkpoints = sorted({int(c) for c in checkpoints or [] if c > 0})
+        self.keep_corrs = keep_corrs
+        self.history: list[Checkpoint] = []
+        self._next_checkpoint = 0
+
+    def auto_step_size(
+        self,
+        mem_budget: int | None = None,
+        max_traces: int | None = None,
+        extra_per_trace: int = 0,
+    ) -> int:
+        """Get the number of traces per update so that all buffers fit into the memory budget.
+        If an explicit `mem_budget` is passed, raise a ValueError if the cross products do not leave room
+        for the chunks, instead of falling back to one trace per update.
+        If `mem_budget` is None, `DEFAULT_MEM_BUDGET` only limits the chunks. The cross products are needed
+        for any step size, so they never turn a valid input into an error.
+        Example:
+            shape = (256, 5000), dtype = float64, mem_budget = 256 MiB
+            -> cross products and GEMM result use 256 * 5000 * (8 + 8) bytes = 20 MB
+            -> each trace uses (256 + 5000) * 8 bytes for the centered chunks
+            -> step size = 248 MB / 42 kB = 5896
+
+        Arguments:
+            extra_per_trace: Number of bytes per trace which the caller needs for its own buffers of a chunk.
+        """
+        item_size = self.dtype.itemsize
+        # The cross products are accumulated as float64, the GEMM result has the data type of the chunks.
+        fixed = self.shape[0] * self.shape[1] * (8 + item_size)
+        per_trace = (self.shape[0] + self.shape[1]) * item_size + extra_per_trace
+
+        if mem_budget is None:
+            mem_budget = DEFAULT_MEM_BUDGET
+            if mem_budget < fixed + per_trace:
+                # Only the chunks are limited by the default budget.
+                fixed = 0
+        elif mem_budget < fixed + per_trace:
+            raise ValueError(
+                f"Memory budget of {mem_budget} bytes is too small for a correlation of shape {self.shape}, "
+                f"it needs at least {fixed + per_trace} bytes."
+            )
+
+        step_size = max(1, (mem_budget - fixed) // per_trace)
+        if max_traces is not None:
+            step_size = max(1, min(step_size, max_traces))
+        return int(step_size)
+
+    @profiled
     def update(self, x_new: np.ndarray, y_new: np.ndarray):
         """Add a bunch of measurements to the correlation calculation.
         Example:
@@ -75,20 +337,150 @@ class Corr:
         assert x_new.shape[1] == self.shape[0]
         assert y_new.shape[1] == self.shape[1]
 
-        self.n += x_new.shape[0]
+        start = 0
+        while start < x_new.shape[0]:
+            # Never split at a checkpoint which is already behind, so each iteration adds traces.
+            while (
+                self._next_checkpoint < len(self.checkpoints)
+                and self.checkpoints[self._next_checkpoint] <= self.n
+            ):
+                self._next_checkpoint += 1
+
+            end = x_new.shape[0]
+            if self._next_checkpoint < len(self.checkpoints):
+                end = min(end, start + self.checkpoints[self._next_checkpoint] - self.n)
+
+            self._update(x_new[start:end], y_new[start:end])
+            start = end
+
+            if (
+                self._next_checkpoint < len(self.checkpoints)
+                and self.n == self.checkpoints[self._next_checkpoint]
+            ):
+                self.history.append(self.checkpoint())
+                self._next_checkpoint += 1
+
+    def _update(self, x_new: np.ndarray, y_new: np.ndarray):
+        num_new = x_new.shape[0]
+        if num_new == 0:
+            return
+        self.n += num_new
+
+        if self._dx.shape[0] < num_new:
+            self._dx = np.empty((num_new, self.shape[0]), dtype=self.dtype)
+            self._dy = np.empty((num_new, self.shape[1]), dtype=self.dtype)
+        dx = self._dx[:num_new]
+        dy = self._dy[:num_new]
+
+        # Center the new values with the old means.
+        np.subtract(x_new, self.mx, out=dx, casting="same_kind")
+        np.subtract(y_new, self.my, out=dy, casting="same_kind")
 
-        dx = x_new - self.mx
-        dy = y_new - self.my
+        sum_dx = dx.sum(axis=0, dtype=np.float64)
+        sum_dy = dy.sum(axis=0, dtype=np.float64)
+        delta_x = sum_dx / self.n
+        delta_y = sum_dy / self.n
 
-        self.mx += dx.sum(axis=0) / self.n
-        self.my += dy.sum(axis=0) / self.n
+        self.mx += delta_x
+        self.my += delta_y
 
-        dx2 = x_new - self.mx
-        dy2 = y_new - self.my
+        # sum((x - mx_old) * (x - mx_new)) = sum((x - mx_old)^2) - delta * sum(x - mx_old)
+        self.mxx += np.einsum("ij,ij->j", dx, dx, dtype=np.float64)
+        self.mxx -= delta_x * sum_dx
 
-        self.mxx += np.sum(dx * dx2, axis=0)
-        self.myy += np.sum(dy * dy2, axis=0)
-        self.mxy += dx.T @ dy2
+        # Center y with the new means in place and accumulate the cross products.
+        dy -= delta_y.astype(self.dtype)
+        self.myy += np.einsum("ij,ij->j", dy, dy, dtype=np.float64) + delta_y * (
+            sum_dy - num_new * delta_y
+        )
+        np.matmul(dx.T, dy, out=self._xy)
+        self.mxy += self._xy
+
+        self._leaderboard = None
+
+    def merge(self, other: "Corr"):
+        """Add the traces of another accumulator with the same hypotheses and samples, e.g. from another worker or board.
+        The centered sums are combined with the pairwise formula of Chan et al.:
+            M_xy = M_xy_a + M_xy_b + (mx_b - mx_a) * (my_b - my_a) * na * nb / n
+        Cannot be combined with checkpoints, because the merged traces would skip them.
+        """
+        assert other.shape == self.shape
+        if len(self.checkpoints) > 0:
+            raise ValueError("Traces cannot be merged into a Corr with checkpoints.")
+
+        if other.n == 0:
+            return
+        if self.n == 0:
+            self.n = other.n
+            self.mx, self.mxx = other.mx.copy(), other.mxx.copy()
+            self.my, self.myy = other.my.copy(), other.myy.copy()
+            self.mxy = other.mxy.copy()
+        else:
+            na, nb = self.n, other.n
+            n = na + nb
+            delta_x = other.mx - self.mx
+            delta_y = other.my - self.my
+            factor = na * nb / n
+
+            self.mxx += other.mxx + delta_x * delta_x * factor
+            self.myy += other.myy + delta_y * delta_y * factor
+            self.mxy += other.mxy
+            self.mxy += np.outer(delta_x * factor, delta_y)
+
+            self.mx += delta_x * nb / n
+            self.my += delta_y * nb / n
+            self.n = n
+
+        self._leaderboard = None
+
+    def to_state(self) -> dict:
+        """Get the accumulated values, e.g. to send them to another process or to save them with `np.savez`."""
+        return {
+            "n": self.n,
+            "mx": self.mx.copy(),
+            "mxx": self.mxx.copy(),
+            "my": self.my.copy(),
+            "myy": self.myy.copy(),
+            "mxy": self.mxy.copy(),
+            "dtype": self.dtype.str,
+        }
+
+    @staticmethod
+    def from_state(state: dict) -> "Corr":
+        mxy = np.asarray(state["mxy"])
+        corr = Corr(mxy.shape, dtype=np.dtype(str(state["dtype"])))
+        corr.n = int(state["n"])
+        for name in ["mx", "mxx", "my", "myy", "mxy"]:
+            setattr(corr, name, np.asarray(state[name], dtype=np.float64).copy())
+        return corr
+
+    def save(self, path: str):
+        np.savez(path, **self.to_state())
+
+    @staticmethod
+    def load(path: str) -> "Corr":
+        with np.load(path) as state:
+            return Corr.from_state(state)
+
+    def select(self, rows: np.ndarray):
+        """Keep only the selected hypotheses, e.g. after pruning. Later updates only get the x values of these hypotheses.
+        Cannot be combined with checkpoints, because `peaks_over_num_traces` needs the same hypotheses at each checkpoint.
+        Example:
+            shape = (256, 5000), rows = [3, 17, 42]
+            -> shape = (3, 5000)
+        """
+        if len(self.checkpoints) > 0:
+            raise ValueError(
+                "Hypotheses cannot be selected from a Corr with checkpoints."
+            )
+        self.mx = self.mx[rows]
+        self.mxx = self.mxx[rows]
+        self.mxy = self.mxy[rows]
+        self.shape = (self.mx.shape[0], self.shape[1])
+
+        self._dx = np.empty((0, self.shape[0]), dtype=self.dtype)
+        self._xy = np.empty(self.shape, dtype=self.dtype)
+        self._leaderboard = None
 
     def c(self) -> np.ndarray:
         num = self.mxy
@@ -103,7 +495,139 @@ class Corr:
         if axis is None:
             return abs_max(corrs)
         else:
-            return np.apply_along_axis(abs_max, axis, corrs)
+            return abs_max_along(corrs, axis)[0]
+
+    @profiled
+    def peaks(self) -> tuple[np.ndarray, np.ndarray]:
+        """Get the signed correlation with the highest absolute value for each hypothesis
+        and the index of the sample where it occurs.
+        Example:
+            shape = (256, 5000)
+            -> peaks.shape = (256,), sample_idx.shape = (256,)
+        """
+        return abs_max_along(self.c(), axis=1)
+
+    def checkpoint(self) -> "Checkpoint":
+        corrs = self.c()
+        peaks, sample_idx = abs_max_along(corrs, axis=1)
+        return Checkpoint(
+            self.n, peaks, sample_idx, corrs.copy() if self.keep_corrs else None
+        )
+
+    def peaks_over_num_traces(self) -> tuple[np.ndarray, np.ndarray]:
+        """Get the numbers of traces of the checkpoints and the peak correlations at each checkpoint.
+        Example:
+            shape = (256, 5000), checkpoints = [50, 100, ..., 5000]
+            -> num_traces.shape = (100,), peaks.shape = (256, 100)
+        """
+        num_traces = np.array([c.n for c in self.history], dtype=np.int64)
+        peaks = np.zeros((self.shape[0], len(self.history)), dtype=np.float64)
+        for i, c in enumerate(self.history):
+            peaks[:, i] = c.peaks
+        return num_traces, peaks
+
+    @property
+    def leaderboard(self) -> "Leaderboard | None":
+        """The best `top_k` hypotheses. The (K x T) correlations are only computed when the leaderboard
+        is read after an update, not after every update.
+        """
+        if self.top_k is None:
+            return None
+        if self._leaderboard is None:
+            self._leaderboard = self.get_leaderboard(self.top_k)
+        return self._leaderboard
+
+    def get_leaderboard(self, k: int) -> "Leaderboard":
+        """Get the k hypotheses with the highest absolute peak correlation, best first."""
+        peaks, sample_idx = self.peaks()
+        return Leaderboard.from_peaks(peaks, sample_idx, k)
+
+
+def merge_corrs(corrs: list[Corr]) -> Corr:
+    """Merge the accumulators of trace shards in a tree of pairwise merges. The first accumulator holds the result.
+    Example:
+        4 workers each process 1/4 of the traces for the same hypotheses
+        -> merge_corrs([c0, c1, c2, c3]).c() == correlation over all traces
+    """
+    assert len(corrs) > 0
+    while len(corrs) > 1:
+        for i in range(0, len(corrs) - 1, 2):
+            corrs[i].merge(corrs[i + 1])
+        corrs = corrs[::2]
+    return corrs[0]
+
+
+class Checkpoint:
+    """Snapshot of a `Corr` after `n` traces."""
+
+    def __init__(
+        self,
+        n: int,
+        peaks: np.ndarray,
+        sample_idx: np.ndarray,
+        corrs: np.ndarray | None = None,
+    ):
+        self.n = n
+        self.peaks = peaks
+        self.sample_idx = sample_idx
+        self.corrs = corrs
+
+
+def get_ranks(peaks: np.ndarray, correct_idx: int) -> np.ndarray:
+    """Get the rank of the correct hypothesis at each checkpoint. Rank 0 is the best.
+    Hypotheses with the same absolute peak (e.g. the inverted key) share the rank.
+    Example:
+        peaks.shape = (256, 100)
+        -> ranks.shape = (100,)
+    """
+    abs_peaks = np.abs(peaks)
+    return np.sum(abs_peaks > abs_peaks[correct_idx], axis=0)
+
+
+def traces_to_disclosure(
+    num_traces: np.ndarray, peaks: np.ndarray, correct_idx: int
+) -> int | None:
+    """Get the number of traces from which on the correct hypothesis has rank 0 at all following checkpoints.
+    Return None if the correct hypothesis is not the best one at the last checkpoint.
+    Example:
+        num_traces = [100, 200, 300, 400], ranks = [3, 0, 1, 0]
+        -> 400
+    """
+    ranks = get_ranks(peaks, correct_idx)
+    if ranks.shape[0] == 0 or ranks[-1] != 0:
+        return None
+
+    wrong = np.nonzero(ranks != 0)[0]
+    first = wrong[-1] + 1 if wrong.shape[0] > 0 else 0
+    return int(num_traces[first])
+
+
+class Leaderboard:
+    """The best hypotheses of a correlation calculation, sorted by absolute peak correlation.
+    `hypo_idx` are the row indices in the correlation matrix.
+    """
+
+    def __init__(
+        self, hypo_idx: np.ndarray, peaks: np.ndarray, sample_idx: np.ndarray
+    ):
+        self.hypo_idx = hypo_idx
+        self.peaks = peaks
+        self.sample_idx = sample_idx
+
+    @staticmethod
+    def from_peaks(
+        peaks: np.ndarray, sample_idx: np.ndarray, k: int
+    ) -> "Leaderboard":
+        k = min(k, peaks.shape[0])
+        abs_peaks = np.abs(peaks)
+
+        # Only sort the k best entries.
+        best = np.argpartition(-abs_peaks, k - 1)[:k] if k > 0 else np.arange(0)
+        best = best[np.argsort(-abs_peaks[best], kind="stable")]
+        return Leaderboard(best, peaks[best], sample_idx[best])
+
+    def __len__(self) -> int:
+        return len(self.hypo_idx)
 
 
 def abs_max(arr: np.ndarray):
@@ -111,3 +635,15 @@ def abs_max(arr: np.ndarray):
         arr = arr.flatten()
 
     return arr[np.argmax(np.abs(arr))]
+
+
+def abs_max_along(arr: np.ndarray, axis: int = 1) -> tuple[np.ndarray, np.ndarray]:
+    """Get the value with the highest absolute value along an axis and its index.
+    Example:
+        arr = [[0.1, -0.5, 0.2],
+               [0.3,  0.0, 0.1]]
+        -> values = [-0.5, 0.3], indices = [1, 0]
+    """
+    idx = np.argmax(np.abs(arr), axis=axis)
+    vals = np.take_along_axis(arr, np.expand_dims(idx, axis), axis=axis)
+    return np.squeeze(vals, axis=axis), idx
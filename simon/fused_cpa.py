@@ -0,0 +1,175 @@
+import numpy as np
+
+import correlations
+import leakage_models
+import simon_64_128_simulation
+
+from hamming import hamming_weight
+from leakage_models import AttackedState
+from profiling import profiled
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def has_numba() -> bool:
+    return numba is not None
+
+
+def predict_hws_tile(
+    unique_states: tuple[np.ndarray, np.ndarray, np.ndarray],
+    inverse: np.ndarray,
+    round_keys: np.ndarray,
+    mask: np.uint32,
+    attacked_state: AttackedState,
+    out: np.ndarray,
+    use_numba: bool | None = None,
+):
+    """Predict the hamming weights of the attacked state for a tile of traces and keys.
+    Round evaluation, leakage model, masking and popcount are fused, so only the tile of hamming weights is written.
+
+    Example:
+        unique_states from `PrefixStateCache.get_unique_states` for the traces of the tile, shape (1000, 3)
+        inverse.shape = round_keys.shape = (256,)
+        -> out.shape = (1000, 256)
+
+    Arguments:
+        use_numba: Use the compiled kernel. If None, it is used if Numba is installed and supports the model.
+            Models without a `kernel_id`, e.g. replacements of the built-in models, always use the NumPy kernel.
+    """
+    x, _, t = unique_states
+    model = leakage_models.get_model(attacked_state)
+    use_numba = use_numba is not False and has_numba() and model.kernel_id is not None
+
+    if use_numba:
+        _predict_hws_numba(
+            t,
+            x,
+            inverse,
+            round_keys,
+            np.uint32(mask),
+            model.kernel_id,
+            out,
+        )
+        return
+
+    new_x = t[:, inverse]
+    new_x ^= round_keys
+    states = model.predict(new_x, x[:, inverse] if model.uses_previous_state else None)
+    states &= mask
+    hamming_weight(states, out=out)
+
+
+@profiled
+def score_keys_fused(
+    keys: np.ndarray,
+    plaintexts: np.ndarray,
+    power: np.ndarray,
+    attacked_round: int,
+    mask: np.uint32,
+    attacked_state: AttackedState = "ADD_ROUND_KEY",
+    cache: simon_64_128_simulation.PrefixStateCache | None = None,
+    window: slice = slice(None),
+    trace_tile: int | None = None,
+    mem_budget: int | None = None,
+    use_numba: bool | None = None,
+) -> np.ndarray:
+    """Calculate the peak correlation of each key like `scoring.score_keys`, but tile by tile.
+    The hamming weights of a tile of traces are predicted directly into the buffer which is passed to
+    `Corr.update`, so neither the (N x K) states nor the (N x K) hamming weights are stored.
+    Only the key independent states of the distinct key prefixes are kept for all traces.
+    If the cross products of all keys take more than half of the memory budget, the keys are scored in shards.
+
+    Example:
+        keys.shape = (100000, 4), power.shape = (10000, 5000), mem_budget = 256 MiB
+        -> the cross products of all keys would need 100000 * 5000 * 16 bytes = 8 GB, so the keys are scored
+           in 60 shards of 1677 keys. The traces of a shard are processed in tiles which fit into the rest
+           of the budget.
+
+    Arguments:
+        trace_tile: Number of traces per tile. If None, it is derived from the memory budget.
+        use_numba: See `predict_hws_tile`.
+    """
+    if keys.ndim == 1:
+        keys = keys.reshape((1, 4))
+    if cache is None:
+        cache = simon_64_128_simulation.PrefixStateCache(plaintexts, max_bytes=0)
+    else:
+        cache.check_plaintexts(plaintexts)
+
+    power = power[:, window]
+    num_traces, num_samples = power.shape
+    unique_states, inverse = cache.get_unique_states(keys[:, 4 - attacked_round :])
+    round_keys = np.ascontiguousarray(keys[:, 3 - attacked_round])
+
+    # Cross products and GEMM result of one key take 16 bytes per sample.
+    budget = correlations.DEFAULT_MEM_BUDGET if mem_budget is None else mem_budget
+    keys_per_shard = max(1, budget // 2 // (num_samples * 16))
+    peaks = np.empty(keys.shape[0], dtype=np.float64)
+    for shard_start in range(0, keys.shape[0], keys_per_shard):
+        shard = slice(shard_start, shard_start + keys_per_shard)
+        num_keys = len(round_keys[shard])
+
+        corr = correlations.Corr((num_keys, num_samples))
+        shard_tile = trace_tile
+        if shard_tile is None:
+            shard_tile = corr.auto_step_size(
+                mem_budget, num_traces, extra_per_trace=num_keys * 8
+            )
+        hws = np.empty((shard_tile, num_keys), dtype=np.float64)
+
+        for start in range(0, num_traces, shard_tile):
+            end = min(start + shard_tile, num_traces)
+            tile = hws[: end - start]
+            predict_hws_tile(
+                tuple(s[start:end] for s in unique_states),
+                inverse[shard],
+                round_keys[shard],
+                mask,
+                attacked_state,
+                tile,
+                use_numba,
+            )
+            corr.update(tile, power[start:end])
+
+        peaks[shard], _ = corr.peaks()
+    return peaks
+
+
+if numba is not None:
+    _M1 = np.uint64(0x55555555)
+    _M2 = np.uint64(0x33333333)
+    _M4 = np.uint64(0x0F0F0F0F)
+    _H01 = np.uint64(0x01010101)
+    _MASK32 = np.uint64(0xFFFFFFFF)
+
+    @numba.njit(inline="always")
+    def _rotl(v, n):
+        return ((v << np.uint64(n)) | (v >> np.uint64(32 - n))) & _MASK32
+
+    @numba.njit(inline="always")
+    def _popcount32(v):
+        v = v - ((v >> np.uint64(1)) & _M1)
+        v = (v & _M2) + ((v >> np.uint64(2)) & _M2)
+        v = (v + (v >> np.uint64(4))) & _M4
+        return ((v * _H01) & _MASK32) >> np.uint64(24)
+
+    @numba.njit(parallel=True, cache=True)
+    def _predict_hws_numba(t, x, inverse, round_keys, mask, model_id, out):
+        # model_id is the `kernel_id` of the built-in leakage models.
+        num_traces, num_keys = out.shape
+        mask = np.uint64(mask)
+        for k in numba.prange(num_keys):
+            u = inverse[k]
+            round_key = np.uint64(round_keys[k])
+            for n in range(num_traces):
+                v = np.uint64(t[n, u]) ^ round_key
+                if model_id == 1:
+                    v = _rotl(v, 1) & _rotl(v, 8)
+                elif model_id == 2:
+                    v = (_rotl(v, 1) & _rotl(v, 8)) ^ _rotl(v, 2)
+                elif model_id == 3:
+                    v = v ^ np.uint64(x[n, u])
+                out[n, k] = _popcount32(v & mask)
@@ -0,0 +1,48 @@
+import numpy as np
+
+from profiling import profiled
+
+
+# Hamming weight of every 16 bit value. Used if numpy does not provide a native popcount.
+_HW16 = np.zeros(1 << 16, dtype=np.uint8)
+for _bit in range(16):
+    _HW16 += ((np.arange(1 << 16, dtype=np.uint32) >> _bit) & 1).astype(np.uint8)
+del _bit
+
+
+@profiled
+def hamming_weight(
+    x: np.ndarray, out: np.ndarray | None = None, dtype=np.uint8
+) -> np.ndarray:
+    """Calculate the hamming weight of each element of an unsigned integer array.
+    The calculation runs entirely in numpy without any python calls per element.
+
+    Example:
+        x = np.array([0x00000000, 0x0000FFFF, 0xFFFFFFFF], dtype=np.uint32)
+        hamming_weight(x) -> np.array([0, 16, 32], dtype=np.uint8)
+
+    Arguments:
+        out: Optional buffer with the same shape as x to write the result into.
+        dtype: Data type of the result if no buffer is given. uint8 is sufficient for words up to 64 bits.
+    """
+    x = np.asarray(x)
+    if x.dtype.kind not in "ui":
+        raise TypeError(f"Invalid data type for hamming weight: {x.dtype}")
+
+    # Reinterpret signed values as unsigned values of the same size.
+    x = x.astype(f"u{x.dtype.itemsize}", copy=False)
+
+    if out is None:
+        out = np.empty(x.shape, dtype=dtype)
+    assert out.shape == x.shape
+
+    if hasattr(np, "bitwise_count"):
+        np.bitwise_count(x, out=out, casting="unsafe")
+    else:
+        out[...] = _HW16[x & 0xFFFF]
+        for shift in range(16, 8 * x.dtype.itemsize, 16):
+            out += _HW16[(x >> shift) & 0xFFFF]
+
+    if out.ndim == 0:
+        return out[()]
+    return out
@@ -1,12 +1,16 @@
 from typing import Literal
 import numpy as np
 
+import leakage_models
 import simon_64_128_simulation
 import correlations
+import scoring
 
+from hamming import hamming_weight as bits_count
+from leakage_models import AttackedState
 from measurement import Measurements
-
-bits_count = np.frompyfunc(int.bit_count, 1, 1)
+from profiling import profiled
+from simon_64_128_simulation import PrefixStateCache
 
 
 class KeyHypothesis:
@@ -25,39 +29,14 @@ class KeyHypothesis:
         self.corr = corr
 
     def get_intermediate_mask(
-        self, attacked_round: int, attacked_state: Literal["ADD_ROUND_KEY", "AND_GATE"]
+        self, attacked_round: int, attacked_state: AttackedState
     ) -> np.uint32:
         """Create a bitmask which has all bits set to 1 where the guessed key bits have influence on the attacked intermediate state.
-
-        Example:
-        ```
-            When attacking the state after adding the round key, each guessed key bit has influence on exactly 1 bit of the intermediate state
-            self.bit_mask = [0x00000000, 0x00000000, 0x00000000, 0x0000FFFF], attacked_round = 0, attacked_state = ADD_ROUND_KEY
-            -> intermediate_mask = 0x0000FFFF
-
-            self.bit_mask = [0x00000000, 0x00000000, 0x00FFFFFF, 0xFFFFFFFF], attacked_round = 1, attacked_state = ADD_ROUND_KEY
-            -> intermediate_mask = 0x00FFFFFF
-
-            When attacking the state after the AND gate, the resulting mask should only have the bits which can be predicted with the guessed key.
-            self.bit_mask = [0x00000000, 0x00000000, 0x00000000, 0x0000FFFF], attacked_round = 0, attacked_state = AND_GATE
-            -> intermediate_mask = 0x0001FF00
-        ```
+        See `get_intermediate_mask`.
         """
+        return get_intermediate_mask(self.bit_mask, attacked_round, attacked_state)
 
-        key_mask = self.bit_mask[3 - attacked_round]
-
-        if attacked_state == "ADD_ROUND_KEY":
-            intermediate_mask = key_mask
-        elif attacked_state == "AND_GATE":
-            # based on the key mask, perform the rotations (<<<1 and <<<8) to get all bits which can be predicted with the guessed key.
-            intermediate_mask = np.uint32(
-                ((key_mask << 1) | (key_mask >> 31))
-                & ((key_mask << 8) | (key_mask >> 24))
-            )
-        else:
-            raise ValueError(f"Invalid attacked state: {attacked_state}")
-        return intermediate_mask
-
+    @profiled
     def get_sub_hypos(self, new_mask: np.ndarray) -> list["KeyHypothesis"]:
         """Get a list of all sub hypothesis for the current hypothesis with additionally guessed bits according to the new mask
 
@@ -73,31 +52,292 @@ class KeyHypothesis:
         ```
         """
 
-        # Calculate number of bits which are newly guessed
+        # Calculate the bits which are newly guessed
         new_bits = new_mask & ~self.bit_mask
-        num_new_bits = np.sum(bits_count(new_bits))
 
         # Array with new key guesses. The number of keys is based on the number of newly guessed bits.
         # If 8 additional bits are guessed, there will be 256 new keys with all combinations of the guessed bits.
-        new_key_vals = np.tile(self.key, (2**num_new_bits, 1))
+        new_key_vals = self.key | get_bit_deposits(new_bits)
+
+        return [
+            KeyHypothesis(new_key_vals[i], new_mask) for i in range(len(new_key_vals))
+        ]
 
-        helper_vals = np.arange(2**num_new_bits, dtype=np.uint32)
 
-        new_bit_idx = 0
-        for word_idx in range(3, -1, -1):
-            for abs_bit_idx in range(32):
-                # If the current bit is a newly guessed bit, set the values in new_key_vals according to the helper_vals.
-                if new_bits[word_idx] & (1 << abs_bit_idx):
-                    new_key_vals[:, word_idx] |= (
-                        (helper_vals >> new_bit_idx) & 1
-                    ) << abs_bit_idx
-                    new_bit_idx += 1
+class HypothesisSet:
+    """Array backed population of key hypotheses which all guess the same bits.
+    The argument `bit_mask` tells which bits in the keys are guessed.
+
+    Example:
+        keys.shape = (1000, 4)      # 1000 guessed keys with 4 words each
+        bit_mask.shape = (4,)       # shared by all keys
+        corrs.shape = (1000,)       # correlation of each key to the measurement
+    """
 
+    def __init__(
+        self,
+        keys: np.ndarray,
+        bit_mask: np.ndarray,
+        corrs: np.ndarray | None = None,
+    ):
+        if keys.ndim == 1:
+            keys = keys.reshape((1, 4))
+        assert keys.shape[1] == 4
+
+        self.keys = np.ascontiguousarray(keys, dtype=np.uint32)
+        self.bit_mask = np.array(bit_mask, dtype=np.uint32)
+        if corrs is None:
+            corrs = np.zeros(keys.shape[0], dtype=np.float64)
+        self.corrs = np.asarray(corrs, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return self.keys.shape[0]
+
+    @staticmethod
+    def from_hypos(hypos: list[KeyHypothesis]) -> "HypothesisSet":
+        """Create a hypothesis set from key hypotheses which all guess the same bits."""
+        return HypothesisSet(
+            np.array([h.key for h in hypos], dtype=np.uint32),
+            hypos[0].bit_mask,
+            np.array([h.corr for h in hypos], dtype=np.float64),
+        )
+
+    def to_hypos(self) -> list[KeyHypothesis]:
         return [
-            KeyHypothesis(new_key_vals[i], new_mask) for i in range(len(new_key_vals))
+            KeyHypothesis(key, self.bit_mask, corr)
+            for key, corr in zip(self.keys, self.corrs)
         ]
 
+    def get_intermediate_mask(
+        self, attacked_round: int, attacked_state: AttackedState
+    ) -> np.uint32:
+        return get_intermediate_mask(self.bit_mask, attacked_round, attacked_state)
+
+    @profiled
+    def expand(self, new_mask: np.ndarray) -> "HypothesisSet":
+        """Get all sub hypotheses with additionally guessed bits according to the new mask.
+        The sub hypotheses of each key are stored next to each other in the same order as `KeyHypothesis.get_sub_hypos`.
+
+        Example:
+            len(self) = 10, 6 newly guessed bits
+            -> len(result) = 640
+        """
+        new_bits = new_mask & ~self.bit_mask
+        deposits = get_bit_deposits(new_bits)
+
+        new_keys = np.repeat(self.keys, deposits.shape[0], axis=0)
+        new_keys.reshape((len(self), deposits.shape[0], 4))[...] |= deposits
+        return HypothesisSet(new_keys, new_mask)
+
+    @profiled
+    def filter(self, threshold: float) -> "HypothesisSet":
+        """Keep only the hypotheses whose absolute correlation is within the threshold of the best one.
+        Hypotheses without a correlation (NaN, e.g. dropped by the early abort CPA) are removed.
+        """
+        abs_corrs = np.abs(self.corrs)
+        keep = abs_corrs > np.nanmax(abs_corrs) - threshold
+        return HypothesisSet(self.keys[keep], self.bit_mask, self.corrs[keep])
+
+    @profiled
+    def best(self, k: int) -> "HypothesisSet":
+        """Keep only the k hypotheses with the highest absolute correlation, best first.
+        Hypotheses without a correlation (NaN, e.g. dropped by the early abort CPA) are removed.
+        """
+        scored = ~np.isnan(self.corrs)
+        if not np.all(scored):
+            return HypothesisSet(
+                self.keys[scored], self.bit_mask, self.corrs[scored]
+            ).best(k)
+        if len(self) == 0:
+            return self
+        board = correlations.Leaderboard.from_peaks(self.corrs, np.zeros(len(self)), k)
+        return HypothesisSet(self.keys[board.hypo_idx], self.bit_mask, board.peaks)
+
+    def concat(self, other: "HypothesisSet") -> "HypothesisSet":
+        assert np.array_equal(self.bit_mask, other.bit_mask)
+        return HypothesisSet(
+            np.concatenate([self.keys, other.keys]),
+            self.bit_mask,
+            np.concatenate([self.corrs, other.corrs]),
+        )
 
+    @profiled
+    def score(
+        self,
+        measurements: Measurements,
+        attacked_round: int,
+        attacked_state: AttackedState = "ADD_ROUND_KEY",
+        num_workers: int = 1,
+        shard_size: int = scoring.DEFAULT_SHARD_SIZE,
+        cache: PrefixStateCache | None = None,
+        order: Literal[1, 2] = 1,
+        window: slice = slice(None),
+        fused: bool = False,
+        pool: scoring.ScoringPool | None = None,
+        mem_budget: int | None = None,
+    ):
+        """Calculate the correlation of each hypothesis to the measurements. See `calc_corrs_for_hypos`.
+        Pass a `scoring.ScoringPool` to reuse the worker processes between calls.
+        """
+        mask = self.get_intermediate_mask(attacked_round, attacked_state)
+        self.corrs = scoring.score_keys_sharded(
+            self.keys,
+            measurements.plaintext,
+            measurements.power,
+            attacked_round,
+            mask,
+            attacked_state,
+            num_workers,
+            shard_size,
+            cache,
+            order,
+            window,
+            fused,
+            pool,
+            mem_budget,
+        )
+
+    @profiled
+    def score_sequential(
+        self,
+        measurements: Measurements,
+        attacked_round: int,
+        attacked_state: AttackedState = "ADD_ROUND_KEY",
+        confidence: float = 3.0,
+        first_batch: int = scoring.DEFAULT_FIRST_BATCH,
+        window: slice = slice(None),
+        cache: PrefixStateCache | None = None,
+        mem_budget: int | None = None,
+    ) -> np.ndarray:
+        """Calculate the correlations with the early abort CPA (see `scoring.score_keys_sequential`).
+        Hypotheses which are dropped early get a correlation of NaN. Return the number of traces used per hypothesis.
+        """
+        mask = self.get_intermediate_mask(attacked_round, attacked_state)
+        self.corrs, used_traces = scoring.score_keys_sequential(
+            self.keys,
+            measurements.plaintext,
+            measurements.power,
+            attacked_round,
+            mask,
+            attacked_state,
+            confidence,
+            first_batch,
+            window,
+            cache,
+            mem_budget,
+        )
+        return used_traces
+
+
+@profiled
+def expand_and_score_fast(
+    parents: HypothesisSet,
+    new_mask: np.ndarray,
+    measurements: Measurements,
+    attacked_round: int,
+    cache: PrefixStateCache | None = None,
+    mem_budget: int | None = None,
+) -> HypothesisSet:
+    """Expand the parents with the newly guessed bits and score all sub hypotheses with the fast CPA
+    for the ADD_ROUND_KEY state (see `correlations.calc_peaks_bit_flips`).
+    The hamming weights of the sub hypotheses are never calculated, so 12-16 bits can be guessed per step.
+    All newly guessed bits must be in the round key of the attacked round.
+
+    Example:
+        len(parents) = 4, 12 newly guessed bits
+        -> len(result) = 16384, same order as `parents.expand(new_mask)`
+    """
+    word_idx = 3 - attacked_round
+    new_bits = new_mask & ~parents.bit_mask
+    if np.any(np.delete(new_bits, word_idx) != 0):
+        raise ValueError("All newly guessed bits must be in the attacked round key.")
+
+    if np.any(parents.keys & new_bits != 0):
+        raise ValueError("The newly guessed bits of the parents must be 0.")
+
+    new_word_bits = new_bits[word_idx]
+    fixed_mask = get_intermediate_mask(new_mask, attacked_round, "ADD_ROUND_KEY")
+    fixed_mask &= ~new_word_bits
+    positions = np.nonzero((new_word_bits >> np.arange(32, dtype=np.uint32)) & 1)[0]
+
+    # The newly guessed bits of the parents are 0, so the state bits are not flipped.
+    xs = simon_64_128_simulation.get_inter_states(
+        measurements.plaintext, parents.keys, attacked_round, "ADD_ROUND_KEY", cache
+    )
+    base = bits_count(xs & fixed_mask)
+    bits = (xs[:, :, np.newaxis] >> positions.astype(np.uint32)) & 1
+
+    children = parents.expand(new_mask)
+    children.corrs = correlations.calc_peaks_bit_flips(
+        base, bits.astype(np.uint8), measurements.power, mem_budget=mem_budget
+    ).reshape(-1)
+    return children
+
+
+def get_intermediate_mask(
+    bit_mask: np.ndarray,
+    attacked_round: int,
+    attacked_state: AttackedState,
+) -> np.uint32:
+    """Create a bitmask which has all bits set to 1 where the guessed key bits have influence on the attacked intermediate state.
+
+    Example:
+    ```
+        When attacking the state after adding the round key, each guessed key bit has influence on exactly 1 bit of the intermediate state
+        bit_mask = [0x00000000, 0x00000000, 0x00000000, 0x0000FFFF], attacked_round = 0, attacked_state = ADD_ROUND_KEY
+        -> intermediate_mask = 0x0000FFFF
+
+        bit_mask = [0x00000000, 0x00000000, 0x00FFFFFF, 0xFFFFFFFF], attacked_round = 1, attacked_state = ADD_ROUND_KEY
+        -> intermediate_mask = 0x00FFFFFF
+
+        When attacking the state after the AND gate, the resulting mask should only have the bits which can be predicted with the guessed key.
+        bit_mask = [0x00000000, 0x00000000, 0x00000000, 0x0000FFFF], attacked_round = 0, attacked_state = AND_GATE
+        -> intermediate_mask = 0x0001FF00
+    ```
+    Raise a ValueError if the mask is 0, because the CPA would only get constant hamming weights.
+    """
+
+    key_mask = bit_mask[3 - attacked_round]
+    intermediate_mask = np.uint32(
+        leakage_models.get_model(attacked_state).get_mask(key_mask)
+    )
+    if intermediate_mask == 0:
+        raise ValueError(
+            f"The guessed bits of round {attacked_round} do not predict any bit of {attacked_state}."
+        )
+    return intermediate_mask
+
+
+def get_bit_deposits(new_bits: np.ndarray) -> np.ndarray:
+    """Get all combinations of values for the newly guessed bits, placed at their positions in the key.
+    The bits are numbered from the lowest bit of the last word to the highest bit of the first word.
+
+    Example:
+    ```
+    new_bits = [0x00000000, 0x00000000, 0x00000001, 0x00000100]
+    result =
+    [ [0x00000000, 0x00000000, 0x00000000, 0x00000000]
+      [0x00000000, 0x00000000, 0x00000000, 0x00000100]
+      [0x00000000, 0x00000000, 0x00000001, 0x00000000]
+      [0x00000000, 0x00000000, 0x00000001, 0x00000100] ]
+    ```
+    """
+    # Word and bit index of each newly guessed bit.
+    word_idx, bit_idx = np.nonzero(
+        (new_bits[::-1, np.newaxis] >> np.arange(32, dtype=np.uint32)) & 1
+    )
+    word_idx = 3 - word_idx
+
+    helper_vals = np.arange(2 ** len(word_idx), dtype=np.uint32)
+    deposits = np.zeros((len(helper_vals), 4), dtype=np.uint32)
+
+    # Scatter bit i of the helper values to its position in the key.
+    for new_bit_idx, (w, b) in enumerate(zip(word_idx, bit_idx)):
+        deposits[:, w] |= ((helper_vals >> new_bit_idx) & 1) << np.uint32(b)
+    return deposits
+
+
+@profiled
 def filter_hypos(hypos: list[KeyHypothesis], threshold: float) -> list[KeyHypothesis]:
     """Go through a list of key hypotheses and creates a new list which only
     contains promising hypotheses.
@@ -108,31 +348,55 @@ def filter_hypos(hypos: list[KeyHypothesis], threshold: float) -> list[KeyHypoth
     return remaining_hypotheses
 
 
+@profiled
 def calc_corrs_for_hypos(
     hypos: list[KeyHypothesis],
     measurements: Measurements,
     attacked_round: int,
-    attacked_state: Literal["ADD_ROUND_KEY", "AND_GATE"] = "ADD_ROUND_KEY",
+    attacked_state: AttackedState = "ADD_ROUND_KEY",
+    num_workers: int = 1,
+    shard_size: int = scoring.DEFAULT_SHARD_SIZE,
+    cache: PrefixStateCache | None = None,
+    order: Literal[1, 2] = 1,
+    window: slice = slice(None),
+    fused: bool = False,
+    mem_budget: int | None = None,
 ):
     """For each combination of key and plaintext, calculate the hammmings weight of the attacked state.
     Calculate the correlation between the calculate hamming weights and power traces.
     For each hypothesis, find the maximum correlation over time.
     Write the result to the hypothesis object.
+
+    Arguments:
+        num_workers: Number of processes which score the hypotheses in parallel.
+        shard_size: Number of hypotheses which are scored together.
+        cache: Cache for the states of the recovered rounds. Reuse it for all steps on the same measurements.
+        order: 1 for a first order CPA, 2 for a second order CPA on pairs of samples (masked implementations).
+        window: Samples which are used for the CPA. Keep it small for the second order CPA.
+        fused: Never store the hamming weights of all traces (see `fused_cpa.score_keys_fused`). Uses Numba if installed.
+        mem_budget: Memory budget of the CPA in bytes, see `correlations.Corr.auto_step_size`.
     """
     mask = hypos[0].get_intermediate_mask(attacked_round, attacked_state)
 
     keys = np.array([hypo.key for hypo in hypos], dtype=np.uint32)
 
-    expected_hws = simon_64_128_simulation.get_hws_for_guessed_keys(
-        measurements.plaintext, keys, attacked_round, mask, attacked_state
+    peaks = scoring.score_keys_sharded(
+        keys,
+        measurements.plaintext,
+        measurements.power,
+        attacked_round,
+        mask,
+        attacked_state,
+        num_workers,
+        shard_size,
+        cache,
+        order,
+        window,
+        fused,
+        mem_budget=mem_budget,
     )
-
-    corrs = correlations.calc_corrs(expected_hws, measurements.power)
-    for hypo, corr in zip(hypos, corrs):
-        if np.max(corr) > -np.min(corr):
-            hypo.corr = np.max(corr)
-        else:
-            hypo.corr = np.min(corr)
+    for hypo, corr in zip(hypos, peaks):
+        hypo.corr = corr
 
 
 def array_to_hex_str(val: np.ndarray) -> str:
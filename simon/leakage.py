@@ -0,0 +1,177 @@
+from math import comb
+from typing import Literal
+import numpy as np
+
+from measurement import Measurements
+
+
+class CentralMoments:
+    """One-pass accumulator of the mean and the centered moment sums of power traces.
+    The sums M_p = sum((x - mean)^p) are stored for p = 2 ... max_order for each sample.
+    Chunks and other accumulators are combined with the pairwise update formula, so the
+    memory does not depend on the number of traces.
+
+    Example:
+        moments = CentralMoments(num_samples=5000, max_order=6)
+        moments.update(power[0:1000])
+        moments.update(power[1000:2000])
+        moments.central_moment(2)  -> variance of each sample, shape (5000,)
+    """
+
+    def __init__(self, num_samples: int, max_order: int = 6):
+        assert max_order >= 2
+        self.n = 0
+        self.num_samples = num_samples
+        self.max_order = max_order
+
+        self.mean = np.zeros(num_samples, dtype=np.float64)
+        # m[p] is the centered sum of order p. m[0] and m[1] are unused.
+        self.m = np.zeros((max_order + 1, num_samples), dtype=np.float64)
+
+    def update(self, power: np.ndarray):
+        """Add a chunk of traces with shape (num_traces, num_samples)."""
+        assert power.shape[1] == self.num_samples
+        if power.shape[0] == 0:
+            return
+
+        chunk = CentralMoments(self.num_samples, self.max_order)
+        chunk.n = power.shape[0]
+        chunk.mean = power.mean(axis=0, dtype=np.float64)
+
+        centered = power - chunk.mean
+        power_p = centered * centered
+        for p in range(2, self.max_order + 1):
+            chunk.m[p] = power_p.sum(axis=0)
+            if p < self.max_order:
+                power_p *= centered
+
+        self.merge(chunk)
+
+    def merge(self, other: "CentralMoments"):
+        """Add the traces of another accumulator to this accumulator."""
+        assert other.num_samples == self.num_samples
+        assert other.max_order == self.max_order
+
+        if other.n == 0:
+            return
+        if self.n == 0:
+            self.n = other.n
+            self.mean = other.mean.copy()
+            self.m = other.m.copy()
+            return
+
+        na, nb = self.n, other.n
+        n = na + nb
+        delta = other.mean - self.mean
+
+        m = np.zeros_like(self.m)
+        for p in range(2, self.max_order + 1):
+            m[p] = self.m[p] + other.m[p]
+            for k in range(1, p - 1):
+                m[p] += (
+                    comb(p, k)
+                    * delta**k
+                    * ((-nb / n) ** k * self.m[p - k] + (na / n) ** k * other.m[p - k])
+                )
+            m[p] += (na * nb / n * delta) ** p * (
+                1 / nb ** (p - 1) - (-1 / na) ** (p - 1)
+            )
+
+        self.n = n
+        self.mean += delta * nb / n
+        self.m = m
+
+    def central_moment(self, p: int) -> np.ndarray:
+        return self.m[p] / self.n
+
+    def to_state(self) -> dict:
+        return {"n": self.n, "mean": self.mean.copy(), "m": self.m.copy()}
+
+    @staticmethod
+    def from_state(state: dict) -> "CentralMoments":
+        m = np.asarray(state["m"], dtype=np.float64)
+        moments = CentralMoments(m.shape[1], m.shape[0] - 1)
+        moments.n = int(state["n"])
+        moments.mean = np.asarray(state["mean"], dtype=np.float64).copy()
+        moments.m = m.copy()
+        return moments
+
+
+class TVLA:
+    """Streaming test vector leakage assessment with a Welch t-test between two groups of traces,
+    e.g. fixed vs. random plaintexts. Supports the first, second and third order test.
+
+    Example:
+        tvla = TVLA(num_samples=5000)
+        tvla.update(power_chunk, groups_chunk)  # groups are 0 (fixed) or 1 (random)
+        t = tvla.t_statistic(order=2)
+    """
+
+    def __init__(self, num_samples: int, max_order: Literal[1, 2, 3] = 3):
+        assert 1 <= max_order <= 3
+        self.num_samples = num_samples
+        self.max_order = max_order
+        self.groups = [
+            CentralMoments(num_samples, 2 * max_order),
+            CentralMoments(num_samples, 2 * max_order),
+        ]
+
+    def update(self, power: np.ndarray, groups: np.ndarray):
+        """Add a chunk of traces. `groups` has one entry 0 or 1 per trace."""
+        assert groups.shape == (power.shape[0],)
+        for g in range(2):
+            selected = power[groups == g]
+            if selected.shape[0] > 0:
+                self.groups[g].update(selected)
+
+    def update_interleaved(self, power: np.ndarray, first_trace_idx: int = 0):
+        """Add a chunk of traces which alternate between group 0 (even trace index) and group 1 (odd trace index).
+        This is the order of the traces from `simon_64_128_measure_leakage.ipynb`.
+        """
+        offset = first_trace_idx % 2
+        self.groups[0].update(power[offset::2])
+        self.groups[1].update(power[1 - offset :: 2])
+
+    def merge(self, other: "TVLA"):
+        assert other.max_order == self.max_order
+        for g in range(2):
+            self.groups[g].merge(other.groups[g])
+
+    def t_statistic(self, order: Literal[1, 2, 3] = 1) -> np.ndarray:
+        """Welch t-statistic for each sample.
+        The higher order tests compare the mean of the centered (order 2) or standardized (order 3) traces.
+        """
+        assert 1 <= order <= self.max_order
+
+        means = []
+        variances = []
+        for g in self.groups:
+            cm2 = g.central_moment(2)
+            if order == 1:
+                means.append(g.mean)
+                variances.append(cm2)
+            elif order == 2:
+                means.append(cm2)
+                variances.append(g.central_moment(4) - cm2**2)
+            else:
+                means.append(g.central_moment(3) / cm2**1.5)
+                variances.append(
+                    (g.central_moment(6) - g.central_moment(3) ** 2) / cm2**3
+                )
+
+        n0, n1 = self.groups[0].n, self.groups[1].n
+        return (means[0] - means[1]) / np.sqrt(variances[0] / n0 + variances[1] / n1)
+
+
+def tvla_from_measurements(
+    measurements: Measurements,
+    max_order: Literal[1, 2, 3] = 3,
+    chunk_size: int = 1000,
+) -> TVLA:
+    """Run the TVLA over interleaved fixed/random measurements chunk by chunk.
+    Works with memory mapped measurements from `Measurements.open`, so the traces are never loaded completely.
+    """
+    tvla = TVLA(measurements.power.shape[1], max_order)
+    for i in range(0, measurements.power.shape[0], chunk_size):
+        tvla.update_interleaved(measurements.power[i : i + chunk_size], i)
+    return tvla
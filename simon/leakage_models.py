@@ -0,0 +1,132 @@
+from typing import Callable, Literal
+import numpy as np
+
+AttackedState = Literal["ADD_ROUND_KEY", "AND_GATE", "F_OUTPUT", "HAMMING_DISTANCE"]
+
+
+def rotate_left(x, n: int):
+    return (x << n) | (x >> (32 - n))
+
+
+class LeakageModel:
+    """An intermediate state of the attacked round which is predicted by the attack.
+
+    Arguments:
+        name: Name which is used as `attacked_state`.
+        predict: Vectorized kernel which gets the new state x after the attacked round and the state x before the
+            attacked round (None if `uses_previous_state` is False) and returns the predicted intermediate state.
+            Both states have the shape (num_traces, num_keys). The kernel may modify the new state in place.
+        get_mask: Get the bits of the intermediate state which can be predicted from the guessed bits of the round key.
+        bit_order: Position of the i-th guessed bit of the round key. The attack guesses the bits in this order.
+        uses_previous_state: Whether the kernel needs the state x before the attacked round.
+        kernel_id: Formula of the compiled kernel in `fused_cpa` which computes the same prediction.
+            Only the built-in models have one, other models use `predict`.
+
+    Example:
+    ```
+        register(LeakageModel(
+            "ROTATE_2",
+            predict=lambda new_x, x: rotate_left(new_x, 2),
+            get_mask=lambda key_mask: rotate_left(key_mask, 2),
+        ))
+        helper.calc_corrs_for_hypos(hypos, measurements, 0, "ROTATE_2")
+    ```
+    """
+
+    def __init__(
+        self,
+        name: str,
+        predict: Callable[[np.ndarray, np.ndarray | None], np.ndarray],
+        get_mask: Callable[[np.uint32], np.uint32],
+        bit_order: Callable[[int], int] = lambda i: i,
+        uses_previous_state: bool = False,
+        kernel_id: int | None = None,
+    ):
+        self.name = name
+        self.predict = predict
+        self.get_mask = get_mask
+        self.bit_order = bit_order
+        self.uses_previous_state = uses_previous_state
+        self.kernel_id = kernel_id
+
+
+LEAKAGE_MODELS: dict[str, LeakageModel] = {}
+
+
+def register(model: LeakageModel):
+    LEAKAGE_MODELS[model.name] = model
+
+
+def get_model(name: str) -> LeakageModel:
+    if name not in LEAKAGE_MODELS:
+        raise ValueError(f"Invalid attacked state: {name}")
+    return LEAKAGE_MODELS[name]
+
+
+def _and_gate(x):
+    return rotate_left(x, 1) & rotate_left(x, 8)
+
+
+def _f(x):
+    return _and_gate(x) ^ rotate_left(x, 2)
+
+
+def _f_output_bit_order() -> list[int]:
+    """Bit i of the f output depends on the bits i - 1, i - 2 and i - 8 of the state.
+    The bits are guessed in pairs (j, j + 7) after bit 7: 7, 1, 8, 2, 9, 3, 10, ...
+    After 2k + 1 bits, the output bits 9 ... k + 8 can be predicted, so each step of at least 3 bits has a mask.
+    """
+    order = [7]
+    for j in range(1, 32):
+        for bit in [j, (j + 7) % 32]:
+            if bit not in order:
+                order.append(bit)
+    return order
+
+
+F_OUTPUT_BIT_ORDER = _f_output_bit_order()
+
+
+# The state x after adding the round key.
+register(
+    LeakageModel(
+        "ADD_ROUND_KEY",
+        predict=lambda new_x, x: new_x,
+        get_mask=lambda key_mask: key_mask,
+        kernel_id=0,
+    )
+)
+
+# The output of the AND gate of the next round.
+# The guessed bits have a distance of 7, so both inputs of the AND gate are guessed early.
+register(
+    LeakageModel(
+        "AND_GATE",
+        predict=lambda new_x, x: _and_gate(new_x),
+        get_mask=_and_gate,
+        bit_order=lambda i: i * 7 % 32,
+        kernel_id=1,
+    )
+)
+
+# The output of the f function of the next round: (x <<< 1 & x <<< 8) ^ x <<< 2.
+register(
+    LeakageModel(
+        "F_OUTPUT",
+        predict=lambda new_x, x: _f(new_x),
+        get_mask=lambda key_mask: _and_gate(key_mask) & rotate_left(key_mask, 2),
+        bit_order=lambda i: F_OUTPUT_BIT_ORDER[i],
+        kernel_id=2,
+    )
+)
+
+# The hamming distance of the x register when it is overwritten with the new state x.
+register(
+    LeakageModel(
+        "HAMMING_DISTANCE",
+        predict=lambda new_x, x: np.bitwise_xor(new_x, x, out=new_x),
+        get_mask=lambda key_mask: key_mask,
+        uses_previous_state=True,
+        kernel_id=3,
+    )
+)
@@ -0,0 +1,329 @@
+import asyncio
+import tempfile
+import threading
+from typing import Callable
+
+import numpy as np
+
+import attack
+import correlations
+import simon_64_128
+import simon_64_128_simulation
+import trace_store
+
+from helper import HypothesisSet
+from leakage_models import AttackedState
+from measurement import Measurements
+
+
+class SimulatedTarget:
+    """Simulated ChipWhisperer SimpleSerial target with the Simon firmware, for tests without hardware.
+    Supports the commands of `simon_64_128_measure.ipynb`:
+        - 'k' with 16 bytes: set the key
+        - 'p' with 8 bytes: encrypt the plaintext, the ciphertext is read with 'r'
+    The simulated power trace of the last encryption (hamming weight of the x states plus noise) is in `last_power`.
+
+    Example:
+    ```
+        target = SimulatedTarget(noise_std=1.0, seed=0)
+        target.simpleserial_write('k', key)
+        target.simpleserial_wait_ack()
+        target.simpleserial_write('p', pt)
+        ct = target.simpleserial_read('r', 8)
+    ```
+    """
+
+    def __init__(self, noise_std: float = 1.0, seed: int | None = None):
+        self.noise_std = noise_std
+        self.rng = np.random.default_rng(seed)
+        self.output_len = 8
+
+        self.key = np.zeros(4, dtype=np.uint32)
+        self.last_power: np.ndarray | None = None
+        self._response: bytearray | None = None
+
+    def simpleserial_write(self, cmd: str, data: bytearray):
+        if cmd == "k":
+            self.key = words_from_bytes(data, 4)
+            self._response = None
+        elif cmd == "p":
+            plaintext = words_from_bytes(data, 2)
+            ciphertext, log = simon_64_128.encrypt_blocks(
+                plaintext.reshape((1, 2)), self.key
+            )
+            power = simon_64_128_simulation.log_to_simulated_power(log)[0]
+            self.last_power = power + self.rng.normal(0, self.noise_std, power.shape)
+            self._response = bytes_from_words(ciphertext[0])
+        else:
+            raise ValueError(f"Invalid SimpleSerial command: {cmd}")
+
+    def simpleserial_wait_ack(self) -> bool:
+        return True
+
+    def simpleserial_read(self, cmd: str, num_bytes: int) -> bytearray:
+        assert cmd == "r" and self._response is not None
+        return self._response[:num_bytes]
+
+    def capture_batch(
+        self, num_traces: int, stop: threading.Event | None = None
+    ) -> Measurements:
+        """Capture traces with random plaintexts like `cw.capture_trace` does for a real target.
+        If `stop` is set, the capture stops before the next trace and returns the traces which were captured so far.
+        """
+        plaintexts = np.zeros((num_traces, 2), dtype=np.uint32)
+        ciphertexts = np.zeros((num_traces, 2), dtype=np.uint32)
+        powers = []
+        for i in range(num_traces):
+            if stop is not None and stop.is_set():
+                num_traces = i
+                break
+            pt = bytearray(self.rng.integers(0, 256, 8, dtype=np.uint8))
+            self.simpleserial_write("p", pt)
+            ct = self.simpleserial_read("r", self.output_len)
+
+            plaintexts[i] = words_from_bytes(pt, 2)
+            ciphertexts[i] = words_from_bytes(ct, 2)
+            powers.append(self.last_power)
+        if not powers:
+            powers = np.zeros((0, 0), dtype=np.float32)
+        return Measurements(
+            plaintexts[:num_traces],
+            ciphertexts[:num_traces],
+            np.array(powers, dtype=np.float32),
+        )
+
+
+def words_from_bytes(data: bytearray, num_words: int) -> np.ndarray:
+    """Example: bytearray([0x65, 0x6B, 0x69, 0x6C, 0x20, 0x64, 0x6E, 0x75]) -> [0x656B696C, 0x20646E75]"""
+    data = np.frombuffer(bytes(data), dtype=np.uint8)
+    return trace_store.bytes_to_words(data.reshape((1, 4 * num_words))).reshape(-1)
+
+
+def bytes_from_words(words: np.ndarray) -> bytearray:
+    return bytearray(np.asarray(words, dtype=">u4").tobytes())
+
+
+class LiveAttack:
+    """Round by round key recovery which is updated with each batch of captured traces.
+    The children of the current step are scored incrementally. The step is finished when the surviving hypotheses
+    (the best `beam_width` within `threshold` of the best one) did not change for `patience` batches.
+    Then the survivors are expanded with the next guessed bits and the new children are scored on all traces so far.
+    The attack is done when all steps are finished. `key` is the recovered key or None.
+    The traces are written into a trace store (see `trace_store`) instead of being kept in memory.
+
+    Example:
+        live_attack = LiveAttack("ADD_ROUND_KEY", beam_width=8, store_dir="./traces/live/store")
+        for batch in batches:
+            if live_attack.update(batch):
+                break
+        live_attack.close()
+        Measurements.open("./traces/live/store")  -> all captured traces
+
+    Arguments:
+        store_dir: Directory of the trace store. If None, the traces are written into a temporary directory
+            which is deleted by `close`.
+        max_traces: Maximum number of traces which fit into the trace store.
+    """
+
+    def __init__(
+        self,
+        attacked_state: AttackedState = "ADD_ROUND_KEY",
+        guessed_bits_per_step: int = 6,
+        beam_width: int = 16,
+        threshold: float = 0.02,
+        patience: int = 3,
+        chunk_size: int = 1000,
+        store_dir: str | None = None,
+        max_traces: int = 100000,
+    ):
+        self.attacked_state = attacked_state
+        self.beam_width = beam_width
+        self.threshold = threshold
+        self.patience = patience
+        self.chunk_size = chunk_size
+
+        step_masks = attack.get_step_masks(attacked_state, guessed_bits_per_step)
+        self.steps = [(r, mask) for r in range(4) for mask in step_masks]
+        self.step_idx = 0
+
+        self._temp_dir = None
+        if store_dir is None:
+            self._temp_dir = tempfile.TemporaryDirectory()
+            store_dir = self._temp_dir.name
+        self.store_dir = store_dir
+        self.max_traces = max_traces
+        # Created with the first batch, when the number of samples is known.
+        self.writer: trace_store.TraceStoreWriter | None = None
+        self.num_traces = 0
+
+        self.done = False
+        self.key: np.ndarray | None = None
+        # (number of traces, step index, best correlation, number of survivors) after each batch.
+        self.history: list[tuple[int, int, float, int]] = []
+
+        self._start_step(
+            HypothesisSet(np.zeros(4, dtype=np.uint32), np.zeros(4, dtype=np.uint32))
+        )
+
+    def _start_step(self, parents: HypothesisSet):
+        attacked_round, word_mask = self.steps[self.step_idx]
+        new_mask = parents.bit_mask.copy()
+        new_mask[3 - attacked_round] = word_mask
+
+        self.children = parents.expand(new_mask)
+        self.mask = self.children.get_intermediate_mask(
+            attacked_round, self.attacked_state
+        )
+        self.survivors = HypothesisSet(np.zeros((0, 4), dtype=np.uint32), new_mask)
+        self.stable_batches = 0
+        self.corr: correlations.Corr | None = None
+
+        # Score the new children on all traces which were captured so far.
+        if self.num_traces > 0:
+            measurements = self.measurements()
+            for i in range(0, self.num_traces, self.chunk_size):
+                self._update_corr(measurements.select(slice(i, i + self.chunk_size)))
+
+    def _update_corr(self, batch: Measurements):
+        attacked_round, _ = self.steps[self.step_idx]
+        hws = simon_64_128_simulation.get_hws_for_guessed_keys(
+            batch.plaintext,
+            self.children.keys,
+            attacked_round,
+            self.mask,
+            self.attacked_state,
+        )
+        if self.corr is None:
+            self.corr = correlations.Corr((len(self.children), batch.power.shape[1]))
+        self.corr.update(hws, batch.power)
+
+    def measurements(self) -> Measurements:
+        """All traces which were captured so far, as memory maps of the trace store."""
+        return Measurements(
+            self.writer.plaintext[: self.num_traces],
+            self.writer.ciphertext[: self.num_traces],
+            self.writer.power[: self.num_traces],
+        )
+
+    def update(self, batch: Measurements) -> bool:
+        """Add a batch of traces. Return True if the attack is done."""
+        if self.done or len(batch) == 0:
+            return self.done
+
+        if self.writer is None:
+            self.writer = trace_store.TraceStoreWriter(
+                self.store_dir,
+                self.max_traces,
+                batch.power.shape[1],
+                batch.power.dtype,
+            )
+        self.writer.append(batch.plaintext, batch.ciphertext, batch.power)
+        self.num_traces += len(batch)
+        self._update_corr(batch)
+
+        self.children.corrs, _ = self.corr.peaks()
+        survivors = self.children.best(self.beam_width)
+        if len(survivors) == 0:
+            # All peaks are NaN, e.g. after the first trace. The stability check starts with a finite peak.
+            return False
+        survivors = survivors.filter(self.threshold)
+        self.history.append(
+            (self.num_traces, self.step_idx, float(survivors.corrs[0]), len(survivors))
+        )
+
+        same = _same_keys(survivors.keys, self.survivors.keys)
+        self.stable_batches = self.stable_batches + 1 if same else 0
+        self.survivors = survivors
+        if self.stable_batches < self.patience:
+            return False
+
+        self.step_idx += 1
+        if self.step_idx == len(self.steps):
+            self._finish()
+        else:
+            self._start_step(survivors)
+        return self.done
+
+    def _finish(self):
+        self.done = True
+        found = simon_64_128.check_keys(
+            self.survivors.keys, self.writer.plaintext[:2], self.writer.ciphertext[:2]
+        )
+        if np.any(found):
+            self.key = self.survivors.keys[found][0]
+
+    def close(self):
+        """Write the metadata of the trace store, or delete the temporary trace store."""
+        if self.writer is not None:
+            self.writer.close(allow_partial=True)
+            self.writer = None
+        if self._temp_dir is not None:
+            self._temp_dir.cleanup()
+            self._temp_dir = None
+
+
+def _same_keys(keys_a: np.ndarray, keys_b: np.ndarray) -> bool:
+    """Whether both arrays contain the same keys in any order. np.unique sorts whole rows."""
+    return np.array_equal(np.unique(keys_a, axis=0), np.unique(keys_b, axis=0))
+
+
+async def run_live_attack(
+    capture_batch: Callable[[int, threading.Event], Measurements],
+    live_attack: LiveAttack,
+    batch_size: int = 100,
+    max_traces: int = 100000,
+    queue_size: int = 4,
+) -> LiveAttack:
+    """Capture batches of traces and attack them at the same time until the attack is done or `max_traces` are captured.
+    The capture and the CPA run in worker threads, so the next batch is captured while the current batch is attacked.
+    When the attack is done, the running capture is stopped and the trace store of `live_attack` is closed.
+
+    Example:
+    ```
+        target = SimulatedTarget(noise_std=1.0)
+        target.simpleserial_write('k', key)
+        live_attack = asyncio.run(run_live_attack(target.capture_batch, LiveAttack(beam_width=8)))
+        live_attack.key, live_attack.num_traces
+    ```
+
+    Arguments:
+        capture_batch: Capture the given number of traces, e.g. `SimulatedTarget.capture_batch` or a function which
+            calls `cw.capture_trace` for a real target. It gets an event which is set when the attack is done,
+            and should check it between traces and return the traces which were captured so far.
+        max_traces: Maximum number of captured traces. It is limited to `live_attack.max_traces`.
+        queue_size: Number of captured batches which can wait for the attack.
+    """
+    queue: asyncio.Queue[Measurements | None] = asyncio.Queue(maxsize=queue_size)
+    max_traces = min(max_traces, live_attack.max_traces)
+    # Cancelling the producer does not stop a capture which already runs in a worker thread.
+    stop = threading.Event()
+
+    async def produce():
+        captured = 0
+        try:
+            while captured < max_traces and not stop.is_set():
+                batch = await asyncio.to_thread(
+                    capture_batch, min(batch_size, max_traces - captured), stop
+                )
+                captured += len(batch)
+                await queue.put(batch)
+        finally:
+            # Also wake up the attack if the capture failed. After a stop, nobody reads the queue.
+            if not stop.is_set():
+                await queue.put(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while (batch := await queue.get()) is not None:
+            if await asyncio.to_thread(live_attack.update, batch):
+                break
+    finally:
+        stop.set()
+        producer.cancel()
+        await asyncio.wait([producer])
+        live_attack.close()
+
+    # Raise the exception of a failed capture, e.g. a timeout of the serial connection.
+    if not producer.cancelled():
+        producer.result()
+    return live_attack
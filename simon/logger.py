@@ -72,3 +72,72 @@ class Log:
         for a, b in zip(self.entries, other.entries):
             result.entries.append(a.xor(b))
         return result
+
+
+class StateLog:
+    """Array backed log for a batch of encryptions. All values are stored in one preallocated buffer:
+    the key, the round keys, the states (x, y) before the first round and after each round and
+    optionally the outputs of the AND gate of each round.
+
+    Example:
+        log = StateLog(num_blocks=1000, num_rounds=44)
+        log.states.shape == (1000, 45, 2)
+        log.round_keys.shape == (1000, 44)
+        log.to_log(0).to_str()  # same format as the log of `simon_64_128.encrypt_block`
+    """
+
+    def __init__(self, num_blocks: int, num_rounds: int, record_and_gate: bool = False):
+        self.num_blocks = num_blocks
+        self.num_rounds = num_rounds
+        self.record_and_gate = record_and_gate
+
+        key_size = 4
+        state_size = 2 * (num_rounds + 1)
+        and_size = num_rounds if record_and_gate else 0
+        self.buffer = np.zeros(
+            (num_blocks, key_size + num_rounds + state_size + and_size), dtype=np.uint32
+        )
+
+        # Views into the buffer.
+        offset = 0
+        self.keys = self.buffer[:, offset : offset + key_size]
+        offset += key_size
+        self.round_keys = self.buffer[:, offset : offset + num_rounds]
+        offset += num_rounds
+        self.states = self.buffer[:, offset : offset + state_size].reshape(
+            (num_blocks, num_rounds + 1, 2)
+        )
+        offset += state_size
+        if record_and_gate:
+            self.and_gate = self.buffer[:, offset : offset + and_size]
+        else:
+            self.and_gate = None
+
+    def __len__(self) -> int:
+        return self.num_blocks
+
+    def to_log(self, i: int) -> Log:
+        """Get the log of a single encryption. The entries are views into the buffer."""
+        log = Log()
+        log.add(self.states[i, 0], "Plaintext")
+        log.add(self.keys[i], "Key")
+        log.add(self.round_keys[i], "Expanded Key")
+        log.add(self.states[i, 0, 0:1], "X0")
+        log.add(self.states[i, 0, 1:2], "Y0")
+        for r in range(self.num_rounds):
+            log.add(f"=== Perform Round {r+1} ===")
+            if self.and_gate is not None:
+                log.add(self.and_gate[i, r : r + 1], f"AND{r+1}")
+            log.add(self.states[i, r + 1, 0:1], f"X{r+1}")
+            log.add(self.states[i, r + 1, 1:2], f"Y{r+1}")
+        return log
+
+    def to_str(self, i: int = 0, num_format: Literal["h", "b"] = "h") -> str:
+        return self.to_log(i).to_str(num_format)
+
+    def xor(self, other: "StateLog") -> "StateLog":
+        """XOR two logs together."""
+        assert self.buffer.shape == other.buffer.shape
+        result = StateLog(self.num_blocks, self.num_rounds, self.record_and_gate)
+        np.bitwise_xor(self.buffer, other.buffer, out=result.buffer)
+        return result
@@ -1,6 +1,10 @@
 import numpy as np
 
 
+# Integer data types for power traces, from small to big.
+COMPACT_DTYPES = [np.int8, np.uint8, np.int16, np.uint16, np.int32]
+
+
 class Measurement:
     def __init__(
         self,
@@ -30,3 +34,112 @@ class Measurements:
             )
 
         return Measurement(self.plaintext[i], self.ciphertext[i], self.power[i])
+
+    def __len__(self) -> int:
+        return self.plaintext.shape[0]
+
+    def select(
+        self, traces: slice = slice(None), samples: slice = slice(None)
+    ) -> "Measurements":
+        """Get a subset of the traces and samples. For memory mapped measurements, no data is loaded.
+        Example:
+            measurements.select(slice(0, 1000), slice(0, 800))
+            -> 1000 traces with 800 samples each
+        """
+        return Measurements(
+            self.plaintext[traces],
+            self.ciphertext[traces],
+            self.power[traces, samples],
+        )
+
+    def take_samples(
+        self, sample_idx: np.ndarray | list[slice], chunk_size: int = 1000
+    ) -> "Measurements":
+        """Get the measurements reduced to the points of interest (see `poi.PoiSelector`).
+        The power traces are copied chunk by chunk, so memory mapped traces are never loaded completely.
+        Example:
+            sample_idx = [120, 121, 530, 1700]  # or a list of sample windows [slice(100, 150), slice(500, 550)]
+            -> power.shape = (num_traces, 4)
+        """
+        if isinstance(sample_idx, list) and all(
+            isinstance(w, slice) for w in sample_idx
+        ):
+            sample_idx = np.concatenate(
+                [np.arange(self.power.shape[1])[w] for w in sample_idx]
+            )
+        sample_idx = np.asarray(sample_idx, dtype=np.int64)
+
+        power = np.empty((self.power.shape[0], len(sample_idx)), dtype=self.power.dtype)
+        for i in range(0, self.power.shape[0], chunk_size):
+            power[i : i + chunk_size] = self.power[i : i + chunk_size][:, sample_idx]
+
+        return Measurements(self.plaintext, self.ciphertext, power)
+
+    def compact(self, dtype=None, chunk_size: int = 1000) -> "Measurements":
+        """Get the measurements with the power traces stored in a compact integer data type.
+        The CPA converts the traces to float chunk by chunk, so the traces never need more memory than this.
+        Traces from ChipWhisperer with `as_int=True` fit into int16, which needs 1/2 of uint32 and 1/4 of float64.
+        Example:
+            power.dtype = uint32, values in 0 ... 1023
+            -> power.dtype = int16
+
+        Arguments:
+            dtype: Data type of the power traces. If None, the smallest data type which holds all values is used.
+        """
+        if dtype is None:
+            dtype = get_compact_dtype(self.power, chunk_size)
+        dtype = np.dtype(dtype)
+
+        power = np.empty(self.power.shape, dtype=dtype)
+        for i in range(0, self.power.shape[0], chunk_size):
+            chunk = self.power[i : i + chunk_size]
+            check_power_range(chunk, dtype)
+            power[i : i + chunk_size] = chunk
+
+        return Measurements(self.plaintext, self.ciphertext, power)
+
+    @staticmethod
+    def open(store_dir: str) -> "Measurements":
+        """Open measurements from a trace store created by `trace_store.convert_project`."""
+        import trace_store
+
+        return trace_store.open_store(store_dir)
+
+
+def get_compact_dtype(power: np.ndarray, chunk_size: int = 1000) -> np.dtype:
+    """Get the smallest integer data type which holds all values of the power traces.
+    Example:
+        power with values in -512 ... 511 -> int16
+        power with values in 0 ... 255 -> uint8
+    """
+    if power.dtype.kind == "f":
+        raise ValueError("Only integer power traces can be stored in a compact dtype.")
+
+    low, high = 0, 0
+    for i in range(0, power.shape[0], chunk_size):
+        chunk = power[i : i + chunk_size]
+        if chunk.size > 0:
+            low = min(low, int(chunk.min()))
+            high = max(high, int(chunk.max()))
+
+    for dtype in COMPACT_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype)
+    return power.dtype
+
+
+def check_power_range(power: np.ndarray, dtype):
+    """Raise a ValueError if the power traces can not be stored in the integer data type without overflow."""
+    dtype = np.dtype(dtype)
+    if dtype.kind not in "iu" or power.size == 0:
+        return
+
+    if power.dtype.kind == "f" and not np.all(np.equal(np.mod(power, 1), 0)):
+        raise ValueError(
+            f"Power traces have fractional values and can not be stored as {dtype}."
+        )
+
+    info = np.iinfo(dtype)
+    if power.min() < info.min or power.max() > info.max:
+        raise ValueError(f"Power traces exceed the range of {dtype}.")
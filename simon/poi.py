@@ -0,0 +1,150 @@
+from typing import Literal
+import numpy as np
+
+
+class PoiSelector:
+    """Rank the samples of power traces in one streaming pass to find the points of interest.
+    Each trace gets a class label, e.g. the predicted hamming weight of an intermediate state.
+    Per class, the number of traces, the sum and the sum of squares of each sample are accumulated.
+
+    Rankings:
+        - snr: variance of the class means divided by the mean of the class variances
+        - variance: variance of each sample over all traces
+        - t: Welch t-statistic between class 0 and class 1 (e.g. fixed vs. random plaintext)
+
+    Example:
+    ```
+        selector = PoiSelector(num_samples=5000, num_classes=33)
+        for i in range(0, len(measurements), 1000):
+            chunk = measurements.select(slice(i, i + 1000))
+            labels = simon_64_128_simulation.get_hws_for_guessed_keys(chunk.plaintext, key, 0, 0xFFFFFFFF)[:, 0]
+            selector.update(chunk.power, labels)
+        pois = selector.select(100, "snr", min_distance=2)
+        reduced_measurements = measurements.take_samples(pois)
+    ```
+    """
+
+    def __init__(self, num_samples: int, num_classes: int = 33):
+        self.num_samples = num_samples
+        self.num_classes = num_classes
+
+        self.n = np.zeros(num_classes, dtype=np.int64)
+        self.s1 = np.zeros((num_classes, num_samples), dtype=np.float64)
+        self.s2 = np.zeros((num_classes, num_samples), dtype=np.float64)
+
+        # All values are shifted by the mean of the first chunk to reduce rounding errors.
+        self.shift: np.ndarray | None = None
+
+    def update(self, power: np.ndarray, labels: np.ndarray | None = None):
+        """Add a chunk of traces with their class labels.
+        Example:
+            power.shape = (1000, 5000)
+            labels.shape = (1000,)  # values in 0 ... num_classes - 1
+        """
+        assert power.shape[1] == self.num_samples
+        if labels is None:
+            labels = np.zeros(power.shape[0], dtype=np.int64)
+        assert labels.shape == (power.shape[0],)
+
+        if self.shift is None:
+            self.shift = power.mean(axis=0, dtype=np.float64)
+        p = power - self.shift
+
+        # Sum per class with a one-hot matrix product.
+        one_hot = np.zeros((power.shape[0], self.num_classes), dtype=np.float64)
+        one_hot[np.arange(power.shape[0]), labels] = 1.0
+
+        self.n += np.bincount(labels, minlength=self.num_classes)
+        self.s1 += one_hot.T @ p
+        self.s2 += one_hot.T @ (p * p)
+
+    def class_means(self) -> np.ndarray:
+        n = np.maximum(self.n, 1)[:, np.newaxis]
+        return self.s1 / n
+
+    def class_vars(self) -> np.ndarray:
+        n = np.maximum(self.n, 1)[:, np.newaxis]
+        return np.maximum(self.s2 / n - (self.s1 / n) ** 2, 0.0)
+
+    def variance(self) -> np.ndarray:
+        n = max(self.n.sum(), 1)
+        s1 = self.s1.sum(axis=0)
+        s2 = self.s2.sum(axis=0)
+        return np.maximum(s2 / n - (s1 / n) ** 2, 0.0)
+
+    def snr(self) -> np.ndarray:
+        used = self.n > 0
+        weights = self.n[used] / self.n.sum()
+        means = self.class_means()[used]
+
+        signal = np.average((means - weights @ means) ** 2, axis=0, weights=weights)
+        noise = weights @ self.class_vars()[used]
+        return signal / np.maximum(noise, np.finfo(np.float64).tiny)
+
+    def t_statistic(self) -> np.ndarray:
+        """Welch t-statistic between the traces with label 0 and label 1."""
+        n0, n1 = self.n[0], self.n[1]
+        assert n0 > 1 and n1 > 1
+
+        means = self.class_means()
+        variances = self.class_vars()
+        var0 = variances[0] * n0 / (n0 - 1)
+        var1 = variances[1] * n1 / (n1 - 1)
+        return (means[0] - means[1]) / np.sqrt(var0 / n0 + var1 / n1)
+
+    def scores(self, method: Literal["snr", "variance", "t"] = "snr") -> np.ndarray:
+        if method == "snr":
+            return self.snr()
+        elif method == "variance":
+            return self.variance()
+        elif method == "t":
+            return np.abs(self.t_statistic())
+        else:
+            raise ValueError(f"Invalid ranking method: {method}")
+
+    def select(
+        self,
+        num_pois: int,
+        method: Literal["snr", "variance", "t"] = "snr",
+        min_distance: int = 0,
+    ) -> np.ndarray:
+        """Get the indices of the best samples in ascending order.
+        With `min_distance > 0`, selected samples are at least `min_distance + 1` samples apart.
+        """
+        return select_pois(self.scores(method), num_pois, min_distance)
+
+
+def select_pois(scores: np.ndarray, num_pois: int, min_distance: int = 0) -> np.ndarray:
+    """Get the indices of the samples with the highest scores in ascending order.
+    Example:
+        scores = [0.1, 0.9, 0.8, 0.2, 0.7], num_pois = 2, min_distance = 1
+        -> [1, 4]
+    """
+    order = np.argsort(-scores, kind="stable")
+    if min_distance <= 0:
+        return np.sort(order[:num_pois])
+
+    blocked = np.zeros(scores.shape[0], dtype=bool)
+    pois = []
+    for idx in order:
+        if len(pois) == num_pois:
+            break
+        if blocked[idx]:
+            continue
+        pois.append(idx)
+        blocked[max(0, idx - min_distance) : idx + min_distance + 1] = True
+    return np.sort(np.array(pois, dtype=np.int64))
+
+
+def select_windows(
+    scores: np.ndarray, num_windows: int, window_size: int
+) -> list[slice]:
+    """Get non-overlapping windows of samples around the highest scores, e.g. one window per attacked round.
+    The windows are sorted by their position in the trace.
+    """
+    centers = select_pois(scores, num_windows, min_distance=window_size - 1)
+    windows = []
+    for c in centers:
+        start = int(min(max(0, c - window_size // 2), scores.shape[0] - window_size))
+        windows.append(slice(max(0, start), max(0, start) + window_size))
+    return windows
@@ -0,0 +1,154 @@
+import functools
+import json
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+import numpy as np
+
+
+class Stats:
+    def __init__(self):
+        self.calls = 0
+        self.time_s = 0.0
+        self.bytes = 0
+
+
+class StepStats:
+    def __init__(self, attacked_round: int | None, step: int | None):
+        self.attacked_round = attacked_round
+        self.step = step
+        self.num_hypos = 0
+        self.functions: dict[str, Stats] = {}
+
+
+class Profiler:
+    """Record the wall time, number of calls and bytes of the returned arrays of the profiled functions,
+    grouped by attack step. The times are inclusive, i.e. the time of `score_keys` contains the time of `calc_corrs`.
+    Only one profiler is active at a time. Without an active profiler, the profiled functions only check a global.
+
+    Example:
+    ```
+        with Profiler() as profiler:
+            attack.run_attack(measurements, beam_width=16)
+        profiler.print_report()
+        profiler.save("profile.json")
+    ```
+    """
+
+    def __init__(self):
+        self.steps: list[StepStats] = [StepStats(None, None)]
+
+    def __enter__(self) -> "Profiler":
+        global _active
+        assert _active is None, "Another profiler is already active."
+        _active = self
+        return self
+
+    def __exit__(self, *exc_info):
+        global _active
+        _active = None
+
+    def record(self, name: str, time_s: float, result):
+        stats = self.steps[-1].functions.setdefault(name, Stats())
+        stats.calls += 1
+        stats.time_s += time_s
+        stats.bytes += get_nbytes(result)
+
+    def report(self) -> list[dict]:
+        """Get one row per attack step and function.
+        Example:
+            [{"round": 0, "step": 0, "num_hypos": 64, "function": "correlations.calc_corrs",
+              "calls": 1, "time_s": 0.012, "bytes": 4096}, ...]
+        """
+        rows = []
+        for step in self.steps:
+            for name, stats in step.functions.items():
+                rows.append(
+                    {
+                        "round": step.attacked_round,
+                        "step": step.step,
+                        "num_hypos": step.num_hypos,
+                        "function": name,
+                        "calls": stats.calls,
+                        "time_s": stats.time_s,
+                        "bytes": stats.bytes,
+                    }
+                )
+        return rows
+
+    def totals(self) -> dict[str, Stats]:
+        """Get the statistics of each function summed over all steps."""
+        totals: dict[str, Stats] = {}
+        for step in self.steps:
+            for name, stats in step.functions.items():
+                total = totals.setdefault(name, Stats())
+                total.calls += stats.calls
+                total.time_s += stats.time_s
+                total.bytes += stats.bytes
+        return totals
+
+    def print_report(self):
+        for row in self.report():
+            print(
+                f"round={row['round']} step={row['step']} hypos={row['num_hypos']:7d} "
+                f"{row['function']:45s} calls={row['calls']:6d} time={row['time_s']:9.4f}s "
+                f"bytes={row['bytes'] / 2**20:9.1f} MiB"
+            )
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+
+# The profiler which records the calls. None if profiling is turned off.
+_active: Profiler | None = None
+
+
+def profiled(func: Callable) -> Callable:
+    """Decorator which records the calls of the function in the active profiler."""
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _active is None:
+            return func(*args, **kwargs)
+
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        # The profiler could have been left in the meantime, e.g. by a nested call.
+        if _active is not None:
+            _active.record(name, time.perf_counter() - start, result)
+        return result
+
+    return wrapper
+
+
+@contextmanager
+def step(attacked_round: int, step: int):
+    """Group the following calls into an attack step."""
+    if _active is not None:
+        _active.steps.append(StepStats(attacked_round, step))
+    try:
+        yield
+    finally:
+        if _active is not None:
+            _active.steps.append(StepStats(None, None))
+
+
+def add_hypos(num_hypos: int):
+    """Count hypotheses which are scored in the current attack step."""
+    if _active is not None:
+        _active.steps[-1].num_hypos += num_hypos
+
+
+def get_nbytes(result) -> int:
+    """Get the number of bytes of all arrays in the result of a function."""
+    if isinstance(result, np.ndarray):
+        return result.nbytes
+    if isinstance(result, (tuple, list)):
+        return sum(get_nbytes(r) for r in result if isinstance(r, (np.ndarray, tuple)))
+    if hasattr(result, "keys") and isinstance(result.keys, np.ndarray):
+        # HypothesisSet
+        return result.keys.nbytes + result.corrs.nbytes
+    return 0
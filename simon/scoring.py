@@ -0,0 +1,387 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import multiprocessing
+import multiprocessing.util
+from typing import Literal
+import numpy as np
+
+import simon_64_128_simulation
+import correlations
+import fused_cpa
+from profiling import profiled
+from leakage_models import AttackedState
+
+
+# Number of hypotheses which are scored together in one CPA.
+DEFAULT_SHARD_SIZE = 1024
+
+# Number of traces in the first batch of the sequential CPA. Each following batch doubles the number of traces.
+DEFAULT_FIRST_BATCH = 256
+
+
+@profiled
+def score_keys(
+    keys: np.ndarray,
+    plaintexts: np.ndarray,
+    power: np.ndarray,
+    attacked_round: int,
+    mask: np.uint32,
+    attacked_state: AttackedState = "ADD_ROUND_KEY",
+    cache: simon_64_128_simulation.PrefixStateCache | None = None,
+    order: Literal[1, 2] = 1,
+    window: slice = slice(None),
+    fused: bool = False,
+    mem_budget: int | None = None,
+) -> np.ndarray:
+    """Calculate the peak correlation between the expected hamming weights of each key and the power traces.
+    Example:
+        keys.shape = (256, 4)
+        plaintexts.shape = (10000, 2)
+        power.shape = (10000, 5000)
+        result.shape == (256,)
+
+    Arguments:
+        order: 1 for a first order CPA, 2 for a second order CPA on pairs of samples (masked implementations).
+        window: Samples which are used for the CPA.
+        fused: Predict the hamming weights tile by tile for the first order CPA (see `fused_cpa.score_keys_fused`).
+        mem_budget: Memory budget of the CPA in bytes, see `correlations.Corr.auto_step_size`.
+    """
+    if fused and order == 1:
+        return fused_cpa.score_keys_fused(
+            keys,
+            plaintexts,
+            power,
+            attacked_round,
+            mask,
+            attacked_state,
+            cache,
+            window,
+            mem_budget=mem_budget,
+        )
+
+    expected_hws = simon_64_128_simulation.get_hws_for_guessed_keys(
+        plaintexts, keys, attacked_round, mask, attacked_state, cache=cache
+    )
+
+    if order == 1:
+        corrs = correlations.calc_corrs(
+            expected_hws, power[:, window], mem_budget=mem_budget
+        )
+        peaks, _ = correlations.abs_max_along(corrs, axis=1)
+    elif order == 2:
+        peaks, _ = correlations.calc_peaks_second_order(
+            expected_hws, power, window, mem_budget=mem_budget
+        )
+    else:
+        raise ValueError(f"Invalid CPA order: {order}")
+    return peaks
+
+
+@profiled
+def score_keys_sequential(
+    keys: np.ndarray,
+    plaintexts: np.ndarray,
+    power: np.ndarray,
+    attacked_round: int,
+    mask: np.uint32,
+    attacked_state: AttackedState = "ADD_ROUND_KEY",
+    confidence: float = 3.0,
+    first_batch: int = DEFAULT_FIRST_BATCH,
+    window: slice = slice(None),
+    cache: simon_64_128_simulation.PrefixStateCache | None = None,
+    mem_budget: int | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Score the keys with a successive halving CPA which drops hypotheses that are clearly behind the leader.
+    All hypotheses are scored on the first batch of traces. After each batch, a hypothesis is dropped if the
+    upper confidence bound of its absolute peak correlation is below the lower confidence bound of the best one.
+    The bounds use the Fisher transformation: atanh(|r|) +- confidence / sqrt(n - 3).
+    Only the surviving hypotheses get the next batch, which has as many traces as all previous batches together.
+
+    Dropped hypotheses get a peak correlation of NaN, so they are removed by `HypothesisSet.best` and `filter`.
+    Return the peaks and the number of traces which were used for each hypothesis.
+    The CPA runs in the calling process.
+
+    Example:
+        keys.shape = (4096, 4), power.shape = (10000, 5000)
+        -> batches of 256, 256, 512, ..., 4096 and 1808 traces
+        -> the wrong keys are usually dropped after the first batches
+        -> each batch is passed to the CPA in chunks which fit into the memory budget
+
+    Arguments:
+        confidence: Width of the confidence interval in standard deviations. Higher values drop less hypotheses.
+        first_batch: Number of traces of the first batch.
+        window: Samples which are used for the CPA.
+        cache: Cache for the states of the recovered rounds. See `score_keys`.
+        mem_budget: Memory budget of the CPA in bytes, see `correlations.Corr.auto_step_size`.
+    """
+    num_keys = keys.shape[0]
+    num_traces = plaintexts.shape[0]
+    power = power[:, window]
+
+    if cache is None:
+        cache = simon_64_128_simulation.PrefixStateCache(plaintexts, max_bytes=0)
+    else:
+        cache.check_plaintexts(plaintexts)
+    # The states before the attacked round are calculated once for all traces and sliced per batch.
+    unique_states, inverse = cache.get_unique_states(keys[:, 4 - attacked_round :])
+    round_keys = np.ascontiguousarray(keys[:, 3 - attacked_round])
+
+    peaks = np.full(num_keys, np.nan, dtype=np.float64)
+    used_traces = np.zeros(num_keys, dtype=np.int64)
+    active = np.arange(num_keys)
+    corr = correlations.Corr((num_keys, power.shape[1]))
+
+    start = 0
+    end = min(first_batch, num_traces)
+    while start < num_traces:
+        # Per trace of a chunk: the expected hamming weights of the active keys.
+        step_size = corr.auto_step_size(
+            mem_budget, end - start, extra_per_trace=len(active)
+        )
+        for chunk_start in range(start, end, step_size):
+            chunk_end = min(chunk_start + step_size, end)
+            expected_hws = np.empty(
+                (chunk_end - chunk_start, len(active)), dtype=np.uint8
+            )
+            fused_cpa.predict_hws_tile(
+                tuple(s[chunk_start:chunk_end] for s in unique_states),
+                inverse[active],
+                round_keys[active],
+                mask,
+                attacked_state,
+                expected_hws,
+            )
+            corr.update(expected_hws, power[chunk_start:chunk_end])
+        used_traces[active] = corr.n
+
+        batch_peaks, _ = corr.peaks()
+        peaks[active] = batch_peaks
+        if end == num_traces or corr.n <= 3:
+            break
+
+        z = np.arctanh(np.minimum(np.abs(batch_peaks), 1 - 1e-12))
+        keep = z + 2 * confidence / np.sqrt(corr.n - 3) >= z.max()
+        if not np.all(keep):
+            peaks[active[~keep]] = np.nan
+            active = active[keep]
+            corr.select(keep)
+
+        start, end = end, min(2 * end, num_traces)
+
+    return peaks, used_traces
+
+
+def score_keys_sharded(
+    keys: np.ndarray,
+    plaintexts: np.ndarray,
+    power: np.ndarray,
+    attacked_round: int,
+    mask: np.uint32,
+    attacked_state: AttackedState = "ADD_ROUND_KEY",
+    num_workers: int = 1,
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    cache: simon_64_128_simulation.PrefixStateCache | None = None,
+    order: Literal[1, 2] = 1,
+    window: slice = slice(None),
+    fused: bool = False,
+    pool: "ScoringPool | None" = None,
+    mem_budget: int | None = None,
+) -> np.ndarray:
+    """Score the keys in shards of `shard_size` hypotheses.
+    With `num_workers > 1`, the shards are distributed over a process pool. The plaintexts and
+    power traces are copied once into shared memory instead of being pickled for each worker.
+    Both modes calculate exactly the same shards, so the results are identical.
+
+    Arguments:
+        cache: Cache for the states of the recovered rounds. Each worker process uses its own cache.
+        order, window, fused, mem_budget: See `score_keys`.
+        pool: Process pool for the same plaintexts and power traces which is reused between calls.
+            If None and `num_workers > 1`, a pool is created for this call only.
+    """
+    shards = [
+        (start, min(start + shard_size, keys.shape[0]))
+        for start in range(0, keys.shape[0], shard_size)
+    ]
+    peaks = np.zeros(keys.shape[0], dtype=np.float64)
+
+    if pool is None and (num_workers <= 1 or len(shards) <= 1):
+        if cache is None:
+            cache = simon_64_128_simulation.PrefixStateCache(plaintexts)
+        for start, end in shards:
+            peaks[start:end] = score_keys(
+                keys[start:end],
+                plaintexts,
+                power,
+                attacked_round,
+                mask,
+                attacked_state,
+                cache,
+                order,
+                window,
+                fused,
+                mem_budget,
+            )
+        return peaks
+
+    if pool is None:
+        with ScoringPool(plaintexts, power, num_workers) as pool:
+            return score_keys_sharded(
+                keys,
+                plaintexts,
+                power,
+                attacked_round,
+                mask,
+                attacked_state,
+                shard_size=shard_size,
+                order=order,
+                window=window,
+                fused=fused,
+                pool=pool,
+                mem_budget=mem_budget,
+            )
+
+    assert pool.plaintexts is plaintexts and pool.power is power
+    results = pool.executor.map(
+        _score_shard,
+        [
+            (
+                keys[start:end],
+                attacked_round,
+                mask,
+                attacked_state,
+                order,
+                window,
+                fused,
+                mem_budget,
+            )
+            for start, end in shards
+        ],
+    )
+    for (start, end), shard_peaks in zip(shards, results):
+        peaks[start:end] = shard_peaks
+    return peaks
+
+
+class ScoringPool:
+    """Process pool whose workers score keys on the same plaintexts and power traces.
+    The traces are copied once into shared memory and the workers keep their state caches,
+    so an attack creates the pool once instead of once per scored block.
+    The state caches of all workers together use at most `cache_bytes`.
+
+    Example:
+    ```
+        with ScoringPool(measurements.plaintext, measurements.power, num_workers=4) as pool:
+            for hypos in blocks:
+                hypos.score(measurements, attacked_round, pool=pool)
+    ```
+    """
+
+    def __init__(
+        self,
+        plaintexts: np.ndarray,
+        power: np.ndarray,
+        num_workers: int,
+        cache_bytes: int = simon_64_128_simulation.DEFAULT_CACHE_BYTES,
+    ):
+        self.plaintexts = plaintexts
+        self.power = power
+        self.shared_plaintexts = SharedArray(plaintexts)
+        self.shared_power = SharedArray(power)
+        try:
+            # Forking a process which runs threads (BLAS, Numba) can dead lock, so the workers are spawned.
+            self.executor = ProcessPoolExecutor(
+                max_workers=num_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(
+                    self.shared_plaintexts.spec(),
+                    self.shared_power.spec(),
+                    cache_bytes // num_workers,
+                ),
+            )
+        except BaseException:
+            self.shared_plaintexts.release()
+            self.shared_power.release()
+            raise
+
+    def __enter__(self) -> "ScoringPool":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        try:
+            self.executor.shutdown()
+        finally:
+            self.shared_plaintexts.release()
+            self.shared_power.release()
+
+
+class SharedArray:
+    """A numpy array in shared memory. Worker processes attach to it with `spec()`."""
+
+    def __init__(self, arr: np.ndarray):
+        self.shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        self.array = np.ndarray(arr.shape, dtype=arr.dtype, buffer=self.shm.buf)
+        self.array[...] = arr
+
+    def spec(self) -> tuple[str, tuple, str]:
+        return self.shm.name, self.array.shape, self.array.dtype.str
+
+    def release(self):
+        del self.array
+        self.shm.close()
+        self.shm.unlink()
+
+    @staticmethod
+    def attach(spec: tuple[str, tuple, str]):
+        name, shape, dtype = spec
+        try:
+            # The creating process owns the memory. Python >= 3.13 can skip the tracking in workers.
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=name)
+        return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+# State of a worker process. Set by _init_worker.
+_worker_state = {}
+
+
+def _init_worker(plaintexts_spec: tuple, power_spec: tuple, cache_bytes: int):
+    plaintexts_shm, plaintexts = SharedArray.attach(plaintexts_spec)
+    power_shm, power = SharedArray.attach(power_spec)
+    _worker_state["shms"] = [plaintexts_shm, power_shm]
+    _worker_state["plaintexts"] = plaintexts
+    _worker_state["power"] = power
+    _worker_state["cache"] = simon_64_128_simulation.PrefixStateCache(
+        plaintexts, cache_bytes
+    )
+    # Close the handles of the shared memory when the worker exits.
+    multiprocessing.util.Finalize(None, _close_worker, exitpriority=0)
+
+
+def _close_worker():
+    shms = _worker_state.pop("shms", [])
+    # The arrays use the buffers of the shared memory, so they are dropped first.
+    _worker_state.clear()
+    for shm in shms:
+        shm.close()
+
+
+def _score_shard(args: tuple) -> np.ndarray:
+    keys, attacked_round, mask, attacked_state, order, window, fused, mem_budget = args
+    return score_keys(
+        keys,
+        _worker_state["plaintexts"],
+        _worker_state["power"],
+        attacked_round,
+        mask,
+        attacked_state,
+        _worker_state["cache"],
+        order,
+        window,
+        fused,
+        mem_budget,
+    )
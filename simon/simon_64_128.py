@@ -89,3 +89,158 @@ def rotate_left(word: np.ndarray, bits: int) -> np.ndarray:
 def get_round_constant(round: int) -> np.ndarray:
     """Get the round constant for a given round."""
     return (Z >> (61 - round)) & 1
+
+
+# Round constants of the key expansion for the rounds M ... T - 1.
+ROUND_CONSTANTS = np.array(
+    [get_round_constant(i)[0] for i in range(T - M)], dtype=np.uint32
+)
+
+
+def expand_keys(keys: np.ndarray) -> np.ndarray:
+    """Expand multiple keys at once.
+    Example:
+        keys.shape = (256, 4)
+        result.shape == (256, 44)
+    """
+    keys = keys.reshape((-1, M))
+    round_keys = np.zeros((keys.shape[0], T), dtype=np.uint32)
+    round_keys[:, :M] = keys[:, ::-1]
+
+    for i in range(M, T):
+        tmp = rotate_left(round_keys[:, i - 1], -3) ^ round_keys[:, i - 3]
+        tmp ^= rotate_left(tmp, -1)
+        round_keys[:, i] = ~round_keys[:, i - M] ^ tmp ^ ROUND_CONSTANTS[i - M] ^ 3
+
+    return round_keys
+
+
+def encrypt_many(
+    plaintexts: np.ndarray, keys: np.ndarray, states: np.ndarray | None = None
+) -> np.ndarray:
+    """Encrypt every plaintext with every key. No log is created.
+    Example:
+        plaintexts.shape = (10000, 2)
+        keys.shape = (3, 4)
+        result.shape == (10000, 3, 2)
+
+    Arguments:
+        states: Optional preallocated array with shape (T + 1, N, K, 2).
+            It receives the states (x, y) before the first round and after each round.
+    """
+    plaintexts = plaintexts.reshape((-1, 2))
+    round_keys = expand_keys(keys)
+
+    x = np.repeat(plaintexts[:, 0:1], round_keys.shape[0], axis=1)
+    y = np.repeat(plaintexts[:, 1:2], round_keys.shape[0], axis=1)
+    if states is not None:
+        assert states.shape == (T + 1, x.shape[0], x.shape[1], 2)
+
+    x, y = perform_rounds(x, y, round_keys, states)
+    return np.stack([x, y], axis=2)
+
+
+def perform_rounds(
+    x: np.ndarray,
+    y: np.ndarray,
+    round_keys: np.ndarray,
+    states: np.ndarray | None = None,
+    and_gate: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Perform all rounds on the states x and y with any shape S. This is the round loop of
+    `encrypt_many` and `encrypt_blocks`.
+    Example:
+        x.shape = y.shape = (10000, 3)  # 10,000 plaintexts for 3 keys
+        round_keys.shape = (3, 44)      # broadcast to S + (44,)
+        result: x.shape = y.shape = (10000, 3)
+
+    Arguments:
+        states: Optional array with shape (T + 1,) + S + (2,).
+            It receives the states (x, y) before the first round and after each round.
+        and_gate: Optional array with shape (T,) + S. It receives the output of the AND gate of each round.
+    """
+    if states is not None:
+        states[0, ..., 0] = x
+        states[0, ..., 1] = y
+
+    for i in range(T):
+        and_out = rotate_left(x, 1) & rotate_left(x, 8)
+        if and_gate is not None:
+            and_gate[i] = and_out
+
+        tmp = x
+        x = y ^ and_out ^ rotate_left(x, 2) ^ round_keys[..., i]
+        y = tmp
+        if states is not None:
+            states[i + 1, ..., 0] = x
+            states[i + 1, ..., 1] = y
+
+    return x, y
+
+
+def decrypt_many(ciphertexts: np.ndarray, keys: np.ndarray) -> np.ndarray:
+    """Decrypt every ciphertext with every key.
+    Example:
+        ciphertexts.shape = (10000, 2)
+        keys.shape = (3, 4)
+        result.shape == (10000, 3, 2)
+    """
+    ciphertexts = ciphertexts.reshape((-1, 2))
+    round_keys = expand_keys(keys)
+
+    x = np.repeat(ciphertexts[:, 0:1], round_keys.shape[0], axis=1)
+    y = np.repeat(ciphertexts[:, 1:2], round_keys.shape[0], axis=1)
+
+    # Perform the rounds backwards.
+    for i in range(T - 1, -1, -1):
+        tmp = y
+        y = (
+            x
+            ^ (rotate_left(y, 1) & rotate_left(y, 8))
+            ^ rotate_left(y, 2)
+            ^ round_keys[:, i]
+        )
+        x = tmp
+
+    return np.stack([x, y], axis=2)
+
+
+def check_keys(
+    keys: np.ndarray, plaintexts: np.ndarray, ciphertexts: np.ndarray
+) -> np.ndarray:
+    """Check which keys encrypt all plaintexts to the given ciphertexts.
+    Example:
+        keys.shape = (1000, 4)  # candidate keys
+        plaintexts.shape = ciphertexts.shape = (2, 2)
+        result.shape == (1000,)
+    """
+    encrypted = encrypt_many(plaintexts, keys)
+    return np.all(encrypted == ciphertexts.reshape((-1, 1, 2)), axis=(0, 2))
+
+
+def encrypt_blocks(
+    plaintexts: np.ndarray, keys: np.ndarray, record_and_gate: bool = False
+) -> tuple[np.ndarray, logger.StateLog]:
+    """Encrypt a batch of blocks, block i with key i (or all blocks with the same key).
+    Return the ciphertexts and an array backed log of the intermediate values.
+    Example:
+        plaintexts.shape = (1000, 2)
+        keys.shape = (1000, 4) or (4,)
+        result: ciphertexts.shape == (1000, 2), log.states.shape == (1000, 45, 2)
+    """
+    plaintexts = plaintexts.reshape((-1, 2))
+    keys = np.broadcast_to(keys.reshape((-1, M)), (plaintexts.shape[0], M))
+
+    log = logger.StateLog(plaintexts.shape[0], T, record_and_gate)
+    log.keys[...] = keys
+    log.round_keys[...] = expand_keys(keys)
+
+    # The log stores the rounds on the second axis, the round loop on the first one.
+    perform_rounds(
+        plaintexts[:, 0],
+        plaintexts[:, 1],
+        log.round_keys,
+        np.moveaxis(log.states, 1, 0),
+        None if log.and_gate is None else log.and_gate.T,
+    )
+    return log.states[:, T].copy(), log
@@ -1,15 +1,22 @@
-from typing import Literal
 import numpy as np
 
+import leakage_models
 import logger
 
+from hamming import hamming_weight as bits_count
+from leakage_models import AttackedState
+from profiling import profiled
 
+
+@profiled
 def get_hws_for_guessed_keys(
     plaintexts: np.ndarray,
     keys: np.ndarray,
     round: int,
     mask: np.uint32,
-    attacked_state: Literal["ADD_ROUND_KEY", "AND_GATE"] = "ADD_ROUND_KEY",
+    attacked_state: AttackedState = "ADD_ROUND_KEY",
+    dtype=np.uint8,
+    cache: "PrefixStateCache | None" = None,
 ) -> np.ndarray:
     """Perform the specified number of rounds on multiple plaintexts and multiple keys
     and return the hamming weight of the intermediate x state for each combination of plaintext and key.
@@ -17,6 +24,10 @@ def get_hws_for_guessed_keys(
         plaintexts.shape = (10000, 2)   # 10,000 plaintexts each with 2 words
         keys.shape = (256, 4)           # 256 keys each with 4 words
         result.shape == (10000, 256)
+
+    Arguments:
+        dtype: Data type of the hamming weights. uint8 is sufficient for 32 bit states.
+        cache: Cache for the states before the attacked round. See `get_inter_states`.
     """
     if plaintexts.ndim == 1:
         plaintexts = plaintexts.reshape((1, 2))
@@ -26,18 +37,18 @@ def get_hws_for_guessed_keys(
         keys = keys.reshape((1, 4))
     assert keys.shape[1] == 4
 
-    xs = get_inter_states(plaintexts, keys, round, attacked_state)
-    return bits_count(xs & mask).astype(np.uint32)
-
-
-bits_count = np.frompyfunc(int.bit_count, 1, 1)
+    xs = get_inter_states(plaintexts, keys, round, attacked_state, cache)
+    xs &= mask
+    return bits_count(xs, dtype=dtype)
 
 
+@profiled
 def get_inter_states(
     plaintexts: np.ndarray,
     keys: np.ndarray,
     attacked_round: int,
-    attacked_state: Literal["ADD_ROUND_KEY", "AND_GATE"] = "ADD_ROUND_KEY",
+    attacked_state: AttackedState = "ADD_ROUND_KEY",
+    cache: "PrefixStateCache | None" = None,
 ) -> np.ndarray:
     """Perform the specified number of rounds on multiple plaintexts and multiple keys
     and return the intermediate x state for each combination of plaintext and key.
@@ -45,6 +56,10 @@ def get_inter_states(
         plaintexts.shape = (10000, 2)   # 10,000 plaintexts each with 2 words
         keys.shape = (256, 4)           # 256 keys each with 4 words
         result.shape == (10000, 256)
+
+    Arguments:
+        attacked_state: Name of a leakage model in `leakage_models.LEAKAGE_MODELS`.
+        cache: Cache for the states before the attacked round. It must be created for the same plaintexts.
     """
     if plaintexts.ndim == 1:
         plaintexts = plaintexts.reshape((1, 2))
@@ -56,40 +71,159 @@ def get_inter_states(
 
     assert 0 <= attacked_round < 4
 
-    round_keys = np.zeros_like(keys)
-    round_keys[:, 0] = keys[:, 3]
-    round_keys[:, 1] = keys[:, 2]
-    round_keys[:, 2] = keys[:, 1]
-    round_keys[:, 3] = keys[:, 0]
-
-    x = np.repeat(plaintexts[:, 0:1], keys.shape[0], axis=1)
-    y = np.repeat(plaintexts[:, 1:2], keys.shape[0], axis=1)
-
-    # Perform the rounds.
-    for i in range(attacked_round + 1):
-        tmp = x.copy()
-        x = (
-            y
-            ^ (((x << 1) | (x >> 31)) & ((x << 8) | (x >> 24)))
-            ^ ((x << 2) | (x >> 30))
-            ^ round_keys[:, i]
-        )
-        y = tmp
+    if cache is None:
+        cache = PrefixStateCache(plaintexts, max_bytes=0)
+    else:
+        cache.check_plaintexts(plaintexts)
 
-    if attacked_state == "ADD_ROUND_KEY":
-        res = x
+    model = leakage_models.get_model(attacked_state)
+
+    # State before the attacked round. The round keys of the previous rounds are the key words 3, 2, ...
+    (x, _, t), inverse = cache.get_unique_states(keys[:, 4 - attacked_round :])
+
+    # Perform the attacked round. y ^ f(x) does not depend on the round key of the attacked round.
+    new_x = t[:, inverse]
+    new_x ^= keys[:, 3 - attacked_round]
+
+    previous_x = x[:, inverse] if model.uses_previous_state else None
+    return model.predict(new_x, previous_x)
+
+
+def perform_round(
+    x: np.ndarray, y: np.ndarray, round_key: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Perform one Simon round on the states x and y. Return the new states x and y."""
+    new_x = y ^ f(x) ^ round_key
+    return new_x, x
 
-    elif attacked_state == "AND_GATE":
-        # perform the AND gate of the next round.
-        res = ((x << 1) | (x >> 31)) & ((x << 8) | (x >> 24))
-    else:
-        raise ValueError(f"Invalid attacked state: {attacked_state}")
 
-    return res
+def f(x: np.ndarray) -> np.ndarray:
+    """The round function of Simon: (x <<< 1 & x <<< 8) ^ x <<< 2"""
+    return (((x << 1) | (x >> 31)) & ((x << 8) | (x >> 24))) ^ ((x << 2) | (x >> 30))
 
 
-def log_to_simulated_power(log: logger.Log) -> np.ndarray:
-    """Take the log from the simon encryption and generate a simulated power trace."""
+# Default number of bytes of the states in a `PrefixStateCache`.
+DEFAULT_CACHE_BYTES = 256 * 2**20
+
+
+class PrefixStateCache:
+    """Cache for the states (x, y) after the fully recovered rounds for a fixed set of plaintexts.
+    The states are stored for each distinct key prefix, i.e. the round keys of the previous rounds.
+    Hypotheses which share a prefix only need to perform the attacked round.
+    The key independent part y ^ f(x) of the attacked round is cached as well. Attacking round 0 only
+    needs it once per set of plaintexts, so each hypothesis only adds its round key.
+
+    Each prefix stores 3 x uint32 per trace, so the number of prefixes is bounded by `max_bytes`.
+
+    Example:
+        Attacking round 2 with 4096 hypotheses which share 3 distinct values for the key words 3 and 2
+        -> rounds 0 and 1 and y ^ f(x) of round 2 are calculated for 3 prefixes instead of 4096 keys.
+        50000 traces, max_bytes = 256 MiB -> 600 kB per prefix, at most 447 prefixes
+    """
+
+    def __init__(self, plaintexts: np.ndarray, max_bytes: int = DEFAULT_CACHE_BYTES):
+        if plaintexts.ndim == 1:
+            plaintexts = plaintexts.reshape((1, 2))
+        self.plaintexts = plaintexts
+        self.max_bytes = max_bytes
+        self.max_entries = max_bytes // (3 * 4 * max(plaintexts.shape[0], 1))
+        # x, y and y ^ f(x) for each prefix.
+        self.states: dict[bytes, tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    def clear(self):
+        self.states.clear()
+
+    def nbytes(self) -> int:
+        """Number of bytes of the cached states."""
+        return sum(s.nbytes for states in self.states.values() for s in states)
+
+    def check_plaintexts(self, plaintexts: np.ndarray):
+        """Raise a ValueError if the cache was created for other plaintexts.
+        The same array is accepted without comparing the values.
+        """
+        if plaintexts is self.plaintexts:
+            return
+        if plaintexts.ndim == 1:
+            plaintexts = plaintexts.reshape((1, 2))
+        if plaintexts.shape != self.plaintexts.shape or not np.array_equal(
+            plaintexts, self.plaintexts
+        ):
+            raise ValueError("The cache was created for different plaintexts.")
+
+    @profiled
+    def get_states(self, prefixes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Get the states x and y after the rounds given by the key prefixes.
+        Example:
+            plaintexts.shape = (10000, 2)
+            prefixes.shape = (256, 2)   # key words 2 and 3 of 256 keys -> state after round 1
+            result: x.shape = y.shape = (10000, 256)
+        """
+        (x, y, _), inverse = self.get_unique_states(prefixes)
+        return x[:, inverse], y[:, inverse]
+
+    def get_unique_states(
+        self, prefixes: np.ndarray
+    ) -> tuple[tuple[np.ndarray, np.ndarray, np.ndarray], np.ndarray]:
+        """Get the states x, y and y ^ f(x) after the rounds given by the key prefixes for each distinct prefix,
+        and the index of the distinct prefix of each key.
+        Example:
+            plaintexts.shape = (10000, 2)
+            prefixes.shape = (256, 2)   # 3 distinct prefixes
+            result: x.shape = y.shape = (10000, 3), inverse.shape = (256,)
+        """
+        num_keys = prefixes.shape[0]
+        num_rounds = prefixes.shape[1]
+
+        # Round keys in the order of the rounds.
+        round_keys = np.ascontiguousarray(prefixes[:, ::-1], dtype=np.uint32)
+        if num_rounds == 0:
+            unique_keys = round_keys[:1]
+            inverse = np.zeros(num_keys, dtype=np.int64)
+        else:
+            unique_keys, inverse = np.unique(round_keys, axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+        cache_ids = [k.tobytes() for k in unique_keys]
+
+        states = {c: self.states[c] for c in cache_ids if c in self.states}
+
+        # Calculate the missing states for all unknown prefixes at once.
+        missing = [i for i, c in enumerate(cache_ids) if c not in states]
+        if len(missing) > 0:
+            x = np.repeat(self.plaintexts[:, 0:1], len(missing), axis=1)
+            y = np.repeat(self.plaintexts[:, 1:2], len(missing), axis=1)
+            for i in range(num_rounds):
+                x, y = perform_round(x, y, unique_keys[missing, i])
+            t = y ^ f(x)
+
+            new_states = {
+                cache_ids[u]: (x[:, j], y[:, j], t[:, j]) for j, u in enumerate(missing)
+            }
+            states.update(new_states)
+
+            if len(self.states) + len(new_states) > self.max_entries:
+                self.clear()
+            if len(new_states) <= self.max_entries:
+                # Copies, so the cache does not keep the arrays of all missing prefixes alive.
+                self.states.update(
+                    {c: tuple(s.copy() for s in v) for c, v in new_states.items()}
+                )
+
+        unique_states = tuple(
+            np.stack([states[c][i] for c in cache_ids], axis=1) for i in range(3)
+        )
+        return unique_states, inverse
+
+
+def log_to_simulated_power(log: logger.Log | logger.StateLog) -> np.ndarray:
+    """Take the log from the simon encryption and generate a simulated power trace.
+    For a `logger.StateLog`, one trace per encryption is generated from the x states without any per-entry objects.
+    Example:
+        log from `simon_64_128.encrypt_block` -> result.shape == (45,)
+        log from `simon_64_128.encrypt_blocks` for 1000 blocks -> result.shape == (1000, 45)
+    """
+    if isinstance(log, logger.StateLog):
+        return bits_count(log.states[:, :, 0])
+
     x_values = []
     for e in log.entries:
         if e.label.startswith("X"):
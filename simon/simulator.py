@@ -0,0 +1,107 @@
+from typing import Iterator, Literal
+import numpy as np
+
+import simon_64_128
+import trace_store
+
+from hamming import hamming_weight
+from measurement import Measurements
+
+
+class TraceSimulator:
+    """Generate simulated power traces of Simon encryptions at array speed.
+    Each trace has one sample per state x (before the first round and after each round).
+
+    Leakage models:
+        - HW: hamming weight of the state x
+        - HD: hamming distance between the state x and the previous state x (the first sample uses 0 as previous state)
+
+    With `masked=True`, each state is split into two Boolean shares (x ^ m, m) with a fresh random mask m.
+    Both shares leak in separate samples, so each trace has two samples per state and no first order leakage.
+
+    Example:
+    ```
+        simulator = TraceSimulator(key, leakage="HW", noise_std=2.0, jitter=3, seed=42)
+        for measurements in simulator.stream(1_000_000, chunk_size=10_000):
+            corr.update(expected_hws[...], measurements.power)
+    ```
+    """
+
+    def __init__(
+        self,
+        key: np.ndarray,
+        leakage: Literal["HW", "HD"] = "HW",
+        noise_std: float = 0.0,
+        jitter: int = 0,
+        masked: bool = False,
+        seed: int | None = None,
+        power_dtype=np.float32,
+    ):
+        if leakage not in ["HW", "HD"]:
+            raise ValueError(f"Invalid leakage model: {leakage}")
+        assert jitter >= 0
+
+        self.key = np.asarray(key, dtype=np.uint32)
+        self.leakage = leakage
+        self.noise_std = noise_std
+        self.jitter = jitter
+        self.masked = masked
+        self.power_dtype = np.dtype(power_dtype)
+        self.rng = np.random.default_rng(seed)
+
+        num_states = simon_64_128.T + 1
+        self.num_points = 2 * num_states if masked else num_states
+        self.num_samples = self.num_points + 2 * jitter
+
+    def generate(self, num_traces: int) -> Measurements:
+        """Generate a chunk of measurements with random plaintexts."""
+        plaintexts = self.rng.integers(0, 2**32, (num_traces, 2), dtype=np.uint32)
+        ciphertexts, log = simon_64_128.encrypt_blocks(plaintexts, self.key)
+        xs = log.states[:, :, 0]
+
+        if self.leakage == "HD":
+            previous = np.zeros_like(xs)
+            previous[:, 1:] = xs[:, :-1]
+            xs = xs ^ previous
+
+        if self.masked:
+            masks = self.rng.integers(0, 2**32, xs.shape, dtype=np.uint32)
+            shares = np.empty((num_traces, self.num_points), dtype=np.uint32)
+            shares[:, 0::2] = xs ^ masks
+            shares[:, 1::2] = masks
+            xs = shares
+
+        points = hamming_weight(xs, dtype=np.float32)
+
+        # Place the points with a random shift of up to `jitter` samples in each direction.
+        power = np.zeros((num_traces, self.num_samples), dtype=np.float32)
+        shifts = self.jitter + self.rng.integers(
+            -self.jitter, self.jitter + 1, num_traces
+        )
+        cols = shifts[:, np.newaxis] + np.arange(self.num_points)
+        power[np.arange(num_traces)[:, np.newaxis], cols] = points
+
+        if self.noise_std > 0:
+            power += self.rng.normal(0, self.noise_std, power.shape).astype(np.float32)
+
+        if self.power_dtype.kind in "iu":
+            power = np.rint(power)
+        return Measurements(plaintexts, ciphertexts, power.astype(self.power_dtype))
+
+    def stream(
+        self, num_traces: int, chunk_size: int = 10000
+    ) -> Iterator[Measurements]:
+        """Generate the measurements chunk by chunk."""
+        for start in range(0, num_traces, chunk_size):
+            yield self.generate(min(chunk_size, num_traces - start))
+
+    def write_store(self, store_dir: str, num_traces: int, chunk_size: int = 10000):
+        """Generate the measurements and write them into a trace store (see `trace_store`)."""
+        writer = trace_store.TraceStoreWriter(
+            store_dir, num_traces, self.num_samples, self.power_dtype, self.key
+        )
+        for measurements in self.stream(num_traces, chunk_size):
+            writer.append(
+                measurements.plaintext, measurements.ciphertext, measurements.power
+            )
+        writer.close()
@@ -0,0 +1,185 @@
+import json
+import os
+
+import numpy as np
+
+from measurement import Measurements, check_power_range
+
+
+PLAINTEXT_FILE = "plaintext.npy"
+CIPHERTEXT_FILE = "ciphertext.npy"
+POWER_FILE = "power.npy"
+METADATA_FILE = "metadata.json"
+
+
+class TraceStoreWriter:
+    """Write measurements into a trace store with one memory mapped .npy file per column.
+    The number of samples and the maximum number of traces must be known when the store is created.
+
+    Example:
+    ```
+        writer = TraceStoreWriter("./traces/demo/store", 2000, 5000, np.int16, key)
+        writer.append(plaintexts, ciphertexts, powers)  # can be called multiple times with chunks
+        writer.close()
+    ```
+    """
+
+    def __init__(
+        self,
+        store_dir: str,
+        num_traces: int,
+        num_samples: int,
+        power_dtype=np.int16,
+        key: np.ndarray | None = None,
+    ):
+        os.makedirs(store_dir, exist_ok=True)
+        self.store_dir = store_dir
+        self.num_traces = num_traces
+        self.num_samples = num_samples
+        self.key = key
+        self.pos = 0
+
+        self.plaintext = np.lib.format.open_memmap(
+            os.path.join(store_dir, PLAINTEXT_FILE), "w+", np.uint32, (num_traces, 2)
+        )
+        self.ciphertext = np.lib.format.open_memmap(
+            os.path.join(store_dir, CIPHERTEXT_FILE), "w+", np.uint32, (num_traces, 2)
+        )
+        self.power = np.lib.format.open_memmap(
+            os.path.join(store_dir, POWER_FILE),
+            "w+",
+            power_dtype,
+            (num_traces, num_samples),
+        )
+
+    def append(self, plaintext: np.ndarray, ciphertext: np.ndarray, power: np.ndarray):
+        """Write a chunk of traces behind the previously written traces."""
+        assert plaintext.shape[0] == ciphertext.shape[0] == power.shape[0]
+        assert power.shape[1] == self.num_samples
+
+        end = self.pos + plaintext.shape[0]
+        assert end <= self.num_traces
+        check_power_range(power, self.power.dtype)
+
+        self.plaintext[self.pos : end] = plaintext
+        self.ciphertext[self.pos : end] = ciphertext
+        self.power[self.pos : end] = power
+        self.pos = end
+
+    def close(self, allow_partial: bool = False):
+        """Flush all columns and write the metadata.
+
+        Arguments:
+            allow_partial: Allow fewer traces than `num_traces`. The store only contains the written traces.
+        """
+        assert (
+            allow_partial or self.pos == self.num_traces
+        ), "Not all traces were written."
+
+        for column in [self.plaintext, self.ciphertext, self.power]:
+            column.flush()
+
+        metadata = {
+            "num_traces": self.pos,
+            "num_samples": self.num_samples,
+            "power_dtype": np.dtype(self.power.dtype).str,
+            "key": None if self.key is None else [int(k) for k in self.key],
+        }
+        with open(os.path.join(self.store_dir, METADATA_FILE), "w") as f:
+            json.dump(metadata, f, indent=2)
+
+
+def write_store(
+    store_dir: str,
+    measurements: Measurements,
+    key: np.ndarray | None = None,
+    power_dtype=None,
+):
+    """Write measurements which are already in memory into a trace store."""
+    if power_dtype is None:
+        power_dtype = measurements.power.dtype
+
+    writer = TraceStoreWriter(
+        store_dir,
+        measurements.power.shape[0],
+        measurements.power.shape[1],
+        power_dtype,
+        key,
+    )
+    writer.append(measurements.plaintext, measurements.ciphertext, measurements.power)
+    writer.close()
+
+
+def bytes_to_words(data: np.ndarray) -> np.ndarray:
+    """Convert rows of 8 bytes into rows of 2 big endian uint32 words.
+
+    Example:
+        data = [[0x65, 0x6B, 0x69, 0x6C, 0x20, 0x64, 0x6E, 0x75]]
+        -> [[0x656B696C, 0x20646E75]]
+    """
+    data = np.ascontiguousarray(data, dtype=np.uint8)
+    return data.view(">u4").astype(np.uint32)
+
+
+def convert_project(
+    project_path: str,
+    store_dir: str | None = None,
+    power_dtype=np.int16,
+    chunk_size: int = 1000,
+) -> str:
+    """Convert a ChipWhisperer project (e.g. `trace.zip`) into a trace store. This only needs to be done once.
+    If the project folder contains a `key.txt`, the key is stored in the metadata.
+    The power traces are stored as `power_dtype`. int16 is sufficient for traces captured with `as_int=True`.
+    Return the directory of the trace store.
+    """
+    import chipwhisperer as cw
+
+    project_dir = os.path.dirname(os.path.abspath(project_path))
+    if store_dir is None:
+        store_dir = os.path.join(project_dir, "store")
+
+    key = None
+    key_path = os.path.join(project_dir, "key.txt")
+    if os.path.exists(key_path):
+        with open(key_path) as f:
+            key_bytes = np.frombuffer(bytes.fromhex(f.read().strip()), dtype=np.uint8)
+        key = bytes_to_words(key_bytes.reshape((2, 8))).flatten()
+
+    project = cw.import_project(project_path, overwrite=True)
+    traces = project.traces
+    num_traces = len(traces)
+    num_samples = len(traces[0].wave)
+
+    writer = TraceStoreWriter(store_dir, num_traces, num_samples, power_dtype, key)
+
+    for start in range(0, num_traces, chunk_size):
+        chunk = [traces[i] for i in range(start, min(start + chunk_size, num_traces))]
+        textin = np.array([t.textin for t in chunk], dtype=np.uint8)
+        textout = np.array([t.textout for t in chunk], dtype=np.uint8)
+        waves = np.array([t.wave for t in chunk])
+        writer.append(bytes_to_words(textin), bytes_to_words(textout), waves)
+
+    writer.close()
+    return store_dir
+
+
+def load_metadata(store_dir: str) -> dict:
+    with open(os.path.join(store_dir, METADATA_FILE)) as f:
+        metadata = json.load(f)
+
+    if metadata["key"] is not None:
+        metadata["key"] = np.array(metadata["key"], dtype=np.uint32)
+    return metadata
+
+
+def open_store(store_dir: str) -> Measurements:
+    """Open a trace store as measurements without reading the data.
+    All columns are read-only memory maps, so slicing only loads the selected traces and samples.
+    """
+    # The files of a partially written store are longer than the written traces.
+    num_traces = load_metadata(store_dir)["num_traces"]
+    return Measurements(
+        np.load(os.path.join(store_dir, PLAINTEXT_FILE), mmap_mode="r")[:num_traces],
+        np.load(os.path.join(store_dir, CIPHERTEXT_FILE), mmap_mode="r")[:num_traces],
+        np.load(os.path.join(store_dir, POWER_FILE), mmap_mode="r")[:num_traces],
+    )
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import alignment
+import scoring
+import simulator
+import trace_store
+
+from measurement import Measurements
+
+
+class TestAlignment(unittest.TestCase):
+    def test_apply_shifts(self):
+        power = np.array([[1, 2, 3, 4], [1, 2, 3, 4]], dtype=np.int16)
+        aligned = alignment.apply_shifts(power, np.array([1, -2]))
+        np.testing.assert_array_equal(aligned, [[2, 3, 4, 4], [1, 1, 1, 2]])
+        self.assertEqual(aligned.dtype, np.int16)
+
+    def test_find_shifts(self):
+        rng = np.random.default_rng(0)
+        reference = rng.normal(0, 1, 300)
+        shifts = rng.integers(-10, 11, 50)
+        power = np.array([np.roll(reference, s) for s in shifts])
+        power += rng.normal(0, 0.1, power.shape)
+
+        found = alignment.find_shifts(power, reference, slice(50, 250), 10)
+        np.testing.assert_array_equal(found, shifts)
+
+    def test_align_measurements(self):
+        rng = np.random.default_rng(1)
+        key = np.array(
+            [0x1B1A1918, 0x13121110, 0x0B0A0908, 0x03020100], dtype=np.uint32
+        )
+        clean = simulator.TraceSimulator(key, noise_std=0.5, seed=0).generate(600)
+
+        # Add a strong pattern which is the same in each trace (e.g. the clock) and shift the traces randomly.
+        power = np.pad(clean.power, ((0, 0), (10, 10))) + rng.normal(0, 5, 65)
+        power = alignment.apply_shifts(power, rng.integers(-5, 6, 600))
+        power += rng.normal(0, 0.5, power.shape)
+        measurements = Measurements(clean.plaintext, clean.ciphertext, power)
+
+        keys = np.zeros((2, 4), dtype=np.uint32)
+        keys[0, 3] = key[3] & 0xFF
+        keys[1, 3] = ~key[3] & 0x7F
+
+        before = scoring.score_keys(keys, measurements.plaintext, power, 0, 0xFF)
+        aligned, shifts = alignment.align_measurements(
+            measurements, slice(10, 55), 10, chunk_size=100
+        )
+        after = scoring.score_keys(keys, aligned.plaintext, aligned.power, 0, 0xFF)
+
+        self.assertEqual(shifts.shape, (600,))
+        self.assertTrue(np.all(np.abs(shifts) <= 10))
+        self.assertGreater(abs(after[0]), abs(before[0]) + 0.2)
+        self.assertGreater(abs(after[0]), abs(after[1]))
+
+        with tempfile.TemporaryDirectory() as store_dir:
+            stored, stored_shifts = alignment.align_measurements(
+                measurements, slice(10, 55), 10, chunk_size=100, store_dir=store_dir
+            )
+            np.testing.assert_array_equal(stored_shifts, shifts)
+            np.testing.assert_array_equal(stored.power, aligned.power)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source_dir = os.path.join(tmp_dir, "store")
+            aligned_dir = os.path.join(tmp_dir, "aligned")
+            trace_store.write_store(source_dir, measurements, key)
+            stored, stored_shifts = alignment.align_store(
+                source_dir, aligned_dir, slice(10, 55), 10, chunk_size=100
+            )
+            np.testing.assert_array_equal(stored_shifts, shifts)
+            np.testing.assert_array_equal(stored.power, aligned.power)
+            np.testing.assert_array_equal(
+                trace_store.load_metadata(aligned_dir)["key"], key
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import tracemalloc
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import attack
+import scoring
+import simulator
+
+from measurement import Measurements
+
+
+class TestAttack(unittest.TestCase):
+    def setUp(self):
+        self.key = np.array(
+            [0x1B1A1918, 0x13121110, 0x0B0A0908, 0x03020100], dtype=np.uint32
+        )
+
+    def test_get_step_masks(self):
+        masks = attack.get_step_masks("ADD_ROUND_KEY", 6)
+        self.assertEqual(len(masks), 6)
+        self.assertEqual(masks[0], 0x3F)
+        self.assertEqual(masks[-1], 0xFFFFFFFF)
+
+        masks = attack.get_step_masks("AND_GATE", 8)
+        self.assertEqual(len(masks), 4)
+        self.assertEqual(bin(int(masks[0])).count("1"), 8)
+        self.assertEqual(masks[-1], 0xFFFFFFFF)
+
+    def test_run_attack(self):
+        measurements = simulator.TraceSimulator(
+            self.key, noise_std=1.0, seed=0
+        ).generate(1000)
+        # A tiny memory budget forces many blocks per step.
+        result = attack.run_attack(
+            measurements, beam_width=4, threshold=0.05, mem_budget=2**20
+        )
+        np.testing.assert_array_equal(result.key, self.key)
+        self.assertEqual(len(result.steps), 4 * 6)
+        for step in result.steps:
+            self.assertLessEqual(step.num_survivors, 4)
+            self.assertLessEqual(step.num_hypos, 4 * 2**6)
+
+    def test_run_attack_many_samples(self):
+        measurements = simulator.TraceSimulator(
+            self.key, noise_std=1.0, seed=0
+        ).generate(300)
+        # Realistic traces with 5000 samples, the leaking samples are at the start.
+        rng = np.random.default_rng(1)
+        noise = rng.normal(0, 1, (300, 4955)).astype(np.float32)
+        measurements = Measurements(
+            measurements.plaintext,
+            measurements.ciphertext,
+            np.concatenate([measurements.power, noise], axis=1),
+        )
+
+        mem_budget = 32 * 2**20
+        tracemalloc.start()
+        try:
+            result = attack.run_attack(
+                measurements, beam_width=4, mem_budget=mem_budget
+            )
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        np.testing.assert_array_equal(result.key, self.key)
+        self.assertLess(peak, mem_budget)
+
+    def test_run_attack_parallel(self):
+        measurements = simulator.TraceSimulator(
+            self.key, noise_std=1.0, seed=0
+        ).generate(1000)
+        with mock.patch.object(
+            scoring, "ScoringPool", wraps=scoring.ScoringPool
+        ) as pool:
+            result = attack.run_attack(
+                measurements,
+                beam_width=4,
+                threshold=0.05,
+                mem_budget=2**20,
+                num_workers=2,
+            )
+        np.testing.assert_array_equal(result.key, self.key)
+        # One pool for all steps and blocks.
+        self.assertEqual(pool.call_count, 1)
+
+    def test_run_attack_early_abort(self):
+        measurements = simulator.TraceSimulator(
+            self.key, noise_std=2.0, seed=1
+        ).generate(2000)
+        result = attack.run_attack(measurements, beam_width=4, confidence=3.0)
+        np.testing.assert_array_equal(result.key, self.key)
+        self.assertFalse(np.any(np.isnan(result.frontier.corrs)))
+
+        with self.assertRaises(ValueError):
+            attack.run_attack(measurements, confidence=3.0, num_workers=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import json
+import unittest
+from unittest import mock
+
+import benchmark
+import correlations
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_run(self):
+        report = benchmark.run([(50, 20, 16)], recovery_traces=300)
+
+        stages = [r["stage"] for r in report["results"]]
+        self.assertEqual(
+            stages,
+            [
+                "sub_hypotheses",
+                "hypothesis_expansion",
+                "intermediate_states",
+                "hamming_weights",
+                "guessed_key_hws",
+                "correlation",
+                "filtering",
+                "attack_step",
+                "full_recovery",
+            ],
+        )
+        for result in report["results"]:
+            self.assertGreater(result["time_s"], 0)
+            self.assertGreater(result["peak_bytes"], 0)
+        self.assertEqual(report["results"][0]["num_hypos"], 16)
+        self.assertTrue(report["results"][-1]["success"])
+
+        # The report is written as JSON.
+        json.dumps(report)
+
+    def test_large_hypotheses(self):
+        # 64 hypotheses x 20 samples need more than this default budget for the cross products.
+        with mock.patch.object(correlations, "DEFAULT_MEM_BUDGET", 2**14):
+            results = benchmark.bench_attack_step(50, 20, 64)
+        self.assertIn("correlation", [r["stage"] for r in results])
+
+    def test_measure(self):
+        calls = []
+        wall_time, peak = benchmark.measure(lambda: calls.append(bytearray(2**20)), 3)
+        # 3 timed runs and 1 run for the peak memory.
+        self.assertEqual(len(calls), 4)
+        self.assertGreater(wall_time, 0)
+        self.assertGreaterEqual(peak, 2**20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,228 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import correlations
+
+
+class TestCorrelations(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.x = rng.integers(0, 33, (1000, 16)).astype(np.uint8)
+        self.y = rng.normal(100, 5, (1000, 50)) + 0.5 * self.x[:, 0:1]
+        self.expected = np.corrcoef(self.x.T.astype(np.float64), self.y.T)[:16, 16:]
+
+    def test_calc_corrs(self):
+        for step_size in [1, 10, 333, 1000]:
+            corrs = correlations.calc_corrs(self.x, self.y, step_size=step_size)
+            np.testing.assert_allclose(corrs, self.expected, atol=1e-12)
+
+    def test_calc_corrs_mem_budget(self):
+        corrs = correlations.calc_corrs(self.x, self.y, mem_budget=2**16)
+        np.testing.assert_allclose(corrs, self.expected, atol=1e-12)
+
+        corrs = correlations.calc_corrs(self.x, self.y, dtype=np.float32)
+        np.testing.assert_allclose(corrs, self.expected, atol=1e-5)
+
+    def test_float32_accumulation(self):
+        corr = correlations.Corr((16, 50), dtype=np.float32)
+        for i in range(0, 1000, 10):
+            corr.update(self.x[i : i + 10], self.y[i : i + 10])
+        self.assertEqual(corr.mxy.dtype, np.float64)
+        np.testing.assert_allclose(corr.c(), self.expected, atol=1e-5)
+
+    def test_auto_step_size(self):
+        corr = correlations.Corr((16, 50))
+        self.assertEqual(
+            corr.auto_step_size(2**16), (2**16 - 2 * 16 * 50 * 8) // (66 * 8)
+        )
+        self.assertEqual(corr.auto_step_size(2**16, max_traces=10), 10)
+        with self.assertRaises(ValueError):
+            corr.auto_step_size(16 * 50 * 16)
+
+        # Without an explicit budget, the cross products do not count against the default budget.
+        corr = correlations.Corr((4096, 5000))
+        self.assertEqual(
+            corr.auto_step_size(),
+            correlations.DEFAULT_MEM_BUDGET // ((4096 + 5000) * 8),
+        )
+        with self.assertRaises(ValueError):
+            corr.auto_step_size(correlations.DEFAULT_MEM_BUDGET)
+
+        corr = correlations.Corr((16, 50), dtype=np.float32)
+        self.assertEqual(
+            corr.auto_step_size(2**16), (2**16 - 16 * 50 * 12) // (66 * 4)
+        )
+
+    def test_peaks(self):
+        corr = correlations.Corr((16, 50))
+        corr.update(self.x, self.y)
+        peaks, sample_idx = corr.peaks()
+
+        for i in range(16):
+            row = self.expected[i]
+            self.assertEqual(sample_idx[i], np.argmax(np.abs(row)))
+            self.assertAlmostEqual(peaks[i], row[sample_idx[i]])
+        np.testing.assert_allclose(corr.max(axis=1), peaks)
+
+    def test_leaderboard(self):
+        corr = correlations.Corr((16, 50), top_k=3)
+        for i in range(0, 1000, 100):
+            corr.update(self.x[i : i + 100], self.y[i : i + 100])
+            self.assertEqual(len(corr.leaderboard), 3)
+
+        peaks, _ = correlations.abs_max_along(self.expected, axis=1)
+        best = np.argsort(-np.abs(peaks))[:3]
+        np.testing.assert_array_equal(corr.leaderboard.hypo_idx, best)
+        np.testing.assert_allclose(corr.leaderboard.peaks, peaks[best])
+        self.assertEqual(corr.leaderboard.hypo_idx[0], 0)
+
+        self.assertIs(corr.leaderboard, corr.leaderboard)
+        self.assertIsNone(correlations.Corr((16, 50)).leaderboard)
+
+    def test_leaderboard_on_demand(self):
+        corr = correlations.Corr((16, 50), top_k=3)
+        calls = []
+        get_leaderboard = corr.get_leaderboard
+        corr.get_leaderboard = lambda k: calls.append(k) or get_leaderboard(k)
+        for i in range(0, 1000, 100):
+            corr.update(self.x[i : i + 100], self.y[i : i + 100])
+        self.assertEqual(calls, [])
+        self.assertEqual(len(corr.leaderboard), 3)
+        self.assertEqual(calls, [3])
+
+    def test_select(self):
+        corr = correlations.Corr((16, 50))
+        corr.update(self.x[:400], self.y[:400])
+        rows = np.array([0, 5, 7])
+        corr.select(rows)
+        corr.update(self.x[400:, rows], self.y[400:])
+        np.testing.assert_allclose(corr.c(), self.expected[rows], atol=1e-12)
+
+        # The checkpoints would have a different number of hypotheses.
+        corr = correlations.Corr((16, 50), checkpoints=[100])
+        with self.assertRaises(ValueError):
+            corr.select(rows)
+
+    def test_merge_with_checkpoints(self):
+        other = correlations.Corr((16, 50))
+        other.update(self.x[:20], self.y[:20])
+        corr = correlations.Corr((16, 50), checkpoints=[10, 30])
+        with self.assertRaises(ValueError):
+            corr.merge(other)
+
+        # Checkpoints which are already behind are skipped instead of blocking the update.
+        corr._update(self.x[:20], self.y[:20])
+        corr.update(self.x[20:], self.y[20:])
+        self.assertEqual([c.n for c in corr.history], [30])
+        np.testing.assert_allclose(corr.c(), self.expected, atol=1e-12)
+
+    def test_checkpoints(self):
+        corr = correlations.Corr(
+            (16, 50), checkpoints=[500, 100, 1000], keep_corrs=True
+        )
+        for i in range(0, 1000, 300):
+            corr.update(self.x[i : i + 300], self.y[i : i + 300])
+
+        num_traces, peaks = corr.peaks_over_num_traces()
+        np.testing.assert_array_equal(num_traces, [100, 500, 1000])
+        for i, n in enumerate(num_traces):
+            expected = np.corrcoef(self.x[:n].T.astype(np.float64), self.y[:n].T)[
+                :16, 16:
+            ]
+            np.testing.assert_allclose(corr.history[i].corrs, expected, atol=1e-12)
+            np.testing.assert_allclose(
+                peaks[:, i], correlations.abs_max_along(expected)[0], atol=1e-12
+            )
+
+        ranks = correlations.get_ranks(peaks, 0)
+        self.assertEqual(ranks[-1], 0)
+        self.assertIn(
+            correlations.traces_to_disclosure(num_traces, peaks, 0), num_traces
+        )
+
+    def test_traces_to_disclosure(self):
+        peaks = np.array([[0.1, 0.5, 0.2, 0.6], [0.4, 0.1, 0.3, -0.2]])
+        num_traces = np.array([100, 200, 300, 400])
+        np.testing.assert_array_equal(correlations.get_ranks(peaks, 0), [1, 0, 1, 0])
+        self.assertEqual(correlations.traces_to_disclosure(num_traces, peaks, 0), 400)
+        self.assertIsNone(correlations.traces_to_disclosure(num_traces, peaks, 1))
+
+    def test_merge(self):
+        shards = [(0, 1), (1, 250), (250, 600), (600, 600), (600, 1000)]
+        corrs = []
+        for start, end in shards:
+            corr = correlations.Corr((16, 50))
+            corr.update(self.x[start:end], self.y[start:end])
+            corrs.append(corr)
+
+        unmerged = correlations.Corr((16, 50))
+        unmerged.update(self.x, self.y)
+
+        merged = correlations.merge_corrs(corrs)
+        self.assertEqual(merged.n, 1000)
+        np.testing.assert_allclose(merged.c(), unmerged.c(), rtol=0, atol=1e-12)
+        np.testing.assert_allclose(merged.c(), self.expected, atol=1e-12)
+
+    def test_calc_corrs_direct(self):
+        np.testing.assert_allclose(
+            correlations.calc_corrs_direct(self.x, self.y), self.expected, atol=1e-12
+        )
+
+    def test_state(self):
+        corr = correlations.Corr((16, 50), dtype=np.float32)
+        corr.update(self.x[:500], self.y[:500])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "corr.npz")
+            corr.save(path)
+            loaded = correlations.Corr.load(path)
+
+        self.assertEqual(loaded.dtype, np.float32)
+        other = correlations.Corr((16, 50), dtype=np.float32)
+        other.update(self.x[500:], self.y[500:])
+        loaded.merge(correlations.Corr.from_state(other.to_state()))
+        np.testing.assert_allclose(loaded.c(), self.expected, atol=1e-5)
+
+    def test_calc_peaks_second_order(self):
+        rng = np.random.default_rng(1)
+        x = rng.integers(0, 9, (2000, 4)).astype(np.uint8)
+        mask = rng.integers(0, 9, 2000)
+        y = rng.normal(0, 1, (2000, 12))
+        y[:, 2] += mask
+        y[:, 9] += x[:, 1] ^ mask
+
+        peaks, pairs = correlations.calc_peaks_second_order(x, y, mem_budget=2**12)
+
+        yc = y - y.mean(axis=0)
+        ii, jj = np.triu_indices(12, 1)
+        combined = yc[:, ii] * yc[:, jj]
+        expected = np.corrcoef(x.T.astype(np.float64), combined.T)[:4, 4:]
+        expected_peaks, idx = correlations.abs_max_along(expected, axis=1)
+
+        np.testing.assert_allclose(peaks, expected_peaks, atol=1e-12)
+        np.testing.assert_array_equal(pairs[:, 0], ii[idx])
+        np.testing.assert_array_equal(pairs[:, 1], jj[idx])
+        np.testing.assert_array_equal(pairs[1], [2, 9])
+
+    def test_calc_peaks_second_order_step_size(self):
+        rng = np.random.default_rng(2)
+        x = rng.integers(0, 33, (2000, 64)).astype(np.uint8)
+        y = rng.normal(0, 1, (2000, 120))
+
+        step_sizes = []
+        update = correlations.Corr.update
+
+        def record_update(corr, x_new, y_new):
+            step_sizes.append(x_new.shape[0])
+            update(corr, x_new, y_new)
+
+        with mock.patch.object(correlations.Corr, "update", record_update):
+            correlations.calc_peaks_second_order(x, y, mem_budget=2**21)
+
+        # The tiles must leave room for many traces per update.
+        self.assertGreater(max(step_sizes), 100)
@@ -0,0 +1,123 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import correlations
+import fused_cpa
+import helper
+import leakage_models
+import scoring
+import simon_64_128_simulation
+
+from measurement import Measurements
+
+
+class TestFusedCpa(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.plaintexts = rng.integers(0, 2**32, (700, 2), dtype=np.uint32)
+        self.power = rng.normal(0, 1, (700, 30))
+        self.keys = rng.integers(0, 2**32, (40, 4), dtype=np.uint32)
+        self.keys[:, :2] = self.keys[0, :2]
+
+    def test_score_keys_fused(self):
+        for attacked_state in ["ADD_ROUND_KEY", "AND_GATE", "HAMMING_DISTANCE"]:
+            for attacked_round in [0, 2]:
+                expected = scoring.score_keys(
+                    self.keys,
+                    self.plaintexts,
+                    self.power,
+                    attacked_round,
+                    0x00FF00FF,
+                    attacked_state,
+                )
+                for use_numba in [False, None]:
+                    peaks = fused_cpa.score_keys_fused(
+                        self.keys,
+                        self.plaintexts,
+                        self.power,
+                        attacked_round,
+                        0x00FF00FF,
+                        attacked_state,
+                        trace_tile=64,
+                        use_numba=use_numba,
+                    )
+                    np.testing.assert_allclose(peaks, expected, atol=1e-12)
+
+    def test_mem_budget(self):
+        expected = scoring.score_keys(
+            self.keys, self.plaintexts, self.power, 1, 0x00FF00FF
+        )
+        # 8 keys with 30 samples use 8 * 30 * 16 bytes, half of the budget.
+        with mock.patch.object(
+            correlations, "Corr", wraps=correlations.Corr
+        ) as corr_class:
+            peaks = scoring.score_keys(
+                self.keys,
+                self.plaintexts,
+                self.power,
+                1,
+                0x00FF00FF,
+                fused=True,
+                mem_budget=2 * 8 * 30 * 16,
+            )
+        np.testing.assert_allclose(peaks, expected, atol=1e-12)
+        self.assertEqual([c.args[0] for c in corr_class.call_args_list], [(8, 30)] * 5)
+
+        with self.assertRaises(ValueError):
+            fused_cpa.score_keys_fused(
+                self.keys, self.plaintexts, self.power, 1, 0x00FF00FF, mem_budget=100
+            )
+
+    def test_predict_hws_tile(self):
+        cache = simon_64_128_simulation.PrefixStateCache(self.plaintexts)
+        states, inverse = cache.get_unique_states(self.keys[:, 3:])
+        out = np.empty((700, 40), dtype=np.uint8)
+        fused_cpa.predict_hws_tile(
+            states, inverse, self.keys[:, 2], 0xFFFFFFFF, "F_OUTPUT", out, False
+        )
+        np.testing.assert_array_equal(
+            out,
+            simon_64_128_simulation.get_hws_for_guessed_keys(
+                self.plaintexts, self.keys, 1, 0xFFFFFFFF, "F_OUTPUT"
+            ),
+        )
+
+    def test_replaced_model(self):
+        cache = simon_64_128_simulation.PrefixStateCache(self.plaintexts)
+        states, inverse = cache.get_unique_states(self.keys[:, 3:])
+        built_in = leakage_models.get_model("AND_GATE")
+        leakage_models.register(
+            leakage_models.LeakageModel(
+                "AND_GATE",
+                predict=lambda new_x, x: leakage_models.rotate_left(new_x, 3),
+                get_mask=lambda key_mask: leakage_models.rotate_left(key_mask, 3),
+            )
+        )
+        try:
+            # The compiled kernel only knows the formula of the built-in model.
+            out = np.empty((700, 40), dtype=np.uint8)
+            fused_cpa.predict_hws_tile(
+                states, inverse, self.keys[:, 2], 0xFFFFFFFF, "AND_GATE", out
+            )
+            np.testing.assert_array_equal(
+                out,
+                simon_64_128_simulation.get_hws_for_guessed_keys(
+                    self.plaintexts, self.keys, 1, 0xFFFFFFFF, "AND_GATE"
+                ),
+            )
+        finally:
+            leakage_models.register(built_in)
+
+    def test_hypothesis_set(self):
+        measurements = Measurements(self.plaintexts, self.plaintexts, self.power)
+        hypos = helper.HypothesisSet(self.keys, np.zeros(4, dtype=np.uint32))
+        hypos.bit_mask[3] = 0xFFFF
+        hypos.score(measurements, 0, shard_size=16, fused=True)
+        expected = scoring.score_keys(self.keys, self.plaintexts, self.power, 0, 0xFFFF)
+        np.testing.assert_allclose(hypos.corrs, expected, atol=1e-12)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+
+import numpy as np
+
+import hamming
+
+
+class TestHamming(unittest.TestCase):
+
+    def test_hamming_weight(self):
+        x = np.array([0x00000000, 0x0000FFFF, 0xFFFFFFFF, 0x80000001], dtype=np.uint32)
+        hws = hamming.hamming_weight(x)
+        self.assertEqual(hws.dtype, np.uint8)
+        np.testing.assert_array_equal(hws, np.array([0, 16, 32, 2]))
+
+        x = np.array([0xFFFFFFFFFFFFFFFF, 0x0123456789ABCDEF], dtype=np.uint64)
+        np.testing.assert_array_equal(hamming.hamming_weight(x), np.array([64, 32]))
+
+        self.assertEqual(hamming.hamming_weight(np.uint32(0x0000A4F3)), 9)
+
+    def test_hamming_weight_random(self):
+        rng = np.random.default_rng(0)
+        x = rng.integers(0, 2**32, (100, 7), dtype=np.uint32)
+        expected = np.array([[int(e).bit_count() for e in row] for row in x])
+
+        out = np.zeros((100, 7), dtype=np.uint32)
+        res = hamming.hamming_weight(x, out=out)
+        self.assertIs(res, out)
+        np.testing.assert_array_equal(out, expected)
+
+        np.testing.assert_array_equal(
+            hamming.hamming_weight(x, dtype=np.float64), expected
+        )
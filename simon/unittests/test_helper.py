@@ -1,10 +1,13 @@
 import unittest
 import numpy as np
 import helper
+import simon_64_128_simulation
+import simulator
 
+from measurement import Measurements
 
-class TestHelper(unittest.TestCase):
 
+class TestHelper(unittest.TestCase):
     def test_key_hypothesis_iter(self):
         h1 = helper.KeyHypothesis(
             np.array([0x00000000, 0x00000000, 0x00000000, 0x00001234], dtype=np.uint32),
@@ -82,3 +85,129 @@ class TestHelper(unittest.TestCase):
         self.assertEqual(helper.filter_hypos([h1, h3], threshold=0.3), [h1, h3])
         self.assertEqual(helper.filter_hypos([h1, h3, h4], threshold=0.1), [h3, h4])
         self.assertEqual(helper.filter_hypos([h1, h5], threshold=0.4), [h1, h5])
+
+    def test_calc_corrs_for_hypos_parallel(self):
+        rng = np.random.default_rng(0)
+        key = np.array([0, 0, 0, 0x0000002A], dtype=np.uint32)
+        plaintexts = rng.integers(0, 2**32, (500, 2), dtype=np.uint32)
+        hws = simon_64_128_simulation.get_hws_for_guessed_keys(
+            plaintexts, key, 0, np.uint32(0x3F)
+        )
+        power = hws + rng.normal(0, 1, (500, 20))
+        measurements = Measurements(plaintexts, plaintexts, power)
+
+        start_hypo = helper.KeyHypothesis(
+            np.zeros(4, dtype=np.uint32), np.zeros(4, dtype=np.uint32)
+        )
+        new_mask = np.array([0, 0, 0, 0x3F], dtype=np.uint32)
+        serial_hypos = start_hypo.get_sub_hypos(new_mask)
+        parallel_hypos = start_hypo.get_sub_hypos(new_mask)
+
+        helper.calc_corrs_for_hypos(serial_hypos, measurements, 0, shard_size=10)
+        helper.calc_corrs_for_hypos(
+            parallel_hypos, measurements, 0, num_workers=2, shard_size=10
+        )
+
+        self.assertEqual(
+            [h.corr for h in serial_hypos], [h.corr for h in parallel_hypos]
+        )
+        best = max(serial_hypos, key=lambda h: h.corr)
+        np.testing.assert_array_equal(best.key, key)
+
+    def test_hypothesis_set(self):
+        h = helper.KeyHypothesis(
+            np.array([0x00000000, 0x00000000, 0x12345678, 0x12345678], dtype=np.uint32),
+            np.array([0x00000000, 0x00000000, 0xFFFFFFFF, 0xFFFFFFFF], dtype=np.uint32),
+        )
+        new_mask = np.array(
+            [0x00000000, 0x00001111, 0xFFFFFFFF, 0xFFFFFFFF], dtype=np.uint32
+        )
+        hypos = helper.HypothesisSet.from_hypos([h, h]).expand(new_mask)
+        self.assertEqual(len(hypos), 32)
+        np.testing.assert_array_equal(hypos.bit_mask, new_mask)
+
+        expected_keys = np.array([s.key for s in h.get_sub_hypos(new_mask)] * 2)
+        np.testing.assert_array_equal(hypos.keys, expected_keys)
+
+        hypos.corrs[:] = 0.3
+        hypos.corrs[3] = -0.5
+        hypos.corrs[20] = 0.45
+        remaining = hypos.filter(threshold=0.1)
+        self.assertEqual(len(remaining), 2)
+        np.testing.assert_array_equal(remaining.keys, expected_keys[[3, 20]])
+        np.testing.assert_array_equal(remaining.corrs, [-0.5, 0.45])
+        self.assertEqual(remaining.to_hypos()[0].corr, -0.5)
+
+    def test_score_sequential(self):
+        key = np.array(
+            [0x1B1A1918, 0x13121110, 0x0B0A0908, 0x03020100], dtype=np.uint32
+        )
+        measurements = simulator.TraceSimulator(key, noise_std=2.0, seed=0).generate(
+            4000
+        )
+        parents = helper.HypothesisSet(
+            np.zeros(4, dtype=np.uint32), np.zeros(4, dtype=np.uint32)
+        )
+        new_mask = np.array([0, 0, 0, 0xFF], dtype=np.uint32)
+
+        hypos = parents.expand(new_mask)
+        used_traces = hypos.score_sequential(measurements, 0, first_batch=100)
+        full = parents.expand(new_mask)
+        full.score(measurements, 0)
+
+        best = np.nanargmax(np.abs(hypos.corrs))
+        self.assertEqual(hypos.keys[best, 3], key[3] & 0xFF)
+        self.assertAlmostEqual(hypos.corrs[best], full.corrs[best])
+        self.assertEqual(used_traces[best], 4000)
+        # Most wrong keys are dropped early.
+        self.assertLess(used_traces.sum(), 0.25 * 4000 * len(hypos))
+        np.testing.assert_array_equal(np.isnan(hypos.corrs), used_traces < 4000)
+
+        # The dropped hypotheses are never part of the beam.
+        survivors = hypos.best(len(hypos))
+        self.assertEqual(len(survivors), np.sum(used_traces == 4000))
+        self.assertEqual(len(hypos.filter(1.0)), len(survivors))
+
+        # A small budget splits each batch into chunks of about 30 traces.
+        chunked = parents.expand(new_mask)
+        chunked_traces = chunked.score_sequential(
+            measurements, 0, first_batch=100, mem_budget=2**18
+        )
+        np.testing.assert_allclose(chunked.corrs, hypos.corrs, atol=1e-12)
+        np.testing.assert_array_equal(chunked_traces, used_traces)
+
+    def test_expand_and_score_fast(self):
+        rng = np.random.default_rng(1)
+        plaintexts = rng.integers(0, 2**32, (400, 2), dtype=np.uint32)
+        power = rng.normal(0, 1, (400, 10))
+        measurements = Measurements(plaintexts, plaintexts, power)
+
+        parents = helper.HypothesisSet(
+            np.array(
+                [[0, 0x5, 0x00000078, 0x12345678], [0, 0xA, 0x000000F0, 0x9ABCDEF0]],
+                dtype=np.uint32,
+            ),
+            np.array([0, 0x0000000F, 0xFFFFFFFF, 0xFFFFFFFF], dtype=np.uint32),
+        )
+        new_mask = np.array([0, 0x000007FF, 0xFFFFFFFF, 0xFFFFFFFF], dtype=np.uint32)
+
+        fast = helper.expand_and_score_fast(parents, new_mask, measurements, 2)
+        chunked = helper.expand_and_score_fast(
+            parents, new_mask, measurements, 2, mem_budget=2**14
+        )
+        slow = parents.expand(new_mask)
+        slow.score(measurements, 2)
+
+        np.testing.assert_array_equal(fast.keys, slow.keys)
+        np.testing.assert_allclose(fast.corrs, slow.corrs, atol=1e-12)
+        np.testing.assert_allclose(chunked.corrs, slow.corrs, atol=1e-12)
+
+        with self.assertRaises(ValueError):
+            helper.expand_and_score_fast(
+                parents, np.array([1, 0, 0, 0], dtype=np.uint32), measurements, 2
+            )
+
+        # The parents must not have values for the newly guessed bits.
+        parents.keys[0, 1] |= 0x10
+        with self.assertRaises(ValueError):
+            helper.expand_and_score_fast(parents, new_mask, measurements, 2)
@@ -0,0 +1,69 @@
+import unittest
+
+import numpy as np
+
+import leakage
+
+from measurement import Measurements
+
+
+class TestLeakage(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.power = rng.integers(0, 1024, (3000, 20)).astype(np.int16)
+        self.power[1::2, 5] += 100
+
+    def test_central_moments(self):
+        moments = leakage.CentralMoments(20, max_order=6)
+        for i in range(0, 3000, 700):
+            moments.update(self.power[i : i + 700])
+
+        x = self.power.astype(np.float64)
+        np.testing.assert_allclose(moments.mean, x.mean(axis=0))
+        for p in range(2, 7):
+            expected = ((x - x.mean(axis=0)) ** p).mean(axis=0)
+            np.testing.assert_allclose(moments.central_moment(p), expected, rtol=1e-9)
+
+    def test_merge(self):
+        a = leakage.CentralMoments(20)
+        b = leakage.CentralMoments(20)
+        full = leakage.CentralMoments(20)
+        a.update(self.power[:1000])
+        b.update(self.power[1000:])
+        full.update(self.power)
+
+        a.merge(leakage.CentralMoments.from_state(b.to_state()))
+        self.assertEqual(a.n, 3000)
+        np.testing.assert_allclose(a.m[2:], full.m[2:], rtol=1e-9)
+
+    def test_tvla(self):
+        measurements = Measurements(
+            np.zeros((3000, 2), dtype=np.uint32),
+            np.zeros((3000, 2), dtype=np.uint32),
+            self.power,
+        )
+        tvla = leakage.tvla_from_measurements(measurements, chunk_size=333)
+
+        x0 = self.power[0::2].astype(np.float64)
+        x1 = self.power[1::2].astype(np.float64)
+        expected = (x0.mean(axis=0) - x1.mean(axis=0)) / np.sqrt(
+            x0.var(axis=0) / len(x0) + x1.var(axis=0) / len(x1)
+        )
+        np.testing.assert_allclose(tvla.t_statistic(1), expected)
+
+        c0 = (x0 - x0.mean(axis=0)) ** 2
+        c1 = (x1 - x1.mean(axis=0)) ** 2
+        expected = (c0.mean(axis=0) - c1.mean(axis=0)) / np.sqrt(
+            c0.var(axis=0) / len(c0) + c1.var(axis=0) / len(c1)
+        )
+        np.testing.assert_allclose(tvla.t_statistic(2), expected)
+
+        s0 = ((x0 - x0.mean(axis=0)) / x0.std(axis=0)) ** 3
+        s1 = ((x1 - x1.mean(axis=0)) / x1.std(axis=0)) ** 3
+        expected = (s0.mean(axis=0) - s1.mean(axis=0)) / np.sqrt(
+            s0.var(axis=0) / len(s0) + s1.var(axis=0) / len(s1)
+        )
+        np.testing.assert_allclose(tvla.t_statistic(3), expected, rtol=1e-9)
+
+        self.assertEqual(np.argmax(np.abs(tvla.t_statistic(1))), 5)
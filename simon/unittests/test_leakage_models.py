@@ -0,0 +1,113 @@
+import unittest
+
+import numpy as np
+
+import attack
+import helper
+import leakage_models
+import simon_64_128
+import simon_64_128_simulation
+import simulator
+
+from hamming import hamming_weight
+from measurement import Measurements
+
+
+class TestLeakageModels(unittest.TestCase):
+    def setUp(self):
+        self.key = np.array(
+            [0x1B1A1918, 0x13121110, 0x0B0A0908, 0x03020100], dtype=np.uint32
+        )
+
+    def test_get_model(self):
+        self.assertEqual(leakage_models.get_model("AND_GATE").name, "AND_GATE")
+        with self.assertRaises(ValueError):
+            leakage_models.get_model("INVALID")
+        with self.assertRaises(ValueError):
+            simon_64_128_simulation.get_inter_states(
+                np.zeros(2, dtype=np.uint32), self.key, 0, "INVALID"
+            )
+
+    def test_predictions(self):
+        rng = np.random.default_rng(0)
+        plaintexts = rng.integers(0, 2**32, (50, 2), dtype=np.uint32)
+        keys = rng.integers(0, 2**32, (7, 4), dtype=np.uint32)
+        keys[:, :2] = keys[0, :2]
+        cache = simon_64_128_simulation.PrefixStateCache(plaintexts)
+
+        for attacked_round in range(4):
+            x = np.repeat(plaintexts[:, 0:1], 7, axis=1)
+            y = np.repeat(plaintexts[:, 1:2], 7, axis=1)
+            for r in range(attacked_round):
+                x, y = simon_64_128_simulation.perform_round(x, y, keys[:, 3 - r])
+            new_x, _ = simon_64_128_simulation.perform_round(
+                x, y, keys[:, 3 - attacked_round]
+            )
+
+            expected = {
+                "ADD_ROUND_KEY": new_x,
+                "AND_GATE": leakage_models._and_gate(new_x),
+                "F_OUTPUT": simon_64_128_simulation.f(new_x),
+                "HAMMING_DISTANCE": new_x ^ x,
+            }
+            for name, states in expected.items():
+                for c in [None, cache]:
+                    np.testing.assert_array_equal(
+                        simon_64_128_simulation.get_inter_states(
+                            plaintexts, keys, attacked_round, name, c
+                        ),
+                        states,
+                    )
+
+    def test_register(self):
+        leakage_models.register(
+            leakage_models.LeakageModel(
+                "ROTATE_2",
+                predict=lambda new_x, x: leakage_models.rotate_left(new_x, 2),
+                get_mask=lambda key_mask: leakage_models.rotate_left(key_mask, 2),
+            )
+        )
+        try:
+            mask = np.array([0, 0, 0, 0x80000001], dtype=np.uint32)
+            self.assertEqual(helper.get_intermediate_mask(mask, 0, "ROTATE_2"), 0x6)
+        finally:
+            del leakage_models.LEAKAGE_MODELS["ROTATE_2"]
+
+    def test_attack_hamming_distance(self):
+        measurements = simulator.TraceSimulator(
+            self.key, leakage="HD", noise_std=1.0, seed=0
+        ).generate(1000)
+        result = attack.run_attack(measurements, "HAMMING_DISTANCE", beam_width=4)
+        np.testing.assert_array_equal(result.key, self.key)
+
+    def test_step_masks(self):
+        for attacked_state in leakage_models.LEAKAGE_MODELS:
+            for guessed_bits_per_step in [6, 8]:
+                masks = attack.get_step_masks(attacked_state, guessed_bits_per_step)
+                self.assertEqual(masks[-1], 0xFFFFFFFF)
+                model = leakage_models.get_model(attacked_state)
+                for mask in masks:
+                    self.assertNotEqual(model.get_mask(mask), 0)
+
+        # One guessed bit of the f output never predicts an output bit.
+        with self.assertRaises(ValueError):
+            attack.get_step_masks("F_OUTPUT", 1)
+        mask = np.array([0, 0, 0, 0x80], dtype=np.uint32)
+        with self.assertRaises(ValueError):
+            helper.get_intermediate_mask(mask, 0, "F_OUTPUT")
+
+    def test_attack_f_output(self):
+        rng = np.random.default_rng(0)
+        plaintexts = rng.integers(0, 2**32, (1000, 2), dtype=np.uint32)
+        ciphertexts, log = simon_64_128.encrypt_blocks(plaintexts, self.key)
+        power = hamming_weight(
+            simon_64_128_simulation.f(log.states[:, :, 0]), dtype=np.float32
+        ) + rng.normal(0, 1, (1000, 45)).astype(np.float32)
+        measurements = Measurements(plaintexts, ciphertexts, power)
+
+        result = attack.run_attack(measurements, "F_OUTPUT", beam_width=8)
+        np.testing.assert_array_equal(result.key, self.key)
+
+
+if __name__ == "__main__":
+    unittest.main()
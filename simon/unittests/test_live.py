@@ -0,0 +1,164 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import numpy as np
+
+import live
+import simon_64_128
+
+from measurement import Measurements
+
+
+class TestLive(unittest.TestCase):
+    def setUp(self):
+        self.key = bytearray(
+            [0x1B, 0x1A, 0x19, 0x18, 0x13, 0x12, 0x11, 0x10]
+            + [0x0B, 0x0A, 0x09, 0x08, 0x03, 0x02, 0x01, 0x00]
+        )
+        self.key_words = np.array(
+            [0x1B1A1918, 0x13121110, 0x0B0A0908, 0x03020100], dtype=np.uint32
+        )
+
+    def test_simulated_target(self):
+        target = live.SimulatedTarget(noise_std=0.0, seed=0)
+        target.simpleserial_write("k", self.key)
+        self.assertTrue(target.simpleserial_wait_ack())
+
+        target.simpleserial_write(
+            "p", bytearray([0x65, 0x6B, 0x69, 0x6C, 0x20, 0x64, 0x6E, 0x75])
+        )
+        ct = target.simpleserial_read("r", 8)
+        self.assertEqual(ct.hex(), "44c8fc20b9dfa07a")
+        self.assertEqual(target.last_power.shape, (45,))
+
+        batch = target.capture_batch(5)
+        self.assertEqual(batch.power.shape, (5, 45))
+        for i in range(5):
+            ct, _ = simon_64_128.encrypt_block(batch.plaintext[i], self.key_words)
+            np.testing.assert_array_equal(batch.ciphertext[i], ct)
+
+        with self.assertRaises(ValueError):
+            target.simpleserial_write("x", bytearray())
+
+        stop = threading.Event()
+        stop.set()
+        self.assertEqual(len(target.capture_batch(5, stop)), 0)
+
+    def test_run_live_attack(self):
+        target = live.SimulatedTarget(noise_std=1.0, seed=0)
+        target.simpleserial_write("k", self.key)
+
+        live_attack = asyncio.run(
+            live.run_live_attack(
+                target.capture_batch,
+                live.LiveAttack(beam_width=4, patience=2),
+                batch_size=50,
+                max_traces=20000,
+            )
+        )
+        self.assertTrue(live_attack.done)
+        np.testing.assert_array_equal(live_attack.key, self.key_words)
+        # The capture stopped long before the maximum number of traces.
+        self.assertLess(live_attack.num_traces, 10000)
+        self.assertEqual(live_attack.history[-1][1], 23)
+
+    def test_store(self):
+        target = live.SimulatedTarget(noise_std=1.0, seed=0)
+        target.simpleserial_write("k", self.key)
+
+        with tempfile.TemporaryDirectory() as store_dir:
+            live_attack = live.LiveAttack(
+                beam_width=4, patience=2, store_dir=store_dir, max_traces=1000
+            )
+            batches = [target.capture_batch(50) for _ in range(6)]
+            for batch in batches:
+                live_attack.update(batch)
+            # The children of the new steps were scored on the traces of the store.
+            self.assertGreater(live_attack.step_idx, 0)
+            live_attack.close()
+
+            measurements = Measurements.open(store_dir)
+            self.assertEqual(len(measurements), 300)
+            np.testing.assert_array_equal(
+                measurements.power, np.concatenate([b.power for b in batches])
+            )
+            del measurements
+
+        # Without a store directory, the temporary store is deleted.
+        live_attack = live.LiveAttack(beam_width=4)
+        live_attack.update(target.capture_batch(10))
+        temp_dir = live_attack.store_dir
+        self.assertTrue(os.path.exists(temp_dir))
+        live_attack.close()
+        self.assertFalse(os.path.exists(temp_dir))
+
+    def test_failed_capture(self):
+        target = live.SimulatedTarget(noise_std=1.0, seed=0)
+        target.simpleserial_write("k", self.key)
+        calls = []
+
+        def capture_batch(num_traces, stop):
+            calls.append(num_traces)
+            if len(calls) == 3:
+                raise ConnectionError("Serial timeout")
+            return target.capture_batch(num_traces, stop)
+
+        live_attack = live.LiveAttack(beam_width=4)
+        start = time.monotonic()
+        with self.assertRaises(ConnectionError):
+            # The timeout only ends the test if the attack waits forever for the next batch.
+            asyncio.run(
+                asyncio.wait_for(
+                    live.run_live_attack(capture_batch, live_attack, batch_size=50),
+                    timeout=20,
+                )
+            )
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertEqual(live_attack.num_traces, 100)
+
+    def test_small_batches(self):
+        target = live.SimulatedTarget(noise_std=1.0, seed=0)
+        target.simpleserial_write("k", self.key)
+        live_attack = live.LiveAttack(beam_width=4)
+        # The correlations of a single trace are 0 / 0.
+        with np.errstate(invalid="ignore"):
+            for _ in range(5):
+                self.assertFalse(live_attack.update(target.capture_batch(1)))
+        # The first trace gives no finite peak, the later ones do.
+        self.assertEqual(live_attack.num_traces, 5)
+        self.assertEqual(len(live_attack.history), 4)
+        live_attack.close()
+
+    def test_same_keys(self):
+        keys = np.array([[1, 2], [3, 4]], dtype=np.uint32)
+        self.assertTrue(live._same_keys(keys, keys[::-1]))
+        self.assertFalse(
+            live._same_keys(keys, np.array([[1, 4], [3, 2]], dtype=np.uint32))
+        )
+        self.assertFalse(live._same_keys(keys, keys[:1]))
+
+    def test_stop_capture(self):
+        target = live.SimulatedTarget(noise_std=1.0, seed=0)
+        target.simpleserial_write("k", self.key)
+        stopped = []
+
+        def capture_batch(num_traces, stop):
+            if len(stopped) == 0:
+                stopped.append(False)
+                return target.capture_batch(num_traces, stop)
+            # A long capture which only returns when the attack stops it.
+            stopped.append(stop.wait(10))
+            return target.capture_batch(num_traces, stop)
+
+        live_attack = live.LiveAttack(beam_width=4)
+        live_attack.update = lambda batch: True
+        asyncio.run(live.run_live_attack(capture_batch, live_attack, batch_size=50))
+        self.assertEqual(stopped, [False, True])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+
+import numpy as np
+
+import measurement
+import scoring
+
+from measurement import Measurements
+
+
+class TestMeasurement(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.plaintexts = rng.integers(0, 2**32, (500, 2), dtype=np.uint32)
+        self.powers = rng.integers(0, 1024, (500, 40), dtype=np.uint32)
+
+    def test_get_compact_dtype(self):
+        self.assertEqual(measurement.get_compact_dtype(self.powers), np.int16)
+        self.assertEqual(measurement.get_compact_dtype(self.powers // 4), np.uint8)
+        self.assertEqual(
+            measurement.get_compact_dtype(self.powers.astype(np.int64) - 600), np.int16
+        )
+        with self.assertRaises(ValueError):
+            measurement.get_compact_dtype(self.powers.astype(np.float32))
+
+    def test_compact(self):
+        measurements = Measurements(self.plaintexts, self.plaintexts, self.powers)
+        compact = measurements.compact(chunk_size=64)
+        self.assertEqual(compact.power.dtype, np.int16)
+        np.testing.assert_array_equal(compact.power, self.powers)
+
+        with self.assertRaises(ValueError):
+            measurements.compact(np.int8)
+        with self.assertRaises(ValueError):
+            measurement.check_power_range(np.array([[0.5]]), np.int16)
+
+        # The CPA gives the same result for compact traces.
+        keys = np.arange(16, dtype=np.uint32).reshape((4, 4))
+        expected = scoring.score_keys(keys, self.plaintexts, self.powers, 0, 0xFF)
+        np.testing.assert_allclose(
+            scoring.score_keys(keys, self.plaintexts, compact.power, 0, 0xFF),
+            expected,
+            atol=1e-12,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
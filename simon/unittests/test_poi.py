@@ -0,0 +1,60 @@
+import unittest
+
+import numpy as np
+
+import poi
+
+from measurement import Measurements
+
+
+class TestPoi(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.labels = rng.integers(0, 33, 2000)
+        self.power = rng.normal(100, 2, (2000, 60))
+        self.power[:, 17] += self.labels
+        self.power[:, 40] += 0.5 * self.labels
+
+    def test_snr(self):
+        selector = poi.PoiSelector(60)
+        for i in range(0, 2000, 300):
+            selector.update(self.power[i : i + 300], self.labels[i : i + 300])
+
+        np.testing.assert_array_equal(selector.select(2, "snr"), [17, 40])
+        np.testing.assert_allclose(selector.variance(), self.power.var(axis=0))
+
+        means = np.array([self.power[self.labels == c].mean(axis=0) for c in range(33)])
+        np.testing.assert_allclose(selector.class_means() + selector.shift, means)
+
+    def test_t_statistic(self):
+        labels = (self.labels > 16).astype(np.int64)
+        selector = poi.PoiSelector(60, num_classes=2)
+        selector.update(self.power, labels)
+
+        p0 = self.power[labels == 0]
+        p1 = self.power[labels == 1]
+        expected = (p0.mean(axis=0) - p1.mean(axis=0)) / np.sqrt(
+            p0.var(axis=0, ddof=1) / len(p0) + p1.var(axis=0, ddof=1) / len(p1)
+        )
+        np.testing.assert_allclose(selector.t_statistic(), expected)
+
+    def test_select_pois(self):
+        scores = np.array([0.1, 0.9, 0.8, 0.2, 0.7])
+        np.testing.assert_array_equal(poi.select_pois(scores, 2), [1, 2])
+        np.testing.assert_array_equal(
+            poi.select_pois(scores, 2, min_distance=1), [1, 4]
+        )
+        self.assertEqual(poi.select_windows(scores, 1, 3), [slice(0, 3)])
+
+    def test_take_samples(self):
+        measurements = Measurements(
+            np.zeros((2000, 2), dtype=np.uint32),
+            np.zeros((2000, 2), dtype=np.uint32),
+            self.power,
+        )
+        reduced = measurements.take_samples(np.array([17, 40]), chunk_size=300)
+        np.testing.assert_array_equal(reduced.power, self.power[:, [17, 40]])
+
+        reduced = measurements.take_samples([slice(10, 12), slice(40, 41)])
+        np.testing.assert_array_equal(reduced.power, self.power[:, [10, 11, 40]])
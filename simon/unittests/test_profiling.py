@@ -0,0 +1,61 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import attack
+import correlations
+import profiling
+import simulator
+
+
+class TestProfiling(unittest.TestCase):
+    def test_profiled(self):
+        rng = np.random.default_rng(0)
+        x = rng.integers(0, 33, (100, 4), dtype=np.uint8)
+        y = rng.normal(0, 1, (100, 10))
+
+        # Without an active profiler, nothing is recorded.
+        correlations.calc_corrs(x, y)
+
+        with profiling.Profiler() as profiler:
+            correlations.calc_corrs(x, y, step_size=30)
+
+        totals = profiler.totals()
+        self.assertEqual(totals["correlations.calc_corrs"].calls, 1)
+        self.assertEqual(totals["correlations.calc_corrs"].bytes, 4 * 10 * 8)
+        self.assertEqual(totals["correlations.Corr.update"].calls, 4)
+        self.assertIsNone(profiling._active)
+
+    def test_attack_report(self):
+        key = np.array(
+            [0x1B1A1918, 0x13121110, 0x0B0A0908, 0x03020100], dtype=np.uint32
+        )
+        measurements = simulator.TraceSimulator(key, noise_std=1.0, seed=0).generate(
+            500
+        )
+        with profiling.Profiler() as profiler:
+            attack.run_attack(measurements, beam_width=2, guessed_bits_per_step=8)
+
+        rows = profiler.report()
+        steps = {(r["round"], r["step"]) for r in rows if r["round"] is not None}
+        self.assertEqual(len(steps), 16)
+
+        first = [r for r in rows if r["round"] == 0 and r["step"] == 0]
+        self.assertTrue(all(r["num_hypos"] == 256 for r in first))
+        functions = {r["function"] for r in first}
+        self.assertIn("simon_64_128_simulation.get_inter_states", functions)
+        self.assertIn("hamming.hamming_weight", functions)
+        self.assertIn("correlations.calc_corrs", functions)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "profile.json")
+            profiler.save(path)
+            with open(path) as f:
+                self.assertEqual(json.load(f), rows)
+
+
+if __name__ == "__main__":
+    unittest.main()
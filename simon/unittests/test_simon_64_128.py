@@ -26,3 +26,75 @@ class TestSimon_64_128(unittest.TestCase):
         self.assertEqual(
             simon_64_128.get_round_constant(2), 0
         )
+
+    def test_encrypt_decrypt_many(self):
+        keys = np.array(
+            [
+                [0x1B1A1918, 0x13121110, 0x0B0A0908, 0x03020100],
+                [0x00000000, 0x00000000, 0x00000000, 0x00000000],
+            ],
+            dtype=np.uint32,
+        )
+        plaintexts = np.array(
+            [[0x656B696C, 0x20646E75], [0x12345678, 0x9ABCDEF0]], dtype=np.uint32
+        )
+
+        states = np.zeros((simon_64_128.T + 1, 2, 2, 2), dtype=np.uint32)
+        ciphertexts = simon_64_128.encrypt_many(plaintexts, keys, states)
+        self.assertEqual(ciphertexts.shape, (2, 2, 2))
+        np.testing.assert_array_equal(
+            ciphertexts[0, 0], np.array([0x44C8FC20, 0xB9DFA07A], dtype=np.uint32)
+        )
+
+        for i in range(2):
+            for k in range(2):
+                expected, _ = simon_64_128.encrypt_block(plaintexts[i], keys[k])
+                np.testing.assert_array_equal(ciphertexts[i, k], expected)
+                np.testing.assert_array_equal(states[-1, i, k], expected)
+        np.testing.assert_array_equal(states[0, :, 0], plaintexts)
+        self.assertEqual(states[1, 0, 0, 0], 0xFC8B8A84)
+
+        decrypted = simon_64_128.decrypt_many(ciphertexts[:, 1], keys[1])
+        np.testing.assert_array_equal(decrypted[:, 0], plaintexts)
+
+        np.testing.assert_array_equal(
+            simon_64_128.expand_keys(keys)[0], simon_64_128.expand_key(keys[0])
+        )
+        np.testing.assert_array_equal(
+            simon_64_128.check_keys(keys, plaintexts, ciphertexts[:, 0]), [True, False]
+        )
+
+    def test_encrypt_blocks(self):
+        key = np.array(
+            [0x1B1A1918, 0x13121110, 0x0B0A0908, 0x03020100], dtype=np.uint32
+        )
+        plaintexts = np.array(
+            [[0x656B696C, 0x20646E75], [0x656B696C, 0x20646E74]], dtype=np.uint32
+        )
+
+        ciphertexts, state_log = simon_64_128.encrypt_blocks(plaintexts, key)
+        ciphertext1, log1 = simon_64_128.encrypt_block(plaintexts[0], key)
+        ciphertext2, log2 = simon_64_128.encrypt_block(plaintexts[1], key)
+
+        np.testing.assert_array_equal(ciphertexts, [ciphertext1, ciphertext2])
+        self.assertEqual(state_log.to_str(0), log1.to_str())
+        self.assertEqual(state_log.to_str(1), log2.to_str())
+
+        xor_log = state_log.xor(state_log)
+        self.assertEqual(xor_log.states[1, 0, 1], 0)
+
+        _, and_log = simon_64_128.encrypt_blocks(plaintexts, key, record_and_gate=True)
+        np.testing.assert_array_equal(and_log.states, state_log.states)
+        self.assertIn("AND1", and_log.to_str(0))
+
+        # Both batch encryptions share the round loop and record the same states.
+        states = np.zeros((45, 2, 1, 2), dtype=np.uint32)
+        simon_64_128.encrypt_many(plaintexts, key, states)
+        np.testing.assert_array_equal(
+            np.moveaxis(states[:, :, 0], 1, 0), state_log.states
+        )
+        x = state_log.states[:, :-1, 0]
+        np.testing.assert_array_equal(
+            and_log.and_gate,
+            simon_64_128.rotate_left(x, 1) & simon_64_128.rotate_left(x, 8),
+        )
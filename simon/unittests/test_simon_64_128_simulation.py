@@ -2,6 +2,7 @@ import unittest
 
 import numpy as np
 
+import simon_64_128
 import simon_64_128_simulation
 
 
@@ -57,3 +58,78 @@ class TestSimon_64_128_Simulation(unittest.TestCase):
 
         self.assertEqual(hws.shape, (2, 2))
         self.assertEqual(hws[0, 0], 2)
+
+    def test_prefix_state_cache(self):
+        rng = np.random.default_rng(0)
+        plaintexts = rng.integers(0, 2**32, (50, 2), dtype=np.uint32)
+        keys = rng.integers(0, 2**32, (8, 4), dtype=np.uint32)
+        # Two distinct prefixes for the key words of round 0 and 1.
+        keys[:4, 2:] = keys[0, 2:]
+        keys[4:, 2:] = keys[4, 2:]
+
+        cache = simon_64_128_simulation.PrefixStateCache(plaintexts)
+        for attacked_round in range(4):
+            for attacked_state in ["ADD_ROUND_KEY", "AND_GATE"]:
+                expected = simon_64_128_simulation.get_inter_states(
+                    plaintexts, keys, attacked_round, attacked_state
+                )
+                cached = simon_64_128_simulation.get_inter_states(
+                    plaintexts, keys, attacked_round, attacked_state, cache
+                )
+                np.testing.assert_array_equal(cached, expected)
+
+        self.assertIn(keys[0, 2:][::-1].tobytes(), cache.states)
+
+        # A cache for other plaintexts of the same shape must not be reused.
+        other_plaintexts = plaintexts.copy()
+        other_plaintexts[10, 0] ^= 1
+        with self.assertRaises(ValueError):
+            simon_64_128_simulation.get_inter_states(
+                other_plaintexts, keys, 1, "ADD_ROUND_KEY", cache
+            )
+        cached = simon_64_128_simulation.get_inter_states(
+            plaintexts.copy(), keys, 1, "ADD_ROUND_KEY", cache
+        )
+        np.testing.assert_array_equal(
+            cached,
+            simon_64_128_simulation.get_inter_states(plaintexts, keys, 1),
+        )
+
+    def test_prefix_state_cache_bytes(self):
+        rng = np.random.default_rng(0)
+        plaintexts = rng.integers(0, 2**32, (50, 2), dtype=np.uint32)
+        keys = rng.integers(0, 2**32, (8, 4), dtype=np.uint32)
+
+        # Each prefix stores 3 x 50 uint32 = 600 bytes, so at most 5 prefixes fit.
+        cache = simon_64_128_simulation.PrefixStateCache(plaintexts, max_bytes=3000)
+        for i in range(8):
+            simon_64_128_simulation.get_inter_states(
+                plaintexts, keys[i : i + 1], 1, "ADD_ROUND_KEY", cache
+            )
+            self.assertLessEqual(cache.nbytes(), 3000)
+        self.assertGreater(cache.nbytes(), 0)
+
+        # More new prefixes than fit into the cache are not stored.
+        cache.clear()
+        simon_64_128_simulation.get_inter_states(
+            plaintexts, keys, 1, "ADD_ROUND_KEY", cache
+        )
+        self.assertEqual(cache.nbytes(), 0)
+
+    def test_log_to_simulated_power(self):
+        key = np.array(
+            [0x1B1A1918, 0x13121110, 0x0B0A0908, 0x03020100], dtype=np.uint32
+        )
+        plaintexts = np.array(
+            [[0x656B696C, 0x20646E75], [0x00000000, 0x00000000]], dtype=np.uint32
+        )
+
+        _, state_log = simon_64_128.encrypt_blocks(plaintexts, key)
+        powers = simon_64_128_simulation.log_to_simulated_power(state_log)
+        self.assertEqual(powers.shape, (2, 45))
+
+        for i in range(2):
+            _, log = simon_64_128.encrypt_block(plaintexts[i], key)
+            np.testing.assert_array_equal(
+                powers[i], simon_64_128_simulation.log_to_simulated_power(log)
+            )
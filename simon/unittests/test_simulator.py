@@ -0,0 +1,59 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+import simon_64_128
+import simon_64_128_simulation
+import simulator
+
+from measurement import Measurements
+
+
+class TestSimulator(unittest.TestCase):
+    def setUp(self):
+        self.key = np.array(
+            [0x1B1A1918, 0x13121110, 0x0B0A0908, 0x03020100], dtype=np.uint32
+        )
+
+    def test_generate(self):
+        sim = simulator.TraceSimulator(self.key, seed=1)
+        measurements = sim.generate(10)
+        self.assertEqual(measurements.power.shape, (10, 45))
+
+        for i in range(10):
+            ct, log = simon_64_128.encrypt_block(measurements.plaintext[i], self.key)
+            np.testing.assert_array_equal(measurements.ciphertext[i], ct)
+            np.testing.assert_array_equal(
+                measurements.power[i],
+                simon_64_128_simulation.log_to_simulated_power(log),
+            )
+
+        again = simulator.TraceSimulator(self.key, seed=1).generate(10)
+        np.testing.assert_array_equal(again.power, measurements.power)
+
+    def test_leakage_options(self):
+        sim = simulator.TraceSimulator(self.key, leakage="HD", jitter=2, seed=0)
+        measurements = sim.generate(100)
+        self.assertEqual(measurements.power.shape, (100, 49))
+        # All points are inside the trace, the rest is zero.
+        self.assertTrue(np.all(np.count_nonzero(measurements.power, axis=1) <= 45))
+
+        sim = simulator.TraceSimulator(
+            self.key, masked=True, noise_std=1.0, seed=0, power_dtype=np.int16
+        )
+        measurements = sim.generate(100)
+        self.assertEqual(measurements.power.shape, (100, 90))
+        self.assertEqual(measurements.power.dtype, np.int16)
+
+        with self.assertRaises(ValueError):
+            simulator.TraceSimulator(self.key, leakage="XY")
+
+    def test_write_store(self):
+        sim = simulator.TraceSimulator(self.key, noise_std=1.0, seed=3)
+        with tempfile.TemporaryDirectory() as store_dir:
+            sim.write_store(store_dir, 250, chunk_size=100)
+            measurements = Measurements.open(store_dir)
+            self.assertEqual(measurements.power.shape, (250, 45))
+            self.assertEqual(measurements.power.dtype, np.float32)
+            del measurements
@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import trace_store
+
+from measurement import Measurements
+
+
+class TestTraceStore(unittest.TestCase):
+
+    def test_bytes_to_words(self):
+        data = np.array(
+            [[0x65, 0x6B, 0x69, 0x6C, 0x20, 0x64, 0x6E, 0x75]], dtype=np.uint8
+        )
+        np.testing.assert_array_equal(
+            trace_store.bytes_to_words(data),
+            np.array([[0x656B696C, 0x20646E75]], dtype=np.uint32),
+        )
+
+    def test_write_and_open_store(self):
+        rng = np.random.default_rng(0)
+        plaintexts = rng.integers(0, 2**32, (100, 2), dtype=np.uint32)
+        ciphertexts = rng.integers(0, 2**32, (100, 2), dtype=np.uint32)
+        powers = rng.integers(0, 1024, (100, 300), dtype=np.uint32)
+        key = rng.integers(0, 2**32, 4, dtype=np.uint32)
+
+        with tempfile.TemporaryDirectory() as store_dir:
+            writer = trace_store.TraceStoreWriter(store_dir, 100, 300, np.int16, key)
+            writer.append(plaintexts[:60], ciphertexts[:60], powers[:60])
+            writer.append(plaintexts[60:], ciphertexts[60:], powers[60:])
+            writer.close()
+
+            metadata = trace_store.load_metadata(store_dir)
+            self.assertEqual(metadata["num_traces"], 100)
+            self.assertEqual(metadata["num_samples"], 300)
+            np.testing.assert_array_equal(metadata["key"], key)
+
+            measurements = Measurements.open(store_dir)
+            self.assertEqual(len(measurements), 100)
+            self.assertEqual(measurements.power.dtype, np.int16)
+            self.assertIsInstance(measurements.power, np.memmap)
+            np.testing.assert_array_equal(measurements.plaintext, plaintexts)
+            np.testing.assert_array_equal(measurements.ciphertext, ciphertexts)
+
+            subset = measurements.select(slice(10, 20), slice(5, 50))
+            self.assertEqual(subset.power.shape, (10, 45))
+            np.testing.assert_array_equal(subset.power, powers[10:20, 5:50])
+            del measurements, subset
+
+            self.assertTrue(os.path.exists(os.path.join(store_dir, "power.npy")))